@@ -16,6 +16,42 @@ import os
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+def iter_stix_objects(path, chunk_size=1 << 20):
+    """Yield the objects of a STIX bundle's "objects" array one at a time, reading in chunks"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        start = buffer.find('"objects"')
+        while start == -1 or buffer.find('[', start) == -1:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError("No 'objects' array found in STIX bundle")
+            buffer += chunk
+            start = buffer.find('"objects"')
+        pos = buffer.find('[', start) + 1
+        
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, pos)
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Object continues past the end of the buffer
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield obj
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
 class KEVProcessor:
     def __init__(self):
         # Remove hardcoded assumptions - all will be calculated from data
@@ -26,7 +62,6 @@ class KEVProcessor:
         self.dataset_stats = {}
         
         # MITRE ATT&CK threat intelligence
-        self.mitre_attack_data = None
         self.mitre_loaded = False
         self.exploit_techniques = set()
         self.ransomware_techniques = set()
@@ -59,11 +94,8 @@ class KEVProcessor:
         
         print("🔍 Loading MITRE ATT&CK threat intelligence...")
         try:
-            with open(mitre_path, 'r', encoding='utf-8') as f:
-                self.mitre_attack_data = json.load(f)
-            
-            # Parse MITRE ATT&CK objects for threat intelligence
-            for obj in self.mitre_attack_data.get('objects', []):
+            # Stream MITRE ATT&CK objects for threat intelligence (the bundle is never held in memory)
+            for obj in iter_stix_objects(mitre_path):
                 obj_type = obj.get('type', '')
                 name = obj.get('name', '').lower()
                 description = obj.get('description', '').lower()
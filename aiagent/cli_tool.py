@@ -28,7 +28,7 @@ import logging
 import schedule
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import requests
 import aiohttp
 import aiofiles
@@ -36,6 +36,7 @@ from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+import gzip
 import hashlib
 import getpass
 
@@ -647,6 +648,19 @@ class LogIQCLI:
             'Content-Type': 'application/json'
         }
     
+    def _encode_json_body(self, payload: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Encode a JSON request body, gzip-compressed when `compress_requests` is enabled
+        (log text typically shrinks 5-10x; off by default, as older servers reject it).
+        
+        Returns:
+            (body, headers to add to the request)
+        """
+        body = json.dumps(payload).encode('utf-8')
+        if not self.config.get('compress_requests', False):
+            return body, {'Content-Type': 'application/json'}
+        return gzip.compress(body, compresslevel=6), {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    
     async def _refresh_token_automatically(self) -> bool:
         """Automatically refresh the authentication token by re-authenticating with server."""
         try:
@@ -731,13 +745,16 @@ class LogIQCLI:
             self.logger.error(f"Failed to enable automated monitoring: {e}")
             return False
     
-    async def send_logs(self, log_content: str, enhance_with_ai: bool = True) -> Optional[Dict[str, Any]]:
+    async def send_logs(self, log_content: str, enhance_with_ai: bool = True,
+                        background: bool = False) -> Optional[Dict[str, Any]]:
         """
         Send logs to the LogIQ analysis endpoint.
         
         Args:
             log_content: The log content to analyze
             enhance_with_ai: Whether to use AI enhancement
+            background: Unattended monitoring traffic; the server queues it behind
+                interactive requests and sheds it first under load
             
         Returns:
             Analysis results or None if failed
@@ -750,6 +767,8 @@ class LogIQCLI:
         
         try:
             headers = self._get_auth_headers()
+            if background:
+                headers['X-Request-Priority'] = 'background'
             
             # Filter logs using Pre-RAG classifier if content is too large
             if len(log_content) > 40000:  # Leave some buffer below 50KB limit
@@ -762,6 +781,9 @@ class LogIQCLI:
                 'max_results': self.config.get('max_results', 5)
             }
             
+            body, body_headers = self._encode_json_body(request_data)
+            headers.update(body_headers)
+            
             info_message(f"Sending {len(log_content):,} characters of logs for analysis")
             
             with Progress(
@@ -777,7 +799,7 @@ class LogIQCLI:
                     progress.update(task, advance=30)
                     async with session.post(
                         f"{api_url}/api/v1/analyze", 
-                        json=request_data, 
+                        data=body, 
                         headers=headers
                     ) as response:
                         progress.update(task, advance=40)
@@ -794,6 +816,9 @@ class LogIQCLI:
                             error_detail = await response.text()
                             self.logger.error(f"Analysis failed: {response.status} - {error_detail}")
                             
+                            if response.status in (429, 503) and 'Retry-After' in response.headers:
+                                warning_message(f"Server is busy, retry in {response.headers['Retry-After']}s")
+                            
                             # Handle 401 Unauthorized - token expired
                             if response.status == 401:
                                 self.logger.warning("Authentication token expired, attempting automatic refresh...")
@@ -803,9 +828,12 @@ class LogIQCLI:
                                     self.logger.info("Retrying request with refreshed token...")
                                     # Retry the request with new token
                                     headers = self._get_auth_headers()
+                                    if background:
+                                        headers['X-Request-Priority'] = 'background'
+                                    headers.update(body_headers)
                                     async with session.post(
                                         f"{api_url}/api/v1/analyze", 
-                                        json=request_data, 
+                                        data=body, 
                                         headers=headers
                                     ) as retry_response:
                                         if retry_response.status == 200:
@@ -1096,7 +1124,7 @@ class LogIQCLI:
             
             # Send to LogIQ API for analysis
             enhance_with_ai = self.config.get('dynamic_monitoring', {}).get('auto_enhance', True)
-            result = await self.send_logs(formatted_logs, enhance_with_ai)
+            result = await self.send_logs(formatted_logs, enhance_with_ai, background=True)
             
             if result:
                 # Add extraction metadata to result
@@ -2056,7 +2084,7 @@ class LogIQCLI:
             if self.ai_agent:
                 result = await self.ai_agent.enhanced_analysis(log_content)
             else:
-                result = await self.send_logs(log_content, enhance_with_ai=True)
+                result = await self.send_logs(log_content, enhance_with_ai=True, background=True)
             
             if result:
                 # Add dynamic extraction metadata if applicable
@@ -1,3 +1,5 @@
 from .config import Config, logger, settings
+from .metrics import metrics
+from .cache import TTLCache
 
-__all__ = ["Config", "logger", "settings"]
\ No newline at end of file
+__all__ = ["Config", "logger", "settings", "metrics", "TTLCache"]
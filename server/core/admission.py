@@ -0,0 +1,351 @@
+"""
+Admission control for expensive, LLM-backed endpoints.
+
+Each controller bounds how many requests of one endpoint run at once. Requests beyond
+that wait in a queue, interactive requests ahead of background ones (monitoring agents
+mark theirs with `X-Request-Priority: background`). A request is shed with Overloaded
+instead of queueing when:
+
+- the queue is full (background requests may only fill part of it, and an interactive
+  arrival evicts a background waiter of the busiest user rather than being turned away);
+- its user already has ADMISSION_USER_MAX_QUEUED requests waiting;
+- its estimated wait, from the queue ahead of it and recent service times, exceeds the
+  queue wait budget;
+- it has waited longer than that budget.
+
+Within each priority, slots are handed out by deficit round robin over users (the
+authenticated username, or the client address for anonymous endpoints): every user
+with waiting requests earns a quantum of request bytes per round, so one user's backlog
+of large monitoring uploads cannot starve another user's occasional request. On
+authenticated endpoints no user holds more than ADMISSION_USER_MAX_CONCURRENT slots at
+once; anonymous endpoints have no per-user quota, since behind a proxy or NAT many
+clients share one address.
+
+Shed background requests get 429 (slow down), shed interactive requests 503; both carry
+Retry-After. Queue depth, waits, service times and sheds are recorded as
+`admission.<endpoint>.*` metrics; per-user figures are aggregated (the longest queue of
+any one user), so the number of metrics does not grow with the number of users.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+from fastapi import Depends, Request
+from .config import Config
+from .metrics import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+PRIORITY_HEADER = "X-Request-Priority"
+# Assumed service time until a controller has measured its own
+DEFAULT_SERVICE_MS = 5000.0
+
+
+class Overloaded(Exception):
+    """Raised when an endpoint sheds a request instead of queueing it."""
+
+    def __init__(self, endpoint: str, reason: str, priority: str, retry_after: int = 1):
+        super().__init__(f"{endpoint} is overloaded ({reason}), retry later")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = 429 if priority == BACKGROUND else 503
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    user: str
+    cost: int
+
+
+class _FairQueue:
+    """Waiting requests of one priority, served by deficit round robin over users."""
+
+    def __init__(self, quantum: int):
+        self.quantum = max(1, quantum)  # with no credit per round, pop_next() would never return
+        self.queues: Dict[str, Deque[_Waiter]] = {}
+        self.deficits: Dict[str, int] = {}
+        self.active: Deque[str] = deque()  # users with waiting requests, in round-robin order
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def queued(self, user: str) -> int:
+        return len(self.queues.get(user, ()))
+
+    def ahead_of(self, user: str) -> int:
+        """Roughly how many waiters round robin serves before a new request of `user`."""
+        own = self.queued(user)
+        return sum(min(len(queue), own + 1) for queue in self.queues.values())
+
+    def push(self, waiter: _Waiter) -> None:
+        queue = self.queues.get(waiter.user)
+        if queue is None:
+            queue = self.queues[waiter.user] = deque()
+            self.deficits[waiter.user] = 0
+            self.active.append(waiter.user)
+        queue.append(waiter)
+        self.size += 1
+
+    def _drop_user(self, user: str) -> None:
+        del self.queues[user]
+        del self.deficits[user]
+        self.active.remove(user)
+
+    def remove(self, waiter: _Waiter) -> bool:
+        queue = self.queues.get(waiter.user)
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        self.size -= 1
+        if not queue:
+            self._drop_user(waiter.user)
+        return True
+
+    def pop_busiest(self) -> Optional[_Waiter]:
+        """Remove the newest waiter of the user with the most waiting."""
+        if not self.queues:
+            return None
+        user = max(self.queues, key=lambda name: len(self.queues[name]))
+        waiter = self.queues[user][-1]
+        self.remove(waiter)
+        return waiter
+
+    def pop_next(self, eligible: Callable[[str], bool]) -> Optional[_Waiter]:
+        """Next waiter in deficit round robin order among users for which eligible() holds."""
+        skipped = 0
+        while self.active and skipped < len(self.active):
+            user = self.active[0]
+            if not eligible(user):
+                self.active.rotate(-1)
+                skipped += 1
+                continue
+            head = self.queues[user][0]
+            if self.deficits[user] >= head.cost:
+                self.deficits[user] -= head.cost
+                self.remove(head)
+                return head
+            # Not enough credit yet: earn a quantum and give the next user a turn
+            self.deficits[user] += self.quantum
+            self.active.rotate(-1)
+            skipped = 0
+        return None
+
+
+class AdmissionController:
+    """Concurrency limit with a two-priority fair queue and queue-depth and latency-based shedding."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_queue_wait_ms: float,
+                 background_queue_percent: int, user_max_concurrent: int, user_max_queued: int,
+                 quantum_bytes: int):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_queue_wait_ms = max_queue_wait_ms
+        self.max_background_queue = max_queue * background_queue_percent // 100
+        self.user_max_concurrent = user_max_concurrent or self.max_concurrent
+        self.user_max_queued = user_max_queued or max_queue
+        self._in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+        self._queues: Dict[str, _FairQueue] = {priority: _FairQueue(quantum_bytes) for priority in PRIORITIES}
+
+    def _metric(self, suffix: str) -> str:
+        return f"admission.{self.name}.{suffix}"
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge(self._metric("in_flight"), self._in_flight)
+        for priority, queue in self._queues.items():
+            metrics.set_gauge(self._metric(f"queued.{priority}"), len(queue))
+        queued_users = set().union(*(q.queues for q in self._queues.values()))
+        metrics.set_gauge(self._metric("queued_users"), len(queued_users))
+        metrics.set_gauge(self._metric("max_user_queued"),
+                          max((self._user_queued(user) for user in queued_users), default=0))
+
+    def _user_queued(self, user: str) -> int:
+        return sum(queue.queued(user) for queue in self._queues.values())
+
+    def _estimated_wait_ms(self, ahead: int) -> float:
+        """Expected wait behind `ahead` queued requests with every slot busy."""
+        service_ms = metrics.percentile(self._metric("service_ms"), 0.5) or DEFAULT_SERVICE_MS
+        return math.ceil((ahead + 1) / self.max_concurrent) * service_ms
+
+    def _shed(self, reason: str, priority: str, ahead: int) -> Overloaded:
+        metrics.increment(self._metric(f"shed.{reason}"))
+        metrics.increment(self._metric(f"shed_{priority}"))
+        retry_after = max(1, math.ceil(self._estimated_wait_ms(ahead) / 1000))
+        return Overloaded(self.name, reason, priority, retry_after)
+
+    def _has_capacity(self, user: str) -> bool:
+        return self._user_in_flight.get(user, 0) < self.user_max_concurrent
+
+    def _grant(self, user: str) -> None:
+        self._in_flight += 1
+        self._user_in_flight[user] = self._user_in_flight.get(user, 0) + 1
+
+    def _wake(self) -> None:
+        """Hand free slots to waiters, interactive first, fairly across users within quota."""
+        while self._in_flight < self.max_concurrent:
+            waiter = (self._queues[INTERACTIVE].pop_next(self._has_capacity)
+                      or self._queues[BACKGROUND].pop_next(self._has_capacity))
+            if waiter is None:
+                break
+            self._grant(waiter.user)
+            waiter.future.set_result(None)
+        self._update_gauges()
+
+    async def _acquire(self, priority: str, user: str, cost: int) -> None:
+        # Whenever a slot is free, every waiter is blocked by its user's quota
+        if self._in_flight < self.max_concurrent and self._has_capacity(user):
+            self._grant(user)
+            self._update_gauges()
+            return
+
+        interactive, background = self._queues[INTERACTIVE], self._queues[BACKGROUND]
+        ahead = interactive.ahead_of(user)
+        if priority == BACKGROUND:
+            ahead = len(interactive) + background.ahead_of(user)
+        if self._user_queued(user) >= self.user_max_queued:
+            raise self._shed("user_quota", priority, ahead)
+        if len(interactive) + len(background) >= self.max_queue:
+            evicted = background.pop_busiest() if priority == INTERACTIVE else None
+            if evicted is None:
+                raise self._shed("queue_full", priority, ahead)
+            # Make room by turning away a background request of the busiest user
+            evicted.future.set_exception(self._shed("evicted", BACKGROUND, self.max_queue))
+            self._update_gauges()
+        if priority == BACKGROUND and len(background) >= self.max_background_queue:
+            raise self._shed("queue_full", priority, ahead)
+        if self._estimated_wait_ms(ahead) > self.max_queue_wait_ms:
+            raise self._shed("latency", priority, ahead)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), user, max(1, cost))
+        self._queues[priority].push(waiter)
+        self._update_gauges()
+        enqueued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_queue_wait_ms / 1000)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and waiter.future.exception() is None:
+                return  # Admitted just as the wait ran out
+            self._remove(priority, waiter)
+            raise self._shed("timeout", priority, ahead)
+        except asyncio.CancelledError:
+            future = waiter.future
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release(user)  # The slot was handed over to a request that went away
+            else:
+                future.cancel()
+                self._remove(priority, waiter)
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - enqueued_at) * 1000
+            metrics.observe(self._metric("queue_wait_ms"), wait_ms)
+            metrics.observe(self._metric(f"queue_wait_ms.{priority}"), wait_ms)
+
+    def _remove(self, priority: str, waiter: _Waiter) -> None:
+        if self._queues[priority].remove(waiter):
+            self._update_gauges()
+
+    def _release(self, user: str) -> None:
+        self._in_flight -= 1
+        remaining = self._user_in_flight.get(user, 1) - 1
+        if remaining > 0:
+            self._user_in_flight[user] = remaining
+        else:
+            self._user_in_flight.pop(user, None)
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, priority: str = INTERACTIVE, user: str = "", cost: int = 1) -> AsyncIterator[None]:
+        """
+        Hold one of the endpoint's slots for the duration of the block.
+
+        Args:
+            priority: INTERACTIVE or BACKGROUND
+            user: Fairness key; requests of one user share that user's turns and quota
+            cost: Size of the request (e.g. body bytes), charged against the user's deficit
+
+        Raises:
+            Overloaded: If the request is shed
+        """
+        await self._acquire(priority, user, cost)
+        metrics.increment(self._metric(f"admitted_{priority}"))
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics.observe(self._metric("service_ms"), (time.perf_counter() - started_at) * 1000)
+            self._release(user)
+
+    def admit_request(self, request: Request, user: Optional[str] = None):
+        """
+        admit() with the priority and cost of an HTTP request; `user` defaults to the
+        client address.
+
+        Streaming endpoints use this inside their response generator: a dependency's slot
+        is released before a StreamingResponse body runs, so it cannot cover the stream.
+        """
+        if user is None:
+            user = request.client.host if request.client else ""
+        return self.admit(request_priority(request), user, _request_cost(request))
+
+
+def request_priority(request: Request) -> str:
+    """Background if the client says so (monitoring agents), otherwise interactive."""
+    return BACKGROUND if request.headers.get(PRIORITY_HEADER, "").lower() == BACKGROUND else INTERACTIVE
+
+
+def _request_cost(request: Request) -> int:
+    try:
+        return int(request.headers.get("content-length") or 1)
+    except ValueError:
+        return 1
+
+
+def admission(controller: AdmissionController, current_user: Optional[Callable] = None) -> Callable:
+    """
+    FastAPI dependency that runs the endpoint under `controller`.
+
+    With `current_user` (the auth dependency), requests are scheduled fairly per username;
+    otherwise per client address.
+
+    The slot is released when the endpoint returns, before the body of a StreamingResponse
+    is produced; streaming endpoints must also hold a slot in their generator (see
+    AdmissionController.admit_request).
+    """
+    if current_user is None:
+        async def dependency(request: Request) -> AsyncIterator[None]:
+            async with controller.admit_request(request):
+                yield
+        return dependency
+
+    async def user_dependency(request: Request, user: dict = Depends(current_user)) -> AsyncIterator[None]:
+        async with controller.admit_request(request, user["username"]):
+            yield
+    return user_dependency
+
+
+def _controller(name: str, max_concurrent: int, user_quotas: bool = True) -> AdmissionController:
+    return AdmissionController(
+        name,
+        max_concurrent=max_concurrent,
+        max_queue=Config.ADMISSION_MAX_QUEUE,
+        max_queue_wait_ms=Config.ADMISSION_MAX_QUEUE_WAIT_MS,
+        background_queue_percent=Config.ADMISSION_BACKGROUND_QUEUE_PERCENT,
+        user_max_concurrent=Config.ADMISSION_USER_MAX_CONCURRENT if user_quotas else 0,
+        user_max_queued=Config.ADMISSION_USER_MAX_QUEUED if user_quotas else 0,
+        quantum_bytes=Config.ADMISSION_FAIR_QUANTUM_BYTES
+    )
+
+
+analyze_admission = _controller("analyze", Config.ADMISSION_ANALYZE_CONCURRENCY)
+# Keyed by client address: fair queuing only, no per-user quota (proxies and NAT share addresses)
+rag_query_admission = _controller("rag_query", Config.ADMISSION_RAG_QUERY_CONCURRENCY, user_quotas=False)
+batch_search_admission = _controller("batch_search", Config.ADMISSION_BATCH_SEARCH_CONCURRENCY, user_quotas=False)
@@ -0,0 +1,164 @@
+"""
+Compressed request bodies.
+
+Clients may send request bodies with `Content-Encoding: gzip` or `deflate` (and `zstd`
+when the optional `zstandard` package is installed); the CLI gzips its analysis
+requests, which are mostly repetitive log text. RequestDecompressionMiddleware
+decompresses them before routing, so endpoints see plain bodies with an accurate
+Content-Length (which admission control charges), and rejects:
+
+- encodings it does not support, with 415;
+- bodies larger than REQUEST_MAX_DECOMPRESSED_BYTES once decompressed (or compressed),
+  with 413 - decompression stops at the limit, so small "zip bombs" cost nothing;
+- corrupt or truncated bodies, with 400.
+
+Paths that accept compressed files as content (the log upload endpoint sniffs gzip
+itself and streams it to disk) are passed through untouched.
+
+Responses are compressed separately, by Starlette's GZipMiddleware when the client sends
+`Accept-Encoding: gzip`.
+"""
+
+import time
+import zlib
+from typing import Callable, Iterable, List, Optional, Tuple
+from fastapi.responses import JSONResponse
+from .metrics import metrics
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd bodies are rejected with 415 without it
+    zstandard = None
+
+# zlib window bits for each supported encoding (+16: gzip header, +32: auto-detect zlib/gzip)
+ZLIB_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "x-gzip": 16 + zlib.MAX_WBITS, "deflate": 32 + zlib.MAX_WBITS}
+
+
+class BodyTooLarge(Exception):
+    """Raised when a request body exceeds the size limit, compressed or decompressed."""
+
+
+def supported_encodings() -> List[str]:
+    return list(ZLIB_WBITS) + (["zstd"] if zstandard is not None else [])
+
+
+def _zstd_frame_complete(body: bytes, decompressed_size: int) -> bool:
+    """Whether the first zstd frame of body ends within it (the stream reader stops quietly)."""
+    content_size = zstandard.get_frame_parameters(body).content_size
+    if content_size != zstandard.CONTENTSIZE_UNKNOWN:
+        return decompressed_size == content_size
+    # No size in the header: decompress the frame again, which is bounded by the size just read
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    decompressor.decompress(body)
+    return decompressor.eof
+
+
+def decompress(body: bytes, encoding: str, max_size: int) -> bytes:
+    """
+    Decompress a request body, producing at most max_size bytes.
+
+    Raises:
+        BodyTooLarge: If the decompressed body would exceed max_size
+        ValueError: If the body is corrupt or truncated
+    """
+    if encoding == "zstd":
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = reader.read(max_size + 1)
+            if len(data) <= max_size and not _zstd_frame_complete(body, len(data)):
+                raise ValueError("Truncated zstd body")
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Invalid zstd body: {e}")
+    else:
+        decompressor = zlib.decompressobj(ZLIB_WBITS[encoding])
+        try:
+            data = decompressor.decompress(body, max_size + 1)
+            if len(data) <= max_size and not decompressor.unconsumed_tail:
+                data += decompressor.flush()
+        except zlib.error as e:
+            raise ValueError(f"Invalid {encoding} body: {e}")
+        if len(data) <= max_size and not decompressor.eof:
+            raise ValueError(f"Truncated {encoding} body")
+    if len(data) > max_size:
+        raise BodyTooLarge(f"Decompressed request body exceeds {max_size:,} bytes")
+    return data
+
+
+class RequestDecompressionMiddleware:
+    """ASGI middleware that decompresses `Content-Encoding` request bodies up to a size limit."""
+
+    def __init__(self, app, max_size: int, passthrough_paths: Iterable[str] = ()):
+        self.app = app
+        self.max_size = max_size
+        self.passthrough_paths = set(passthrough_paths)
+
+    async def __call__(self, scope, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["path"] in self.passthrough_paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = self._content_encoding(scope["headers"])
+        if encoding in (None, "identity"):
+            await self.app(scope, receive, send)
+            return
+        if encoding not in supported_encodings():
+            await self._reject(scope, receive, send, 415, "Unsupported Content-Encoding",
+                               f"Supported request encodings: {', '.join(supported_encodings())}")
+            return
+
+        started_at = time.perf_counter()
+        try:
+            compressed = await self._read_body(receive)
+            body = decompress(compressed, encoding, self.max_size)
+        except BodyTooLarge as e:
+            metrics.increment("compression.requests_rejected")
+            await self._reject(scope, receive, send, 413, "Request body too large", str(e))
+            return
+        except ValueError as e:
+            metrics.increment("compression.requests_rejected")
+            await self._reject(scope, receive, send, 400, "Invalid request body", str(e))
+            return
+        metrics.observe("compression.decompress_ms", (time.perf_counter() - started_at) * 1000)
+        metrics.increment("compression.requests_decompressed")
+        metrics.increment("compression.bytes_received", len(compressed))
+        metrics.increment("compression.bytes_decompressed", len(body))
+
+        headers = [(name, value) for name, value in scope["headers"]
+                   if name not in (b"content-encoding", b"content-length")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        replayed = False
+
+        async def replay() -> dict:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()  # http.disconnect
+
+        await self.app(dict(scope, headers=headers), replay, send)
+
+    @staticmethod
+    def _content_encoding(headers: List[Tuple[bytes, bytes]]) -> Optional[str]:
+        for name, value in headers:
+            if name == b"content-encoding":
+                return value.decode("latin-1").strip().lower()
+        return None
+
+    async def _read_body(self, receive: Callable) -> bytes:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                raise ValueError("Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_size:
+                raise BodyTooLarge(f"Request body exceeds {self.max_size:,} bytes")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _reject(scope, receive: Callable, send: Callable, status_code: int, error: str, detail: str) -> None:
+        response = JSONResponse(status_code=status_code, content={"error": error, "detail": detail})
+        await response(scope, receive, send)
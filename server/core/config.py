@@ -21,6 +21,7 @@ class Settings(BaseSettings):
   API_PORT: str = "8000"
   MAX_LOG_LENGTH: str = "10000"
   MAX_RESULTS: str = "5"
+  RAG_CONTEXT_TOKEN_BUDGET: str = "3000"
   
   # AWS settings (optional)
   AWS_ACCESS_KEY_ID: str = ""
@@ -30,6 +31,47 @@ class Settings(BaseSettings):
   
   # Encryption settings
   ENCRYPTION_MASTER_KEY: str = "default-encryption-key-change-in-production"
+  USER_KEY_CACHE_TTL_SECONDS: str = "900"
+  USER_KEY_CACHE_SIZE: str = "1024"
+  AUTH_USER_CACHE_TTL_SECONDS: str = "60"
+  AUTH_USER_CACHE_SIZE: str = "4096"
+  CACHE_INVALIDATION_POLL_SECONDS: str = "2"
+  PASSWORD_HASH_WORKERS: str = "0"
+  PASSWORD_HASH_MAX_PENDING: str = "64"
+  ANALYSIS_DECRYPT_WORKERS: str = "0"
+  ANALYSIS_RETENTION_DAYS: str = "0"
+  SESSION_RETENTION_DAYS: str = "30"
+  RETENTION_INTERVAL_SECONDS: str = "3600"
+  RETENTION_BATCH_SIZE: str = "500"
+  RETENTION_MAX_DELETES_PER_SECOND: str = "1000"
+  LOG_ARCHIVE_ENABLED: str = "True"
+  LOG_ARCHIVE_CHUNK_SIZE: str = "16384"
+  REENCRYPTION_WORKERS: str = "0"
+  REENCRYPTION_BATCH_SIZE: str = "200"
+  REENCRYPTION_KEY_RETENTION_HOURS: str = "72"
+  ADMISSION_ANALYZE_CONCURRENCY: str = "8"
+  ADMISSION_RAG_QUERY_CONCURRENCY: str = "8"
+  ADMISSION_BATCH_SEARCH_CONCURRENCY: str = "2"
+  ADMISSION_MAX_QUEUE: str = "32"
+  ADMISSION_MAX_QUEUE_WAIT_MS: str = "15000"
+  ADMISSION_BACKGROUND_QUEUE_PERCENT: str = "50"
+  ADMISSION_USER_MAX_CONCURRENT: str = "2"
+  ADMISSION_USER_MAX_QUEUED: str = "8"
+  ADMISSION_FAIR_QUANTUM_BYTES: str = "65536"
+  PRERAG_FILTER_ENABLED: str = "True"
+  PRERAG_MODEL_PATH: str = ""
+  PRERAG_CHAR_BUDGET: str = "10000"
+  PRERAG_MIN_CHARS: str = "4000"
+  UPLOAD_MAX_BYTES: str = "268435456"
+  UPLOAD_MAX_DECOMPRESSED_BYTES: str = "1073741824"
+  UPLOAD_CHUNK_CHARS: str = "10000"
+  UPLOAD_MAX_CHUNKS: str = "5"
+  UPLOAD_SPOOL_DIR: str = ""
+  UPLOAD_MAX_CONCURRENT: str = "4"
+  UPLOAD_USER_MAX_CONCURRENT: str = "1"
+  REQUEST_MAX_DECOMPRESSED_BYTES: str = "16777216"
+  RESPONSE_GZIP_MIN_BYTES: str = "1024"
+  RESPONSE_GZIP_LEVEL: str = "6"
   
   model_config = SettingsConfigDict(env_file=".env")
 
@@ -48,6 +90,7 @@ class Config:
     
     MAX_LOG_LENGTH = int(settings.MAX_LOG_LENGTH)
     MAX_RESULTS = int(settings.MAX_RESULTS)
+    RAG_CONTEXT_TOKEN_BUDGET = int(settings.RAG_CONTEXT_TOKEN_BUDGET)
     
 
     HOST = settings.API_HOST
@@ -58,6 +101,48 @@ class Config:
     AWS_SECRET_ACCESS_KEY = settings.AWS_SECRET_ACCESS_KEY
     AWS_SESSION_TOKEN = settings.AWS_SESSION_TOKEN
 
+    USER_KEY_CACHE_TTL_SECONDS = int(settings.USER_KEY_CACHE_TTL_SECONDS)
+    USER_KEY_CACHE_SIZE = int(settings.USER_KEY_CACHE_SIZE)
+    AUTH_USER_CACHE_TTL_SECONDS = int(settings.AUTH_USER_CACHE_TTL_SECONDS)
+    AUTH_USER_CACHE_SIZE = int(settings.AUTH_USER_CACHE_SIZE)
+    CACHE_INVALIDATION_POLL_SECONDS = int(settings.CACHE_INVALIDATION_POLL_SECONDS)  # 0 = this worker only
+    PASSWORD_HASH_WORKERS = int(settings.PASSWORD_HASH_WORKERS)  # 0 = one per CPU core
+    PASSWORD_HASH_MAX_PENDING = int(settings.PASSWORD_HASH_MAX_PENDING)
+    ANALYSIS_DECRYPT_WORKERS = int(settings.ANALYSIS_DECRYPT_WORKERS)  # 0 = min(4, CPU cores)
+    ANALYSIS_RETENTION_DAYS = int(settings.ANALYSIS_RETENTION_DAYS)  # 0 = keep forever
+    SESSION_RETENTION_DAYS = int(settings.SESSION_RETENTION_DAYS)  # stopped sessions; 0 = keep forever
+    RETENTION_INTERVAL_SECONDS = int(settings.RETENTION_INTERVAL_SECONDS)  # 0 = no background task
+    RETENTION_BATCH_SIZE = int(settings.RETENTION_BATCH_SIZE)
+    RETENTION_MAX_DELETES_PER_SECOND = int(settings.RETENTION_MAX_DELETES_PER_SECOND)
+    LOG_ARCHIVE_ENABLED = settings.LOG_ARCHIVE_ENABLED.lower() == "true"
+    LOG_ARCHIVE_CHUNK_SIZE = int(settings.LOG_ARCHIVE_CHUNK_SIZE)  # target bytes per archived chunk
+    REENCRYPTION_WORKERS = int(settings.REENCRYPTION_WORKERS)  # 0 = min(4, CPU cores)
+    REENCRYPTION_BATCH_SIZE = int(settings.REENCRYPTION_BATCH_SIZE)  # documents per bulk write
+    REENCRYPTION_KEY_RETENTION_HOURS = int(settings.REENCRYPTION_KEY_RETENTION_HOURS)  # old keys kept for retries
+    ADMISSION_ANALYZE_CONCURRENCY = int(settings.ADMISSION_ANALYZE_CONCURRENCY)
+    ADMISSION_RAG_QUERY_CONCURRENCY = int(settings.ADMISSION_RAG_QUERY_CONCURRENCY)
+    ADMISSION_BATCH_SEARCH_CONCURRENCY = int(settings.ADMISSION_BATCH_SEARCH_CONCURRENCY)
+    ADMISSION_MAX_QUEUE = int(settings.ADMISSION_MAX_QUEUE)  # waiting requests per endpoint
+    ADMISSION_MAX_QUEUE_WAIT_MS = int(settings.ADMISSION_MAX_QUEUE_WAIT_MS)
+    ADMISSION_BACKGROUND_QUEUE_PERCENT = int(settings.ADMISSION_BACKGROUND_QUEUE_PERCENT)  # queue share for background traffic
+    ADMISSION_USER_MAX_CONCURRENT = int(settings.ADMISSION_USER_MAX_CONCURRENT)  # slots per user and endpoint; 0 = no quota
+    ADMISSION_USER_MAX_QUEUED = int(settings.ADMISSION_USER_MAX_QUEUED)  # waiting requests per user; 0 = no quota
+    ADMISSION_FAIR_QUANTUM_BYTES = max(1, int(settings.ADMISSION_FAIR_QUANTUM_BYTES))  # request bytes per user per round (>= 1)
+    PRERAG_FILTER_ENABLED = settings.PRERAG_FILTER_ENABLED.lower() == "true"
+    PRERAG_MODEL_PATH = settings.PRERAG_MODEL_PATH  # empty = newest *threat_model*.joblib in models/
+    PRERAG_CHAR_BUDGET = int(settings.PRERAG_CHAR_BUDGET)  # threat line characters kept; summaries truncate past MAX_LOG_LENGTH
+    PRERAG_MIN_CHARS = int(settings.PRERAG_MIN_CHARS)  # shorter logs are analyzed unfiltered
+    UPLOAD_MAX_BYTES = int(settings.UPLOAD_MAX_BYTES)  # size of the upload as sent (compressed or not)
+    UPLOAD_MAX_DECOMPRESSED_BYTES = int(settings.UPLOAD_MAX_DECOMPRESSED_BYTES)  # guards against gzip bombs
+    UPLOAD_CHUNK_CHARS = int(settings.UPLOAD_CHUNK_CHARS)  # per analysis; summaries truncate past MAX_LOG_LENGTH
+    UPLOAD_MAX_CHUNKS = int(settings.UPLOAD_MAX_CHUNKS)  # analyses per upload; later threat lines are only counted
+    UPLOAD_SPOOL_DIR = settings.UPLOAD_SPOOL_DIR  # empty = system temp directory
+    UPLOAD_MAX_CONCURRENT = int(settings.UPLOAD_MAX_CONCURRENT)  # uploads spooled at once; bounds spool disk use
+    UPLOAD_USER_MAX_CONCURRENT = int(settings.UPLOAD_USER_MAX_CONCURRENT)
+    REQUEST_MAX_DECOMPRESSED_BYTES = int(settings.REQUEST_MAX_DECOMPRESSED_BYTES)  # compressed request bodies, once decompressed
+    RESPONSE_GZIP_MIN_BYTES = int(settings.RESPONSE_GZIP_MIN_BYTES)  # smaller responses are sent uncompressed
+    RESPONSE_GZIP_LEVEL = int(settings.RESPONSE_GZIP_LEVEL)  # 1 (fastest) to 9 (smallest)
+
 logging.basicConfig(
     level=getattr(logging, Config.LOG_LEVEL),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -0,0 +1,87 @@
+"""
+In-process metrics registry for counters, gauges and latency histograms.
+"""
+
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional
+
+
+class MetricsRegistry:
+    """Thread-safe registry of named counters, gauges and bounded-reservoir histograms."""
+
+    def __init__(self, reservoir_size: int = 1024):
+        self._lock = threading.Lock()
+        self._reservoir_size = reservoir_size
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, deque] = {}
+        self._histogram_counts: Dict[str, int] = defaultdict(int)
+
+    def increment(self, name: str, value: float = 1.0) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample (e.g. a latency in ms) in a histogram keeping the most recent samples."""
+        with self._lock:
+            samples = self._histograms.get(name)
+            if samples is None:
+                samples = self._histograms[name] = deque(maxlen=self._reservoir_size)
+            samples.append(value)
+            self._histogram_counts[name] += 1
+
+    def sample_count(self, name: str) -> int:
+        """Number of samples currently held for a histogram."""
+        with self._lock:
+            samples = self._histograms.get(name)
+            return len(samples) if samples else 0
+
+    def percentile(self, name: str, quantile: float) -> Optional[float]:
+        """Return the given quantile (0-1) of a histogram's recent samples, or None if empty."""
+        with self._lock:
+            samples = self._histograms.get(name)
+            if not samples:
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(quantile * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all metrics with histogram summaries (count, p50, p95, p99, max)."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {name: (sorted(samples), self._histogram_counts[name])
+                          for name, samples in self._histograms.items()}
+
+        summaries = {}
+        for name, (ordered, total) in histograms.items():
+            if not ordered:
+                continue
+
+            def pick(q: float) -> float:
+                return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+
+            summaries[name] = {
+                "count": total,
+                "p50": pick(0.50),
+                "p95": pick(0.95),
+                "p99": pick(0.99),
+                "max": round(ordered[-1], 3)
+            }
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": summaries
+        }
+
+# Global metrics registry
+metrics = MetricsRegistry()
@@ -1,11 +1,80 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Optional
 from jose import jwt
 from passlib.context import CryptContext
-from .config import settings
+from .config import settings, Config
+from .metrics import metrics
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password hashing operations are already waiting."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Too many concurrent authentication requests")
+        self.retry_after = retry_after
+
+
+class PasswordHasherPool:
+    """Bounded thread pool for bcrypt with admission control.
+
+    bcrypt releases the GIL while hashing, so a thread pool scales with cores while the
+    event loop keeps serving other requests. Calls beyond `max_pending` (running plus
+    queued) are rejected with PasswordHashingBusy instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            metrics.set_gauge("auth.password_hash.pending", self._pending)
+
+    def _retry_after(self) -> int:
+        """Rough seconds until the backlog drains, from recent hashing durations."""
+        duration_ms = metrics.percentile("auth.password_hash.duration_ms", 0.5) or 250.0
+        return max(1, math.ceil(self.max_pending / self.max_workers * duration_ms / 1000))
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.increment("auth.password_hash.rejected")
+                raise PasswordHashingBusy(self._retry_after())
+            self._pending += 1
+            metrics.set_gauge("auth.password_hash.pending", self._pending)
+
+        enqueued_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            metrics.observe("auth.password_hash.queue_wait_ms", (started_at - enqueued_at) * 1000)
+            result = func(*args)
+            metrics.observe("auth.password_hash.duration_ms", (time.perf_counter() - started_at) * 1000)
+            return result
+
+        # Release on completion of the job itself, even if the awaiting request is cancelled
+        future = self._executor.submit(job)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+
+password_hasher = PasswordHasherPool(
+    max_workers=Config.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
    
     return pwd_context.verify(plain_password, hashed_password)
@@ -14,12 +83,21 @@ def get_password_hash(password: str) -> str:
     
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the password hashing pool (raises PasswordHashingBusy when saturated)."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the password hashing pool (raises PasswordHashingBusy when saturated)."""
+    return await password_hasher.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # "iat" lets caches key on the token generation, not just the subject
+    to_encode.update({"exp": expire, "iat": int(datetime.now(timezone.utc).timestamp())})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
\ No newline at end of file
@@ -1,8 +1,64 @@
+from typing import Dict, List
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
 from core.config import settings
+from core import logger
 
 client = AsyncIOMotorClient(settings.MONGO_URL)
 database = client.Forensiq
 user_collection = database.get_collection("users")
 analysis_collection = database.get_collection("analysis_results")
-monitoring_collection = database.get_collection("monitoring_sessions")
\ No newline at end of file
+monitoring_collection = database.get_collection("monitoring_sessions")
+
+# Indexes backing the queries the services run, created (idempotently) at startup.
+# Users are read and written through database.user_collection, i.e. "user_collection".
+INDEXES: Dict[str, List[IndexModel]] = {
+    "analysis_results": [
+        # History listing and keyset pagination: filter by user, newest first, _id tie-break
+        IndexModel([("user_id", ASCENDING), ("analysis_timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="user_history"),
+        # Global stats over a time window
+        IndexModel([("analysis_timestamp", DESCENDING)], name="analysis_timestamp"),
+        # Re-encryption: a user's analyses still under an old key, in _id (checkpoint) order
+        IndexModel([("user_id", ASCENDING), ("encryption_key_id", ASCENDING), ("_id", ASCENDING)],
+                   name="user_key_id"),
+    ],
+    "monitoring_sessions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id", unique=True),
+        IndexModel([("username", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_status_created"),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "reencryption_jobs": [
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("old_keys_expire_at", ASCENDING)], name="old_keys_expire_at", sparse=True),
+    ],
+    "cache_invalidations": [
+        # Workers poll recent events; each expires an hour after it was published
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=3600),
+    ],
+    "user_collection": [
+        IndexModel([("username", ASCENDING)], name="username"),
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+}
+
+async def ensure_indexes() -> Dict[str, List[str]]:
+    """
+    Create every index declared in INDEXES that does not exist yet.
+
+    Failures are logged per collection rather than raised, so a conflicting legacy
+    index (or a read-only deployment) does not stop the server from starting.
+
+    Returns:
+        Index names present per collection after the run
+    """
+    created = {}
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created[collection_name] = await database.get_collection(collection_name).create_indexes(indexes)
+            logger.info(f"Ensured indexes on {collection_name}: {', '.join(created[collection_name])}")
+        except PyMongoError as e:
+            logger.warning(f"Could not create indexes on {collection_name}: {e}")
+    return created
@@ -1,27 +1,37 @@
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from datetime import datetime
-from core import Config, logger
-from services import GeminiService, ChromaDBService, AWSBedrockService
+from core import Config, logger, metrics
+from core.security import PasswordHashingBusy
+from core.admission import Overloaded
+from core.compression import RequestDecompressionMiddleware
+from services import GeminiService, ChromaDBService, AWSBedrockService, LLMProviderRouter
+from services import retention_service, reencryption_service, prerag_filter_service, analysis_rollup_service, cache_invalidation_service
 from routers import auth, users, analysis_router, mitre
 from routers import monitoring
 from routers.analysis import set_services
 from routers.mitre import set_mitre_services
 from model import HealthCheck, ErrorResponse, DatabaseStats
+from db import ensure_indexes
 
 gemini_service: GeminiService = None
 chromadb_service: ChromaDBService = None
 aws_bedrock_service: AWSBedrockService = None
+llm_router: LLMProviderRouter = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan - startup and shutdown events."""
     logger.info("Starting LogIQ API server...")
     try:
-        global gemini_service, chromadb_service, aws_bedrock_service
+        global gemini_service, chromadb_service, aws_bedrock_service, llm_router
+        logger.info("Ensuring MongoDB indexes...")
+        await ensure_indexes()
+        await analysis_rollup_service.ensure_epoch()
         logger.info("Initializing Gemini AI service...")
         gemini_service = GeminiService()
         logger.info("Initializing ChromaDB service...")
@@ -33,15 +43,24 @@ async def lifespan(app: FastAPI):
         if not db_initialized:
             logger.error("Failed to initialize database")
             raise Exception("Database initialization failed")
+        # Route conversational LLM calls Gemini-first with hedging/failover to AWS Bedrock
+        llm_router = LLMProviderRouter("gemini", gemini_service, "aws_bedrock", aws_bedrock_service)
         # Set services for routers
         set_services(gemini_service, chromadb_service)
-        set_mitre_services(aws_bedrock_service, chromadb_service, gemini_service)
+        set_mitre_services(aws_bedrock_service, chromadb_service, gemini_service, llm_router)
+        await retention_service.start()
+        await reencryption_service.start()
+        await cache_invalidation_service.start()
+        await prerag_filter_service.load()
         logger.info("All services initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize services: {str(e)}")
         raise
     yield
     logger.info("Shutting down LogIQ API server...")
+    await retention_service.stop()
+    await reencryption_service.stop()
+    await cache_invalidation_service.stop()
 
 app = FastAPI(
     title="LogIQ - MITRE ATT&CK Log Analysis API",
@@ -52,6 +71,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Compressed transport: gzipped responses for clients that accept them, and
+# decompression of gzipped request bodies (the upload endpoint handles gzip files itself)
+app.add_middleware(GZipMiddleware, minimum_size=Config.RESPONSE_GZIP_MIN_BYTES,
+                   compresslevel=Config.RESPONSE_GZIP_LEVEL)
+app.add_middleware(RequestDecompressionMiddleware, max_size=Config.REQUEST_MAX_DECOMPRESSED_BYTES,
+                   passthrough_paths=["/api/v1/analyze/upload"])
+# Added last, so it is the outermost middleware and its headers also reach the
+# responses the middleware above sends itself (e.g. 413/415 for request bodies)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*","localhost:3000"],  # Configure appropriately for production
@@ -129,6 +156,37 @@ async def health_check():
             services={"error": str(e)}
         )
 
+@app.get("/metrics", response_model=dict)
+async def get_metrics():
+    """In-process service metrics: counters, gauges and latency percentiles."""
+    return metrics.snapshot()
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request, exc: PasswordHashingBusy):
+    """Shed authentication load when the password hashing pool is saturated."""
+    logger.warning(f"Rejecting {request.url.path}: password hashing pool saturated")
+    return JSONResponse(
+        status_code=503,
+        content=ErrorResponse(
+            error="Service busy",
+            detail=str(exc)
+        ).dict(),
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    """Shed load from LLM-backed endpoints whose queue is full or too slow."""
+    logger.warning(f"Shedding {request.url.path}: {exc.reason}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=ErrorResponse(
+            error="Service overloaded",
+            detail=str(exc)
+        ).dict(),
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler for unhandled errors."""
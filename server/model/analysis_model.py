@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List, Dict, Any, Annotated
+from typing import Optional, List, Dict, Any, Annotated, Union
 from datetime import datetime
 from bson import ObjectId
+from .logs_model import AttackTechnique
 
 class StoredAnalysisRequest(BaseModel):
     """Model for storing analysis request data."""
@@ -28,9 +29,9 @@ class AnalysisResult(BaseModel):
     request_data: StoredAnalysisRequest = Field(..., description="Original request data")
     
     # Results (encrypted)
-    encrypted_summary: str = Field(..., description="Encrypted AI-generated summary")
-    encrypted_techniques: str = Field(..., description="Encrypted matched techniques JSON")
-    encrypted_enhanced_analysis: Optional[str] = Field(None, description="Encrypted enhanced analysis")
+    encrypted_summary: Union[bytes, str] = Field(..., description="Encrypted AI-generated summary (binary envelope; text for legacy records)")
+    encrypted_techniques: Union[bytes, str] = Field(..., description="Encrypted matched techniques JSON")
+    encrypted_enhanced_analysis: Optional[Union[bytes, str]] = Field(None, description="Encrypted enhanced analysis")
     
     # Metadata (not encrypted)
     analysis_timestamp: datetime = Field(default_factory=datetime.utcnow, description="Analysis timestamp")
@@ -55,9 +56,29 @@ class AnalysisHistoryItem(BaseModel):
     techniques_count: int = Field(..., description="Number of matched techniques")
     logs_preview: str = Field(..., description="First 100 characters of logs")
 
+class AnalysisHistoryPage(BaseModel):
+    """Model for one keyset-paginated page of analysis history."""
+    items: List[AnalysisHistoryItem] = Field(..., description="History items, newest first")
+    next_cursor: Optional[str] = Field(None, description="Token for the next page; null on the last page")
+
+class AnalysisResultView(BaseModel):
+    """Model for a decrypted analysis result, possibly limited to selected fields."""
+    id: Optional[str] = Field(None, description="Analysis ID (batch responses)")
+    summary: Optional[str] = Field(None, description="AI-generated summary of the logs")
+    matched_techniques: Optional[List[AttackTechnique]] = Field(None, description="Matching MITRE ATT&CK techniques")
+    enhanced_analysis: Optional[str] = Field(None, description="Enhanced AI analysis with threat intelligence")
+    analysis_timestamp: Optional[datetime] = Field(None, description="When the analysis was performed")
+    processing_time_ms: Optional[float] = Field(None, description="Processing time in milliseconds")
+
+class AnalysisBatchRequest(BaseModel):
+    """Model for fetching several analysis results at once."""
+    analysis_ids: List[str] = Field(..., min_length=1, max_length=100, description="Analysis IDs to fetch")
+    fields: Optional[List[str]] = Field(None, description="Fields to decrypt: summary, matched_techniques, enhanced_analysis (default: all)")
+
 class UserAnalyticsStats(BaseModel):
     """Model for user analytics statistics."""
     total_analyses: int = Field(..., description="Total number of analyses performed")
     avg_processing_time: float = Field(..., description="Average processing time")
-    most_common_techniques: List[Dict[str, Any]] = Field(..., description="Most frequently matched techniques")
     analysis_timeline: List[Dict[str, Any]] = Field(..., description="Analysis activity over time")
+    avg_techniques_per_analysis: float = Field(default=0.0, description="Average number of matched techniques")
+    techniques_count_histogram: Dict[str, int] = Field(default_factory=dict, description="Analyses by number of matched techniques")
@@ -7,6 +7,15 @@ class LogAnalysisRequest(BaseModel):
     logs: str = Field(..., description="System logs to analyze", max_length=50000)
     enhance_with_ai: bool = Field(default=True, description="Whether to enhance analysis with AI")
     max_results: Optional[int] = Field(default=5, description="Maximum number of ATT&CK techniques to return", ge=1, le=20)
+    prerag_filter: bool = Field(default=True, description="Drop non-threat log lines before the LLM (when the server has a threat model)")
+
+class PreRAGFilterReport(BaseModel):
+    """What server-side pre-RAG filtering removed before summarization."""
+    lines_total: int = Field(..., description="Non-empty log lines submitted")
+    lines_kept: int = Field(..., description="Lines sent to the LLM")
+    lines_dropped: int = Field(..., description="Lines filtered out")
+    chars_dropped: int = Field(..., description="Characters filtered out")
+    tokens_dropped: int = Field(..., description="Estimated prompt tokens saved")
 
 class AttackTechnique(BaseModel):
     """Model for MITRE ATT&CK technique."""
@@ -24,6 +33,21 @@ class LogAnalysisResponse(BaseModel):
     enhanced_analysis: Optional[str] = Field(None, description="Enhanced AI analysis with threat intelligence")
     analysis_timestamp: datetime = Field(default_factory=datetime.utcnow, description="When the analysis was performed")
     processing_time_ms: Optional[float] = Field(None, description="Processing time in milliseconds")
+    prerag_filter: Optional[PreRAGFilterReport] = Field(None, description="Pre-RAG filtering applied to the logs, if any")
+
+class UploadAnalysisResponse(BaseModel):
+    """Response model for the analysis of an uploaded log file."""
+    filename: Optional[str] = Field(None, description="Name of the uploaded file, if given")
+    bytes_received: int = Field(..., description="Size of the upload as sent (compressed or not)")
+    lines_total: int = Field(..., description="Non-empty log lines read (a lower bound when truncated)")
+    threat_lines: int = Field(..., description="Lines classified as threats by the pre-RAG filter (a lower bound when truncated)")
+    threat_model_available: bool = Field(..., description="Whether a threat model classified the lines; without one every line counts as a threat")
+    lines_analyzed: int = Field(..., description="Lines sent to the LLM")
+    chunks_analyzed: int = Field(..., description="Number of analyses run")
+    truncated: bool = Field(False, description="Whether reading stopped at the chunk limit (or when the server became overloaded) with input left")
+    tokens_dropped: int = Field(..., description="Estimated prompt tokens saved by filtering (a lower bound when truncated)")
+    analyses: List[LogAnalysisResponse] = Field(default_factory=list, description="Analysis of each chunk, in file order")
+    processing_time_ms: Optional[float] = Field(None, description="Processing time in milliseconds")
 
 class DatabaseStats(BaseModel):
     """Model for database statistics."""
@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
 
 class UserBase(BaseModel):
@@ -16,10 +17,26 @@ class UserUpdate(BaseModel):
     email: str | None = None
     username: str | None = None
     cli_active: bool | None = None
+    analysis_retention_days: int | None = Field(default=None, ge=1)
 class PasswordChange(BaseModel):
     current_password: str
     new_password: str
 
+class ReencryptionStatus(BaseModel):
+    status: str
+    phase: str | None = None
+    analyses_total: int = 0
+    analyses_reencrypted: int = 0
+    chunks_reencrypted: int = 0
+    failed: int = 0
+    progress: float = 0.0
+    error: str | None = None
+    started_at: datetime | None = None
+    updated_at: datetime | None = None
+    finished_at: datetime | None = None
+    # Set when old keys were dropped with items still under them (after the retry window)
+    old_keys_discarded_at: datetime | None = None
+
 class UserInDB(UserBase):
     hashed_password: str
 
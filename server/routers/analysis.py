@@ -1,14 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any, List
-import time, re
-from pydantic import BaseModel
-from model.logs_model import LogAnalysisRequest, LogAnalysisResponse, AttackTechnique
-from model.analysis_model import AnalysisHistoryItem, UserAnalyticsStats
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio, time, re, csv, io, json
+from datetime import datetime
+from pydantic import BaseModel, ValidationError
+from model.logs_model import (
+    LogAnalysisRequest, LogAnalysisResponse, AttackTechnique, PreRAGFilterReport, UploadAnalysisResponse
+)
+from model.analysis_model import (
+    AnalysisHistoryItem, AnalysisHistoryPage, AnalysisResultView, AnalysisBatchRequest, UserAnalyticsStats
+)
 from services import GeminiService, ChromaDBService
 from services.analysis_storage_service import analysis_storage_service
 from services.mitre_validation_service import mitre_validation_service
+from services.prerag_filter_service import prerag_filter_service
+from services.log_upload_service import (
+    UploadBusy, UploadChunker, UploadTooLarge, spool_multipart, spool_stream, read_lines, upload_limiter
+)
+from services.streaming import format_sse_event, SSE_HEADERS
 from routers.auth import get_current_user
-from core import logger
+from core import Config, logger
+from core.admission import Overloaded, admission, analyze_admission, request_priority
 
 router = APIRouter(prefix="/api/v1", tags=["Log Analysis"])
 
@@ -16,13 +28,16 @@ router = APIRouter(prefix="/api/v1", tags=["Log Analysis"])
 gemini_service: GeminiService = None
 chromadb_service: ChromaDBService = None
 
+# Bounded, per-user fair admission for everything that runs the analysis pipeline
+ANALYZE_ADMISSION = [Depends(admission(analyze_admission, get_current_user))]
+
 def set_services(gemini: GeminiService, chromadb: ChromaDBService):
     """Set service instances for the router."""
     global gemini_service, chromadb_service
     gemini_service = gemini
     chromadb_service = chromadb
 
-@router.post("/analyze", response_model=LogAnalysisResponse)
+@router.post("/analyze", response_model=LogAnalysisResponse, dependencies=ANALYZE_ADMISSION)
 async def analyze_logs(request: LogAnalysisRequest, current_user: dict = Depends(get_current_user)) -> LogAnalysisResponse:
     """
     Analyze system logs using AI summarization and MITRE ATT&CK technique matching.
@@ -47,117 +62,7 @@ async def analyze_logs(request: LogAnalysisRequest, current_user: dict = Depends
                 detail="Services not properly initialized"
             )
         
-        logger.info(f"Starting log analysis for {len(request.logs)} characters of logs")
-        
-        # Step 1: Summarize logs with Gemini AI
-        logger.info("Generating log summary with Gemini AI")
-        summary = await gemini_service.summarize_logs(request.logs)
-        
-        if not summary:
-            logger.error("Failed to generate summary: empty response")
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to generate log summary: empty response"
-            )
-        
-        # Clean the summary - remove any error prefixes that might be mistaken for actual errors
-        if summary.startswith("Error generating summary:"):
-            logger.error(f"Failed to generate summary: {summary}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to generate log summary: {summary}"
-            )
-        
-        # Step 2: Search for matching MITRE ATT&CK techniques
-        logger.info("Searching for matching ATT&CK techniques")
-        techniques_data = await chromadb_service.search_techniques(
-            query=summary,
-            n_results=request.max_results
-        )
-        
-        # Convert to response models
-        matched_techniques = [
-            AttackTechnique(
-                technique_id=tech['technique_id'],
-                name=tech['name'],
-                description=tech['description'],
-                kill_chain_phases=tech['kill_chain_phases'],
-                platforms=tech['platforms'],
-                relevance_score=tech['relevance_score']
-            )
-            for tech in techniques_data
-        ]
-        
-        # Step 2.5: Validate MITRE techniques to prevent hallucination
-        logger.info("Validating MITRE techniques against official framework")
-        validation_report = mitre_validation_service.validate_techniques_list(
-            [tech.model_dump() for tech in matched_techniques]
-        )
-        
-        # Check validation results and add warning to summary if needed
-        validation_summary = validation_report['validation_summary']
-        logger.info(f"Validation: {validation_summary['valid_techniques']}/{validation_summary['total_techniques']} "
-                   f"techniques valid (confidence: {validation_summary['average_confidence']:.2f})")
-        
-        # Define validation thresholds for warning
-        min_validation_rate = 0.6  # At least 60% of techniques should be valid
-        min_avg_confidence = 0.5   # Average confidence should be at least 50%
-        max_hallucinated = 3       # Maximum 3 hallucinated techniques
-        
-        validation_rate = validation_summary['validation_rate']
-        avg_confidence = validation_summary['average_confidence']
-        hallucinated_count = validation_report['issues']['likely_hallucinated']
-        
-        # Filter out low-confidence techniques and prepare validation warning
-        validated_techniques = []
-        filtered_count = 0
-        validation_warning = ""
-        
-        for i, result in enumerate(validation_report['detailed_results']):
-            if result.is_valid or result.confidence_score > 0.7:
-                # Use corrected data if available
-                if result.corrected_data:
-                    validated_techniques.append(AttackTechnique(**result.corrected_data))
-                    logger.info(f"Using corrected data for technique: {result.technique_id}")
-                else:
-                    validated_techniques.append(matched_techniques[i])
-            else:
-                filtered_count += 1
-                logger.warning(f"Filtered out low-confidence technique: {result.technique_id} "
-                             f"(confidence: {result.confidence_score:.2f})")
-        
-        matched_techniques = validated_techniques
-        
-        # Add validation warning to summary if quality is poor
-        if (validation_rate < min_validation_rate or 
-            avg_confidence < min_avg_confidence or 
-            hallucinated_count > max_hallucinated or
-            filtered_count > 0):
-            
-            warning_parts = []
-            if filtered_count > 0:
-                warning_parts.append(f"filtered out {filtered_count} unverified technique(s)")
-            if hallucinated_count > 0:
-                warning_parts.append(f"detected {hallucinated_count} potentially hallucinated technique(s)")
-            if validation_rate < min_validation_rate:
-                warning_parts.append(f"validation rate was {validation_rate:.1%} (below recommended 60%)")
-            
-            validation_warning = (
-                f"\n\n⚠️ MITRE ATT&CK Validation Notice: "
-                f"The MITRE framework identification may not be fully accurate. "
-                f"Analysis {', '.join(warning_parts)}. "
-                f"Please verify technique relevance manually. "
-                f"Consider refining your log query for better technique matching."
-            )
-            
-            logger.warning(f"Added validation warning to summary: {len(warning_parts)} issues detected")
-        
-        # Append validation warning to summary if present
-        if validation_warning:
-            summary += validation_warning
-        
-        if filtered_count > 0:
-            logger.info(f"Filtered out {filtered_count} low-confidence techniques, proceeding with {len(matched_techniques)} validated techniques")
+        summary, techniques_data, matched_techniques, prerag_report = await _summarize_and_match(request)
         
         # Step 3: Enhanced analysis (if requested)
         enhanced_analysis = None
@@ -175,20 +80,11 @@ async def analyze_logs(request: LogAnalysisRequest, current_user: dict = Depends
             summary=summary,
             matched_techniques=matched_techniques,
             enhanced_analysis=enhanced_analysis,
-            processing_time_ms=processing_time
+            processing_time_ms=processing_time,
+            prerag_filter=prerag_report
         )
         
-        # Store the analysis result in encrypted format
-        try:
-            analysis_id = await analysis_storage_service.store_analysis_result(
-                user_id=current_user["username"],
-                request=request,
-                response=response
-            )
-            logger.info(f"Stored analysis result with ID {analysis_id} for user {current_user['username']}")
-        except Exception as e:
-            logger.error(f"Failed to store analysis result: {str(e)}")
-            # Continue without failing the request - storage is not critical for the response
+        await _store_analysis(current_user, request, response)
         
         return response
         
@@ -201,6 +97,346 @@ async def analyze_logs(request: LogAnalysisRequest, current_user: dict = Depends
             detail=f"Internal server error: {str(e)}"
         )
 
+@router.post("/analyze/stream", dependencies=ANALYZE_ADMISSION)
+async def analyze_logs_stream(
+    request: LogAnalysisRequest,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Server-Sent Events variant of `/analyze` that streams the enhanced analysis.
+    
+    Summarization, technique matching and validation run before the stream opens, so
+    errors there still surface as regular HTTP errors. The stream then emits:
+    1. `techniques`: the summary and validated techniques
+    2. `token`: one event per enhanced-analysis chunk (only when enhancement is requested)
+    3. `done`: processing time and the stored analysis ID
+    
+    The enhancement stream takes its own admission slot; if it is shed, an `error` event
+    with `retry_after` is sent and the analysis is stored without enhancement.
+    
+    Args:
+        request: LogAnalysisRequest containing logs and analysis parameters
+        
+    Returns:
+        StreamingResponse with `text/event-stream` content
+    """
+    start_time = time.time()
+    
+    if not gemini_service or not chromadb_service:
+        raise HTTPException(
+            status_code=500,
+            detail="Services not properly initialized"
+        )
+    
+    try:
+        summary, techniques_data, matched_techniques, prerag_report = await _summarize_and_match(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in streaming log analysis: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+    
+    async def event_stream():
+        yield format_sse_event("techniques", {
+            "summary": summary,
+            "matched_techniques": [tech.model_dump() for tech in matched_techniques],
+            "prerag_filter": prerag_report.model_dump() if prerag_report else None
+        })
+        
+        enhanced_analysis = None
+        if request.enhance_with_ai and matched_techniques:
+            logger.info("Streaming enhanced threat analysis")
+            chunks = []
+            try:
+                async with analyze_admission.admit_request(http_request, current_user["username"]):
+                    async for text in gemini_service.stream_threat_analysis(summary, techniques_data):
+                        chunks.append(text)
+                        yield format_sse_event("token", {"text": text})
+            except Overloaded as e:
+                logger.warning(f"Shedding enhancement stream: {e.reason}")
+                yield format_sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+            except Exception as e:
+                logger.error(f"Error streaming threat analysis enhancement: {str(e)}")
+                yield format_sse_event("error", {"detail": f"Error enhancing analysis: {str(e)}"})
+            enhanced_analysis = "".join(chunks).strip() or None
+        
+        processing_time = (time.time() - start_time) * 1000
+        response = LogAnalysisResponse(
+            summary=summary,
+            matched_techniques=matched_techniques,
+            enhanced_analysis=enhanced_analysis,
+            processing_time_ms=processing_time,
+            prerag_filter=prerag_report
+        )
+        analysis_id = await _store_analysis(current_user, request, response)
+        
+        yield format_sse_event("done", {
+            "processing_time_ms": round(processing_time, 2),
+            "analysis_id": analysis_id
+        })
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _spool_upload(request: Request) -> Tuple[Any, Optional[str], int]:
+    """Spool a multipart (`file` field) or raw request body to disk: (file, filename, size)."""
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > Config.UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(Config.UPLOAD_MAX_BYTES)
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # Parsed as it streams in, so chunked forms are bounded like raw bodies
+        spool, filename = await spool_multipart(request.stream(), content_type)
+    else:
+        spool, filename = await spool_stream(request.stream()), None
+    spool.seek(0, io.SEEK_END)
+    size = spool.tell()
+    spool.seek(0)
+    return spool, filename, size
+
+@router.post("/analyze/upload", response_model=UploadAnalysisResponse)
+async def analyze_upload(
+    request: Request,
+    filename: Optional[str] = None,
+    enhance_with_ai: bool = True,
+    max_results: int = 5,
+    current_user: dict = Depends(get_current_user)
+) -> UploadAnalysisResponse:
+    """
+    Analyze a log file of any size, sent as a multipart form (`file` field) or as the raw
+    request body (plain text or gzip, which may be sent with chunked transfer encoding).
+    
+    The upload is spooled to disk, then read line by line: the pre-RAG threat filter keeps
+    the threat lines, which are analyzed in order in chunks of UPLOAD_CHUNK_CHARS (each
+    stored as its own analysis). At most UPLOAD_MAX_CHUNKS chunks are analyzed; the
+    response says whether the file was read to the end (counts are lower bounds when not).
+    Memory use is bounded by the chunk size, not the file size.
+    
+    Uploads are limited to UPLOAD_MAX_CONCURRENT at once (UPLOAD_USER_MAX_CONCURRENT per
+    user; 429 beyond that). The upload itself is received and read outside admission
+    control; each chunk analysis is admitted on its own, so other requests are scheduled
+    between chunks. If a later chunk is shed, the analyses so far are returned as truncated.
+    
+    Args:
+        filename: Name of the file, for raw body uploads
+        enhance_with_ai: Whether to enhance each chunk's analysis with AI
+        max_results: Maximum number of ATT&CK techniques per chunk
+        current_user: Current authenticated user
+        
+    Returns:
+        UploadAnalysisResponse with the line counts and each chunk's analysis
+    """
+    start_time = time.time()
+    
+    if not gemini_service or not chromadb_service:
+        raise HTTPException(
+            status_code=500,
+            detail="Services not properly initialized"
+        )
+    
+    spool = None
+    try:
+        async with upload_limiter.slot(current_user["username"]):
+            spool, form_filename, bytes_received = await _spool_upload(request)
+            chunker = UploadChunker(read_lines(spool))
+            analyses = []
+            while True:
+                chunk = await asyncio.to_thread(chunker.next_chunk)
+                if chunk is None:
+                    break
+                chunk_request = LogAnalysisRequest(
+                    logs=chunk,
+                    enhance_with_ai=enhance_with_ai,
+                    max_results=max_results,
+                    prerag_filter=False  # already filtered line by line
+                )
+                try:
+                    # Charge fair queuing for the logs sent to the LLM, not the raw upload
+                    async with analyze_admission.admit(request_priority(request), current_user["username"], len(chunk)):
+                        analyses.append(await analyze_logs(chunk_request, current_user))
+                except Overloaded:
+                    if not analyses:
+                        raise
+                    chunker.abandon(chunk)
+                    break
+    except UploadBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if spool is not None:
+            spool.close()
+    
+    processing_time = (time.time() - start_time) * 1000
+    logger.info(f"Upload analysis completed in {processing_time:.2f}ms: {chunker.lines_analyzed}/"
+                f"{chunker.lines_total} lines in {chunker.chunks} chunks"
+                + (" (truncated)" if chunker.truncated else ""))
+    
+    return UploadAnalysisResponse(
+        filename=filename or form_filename,
+        bytes_received=bytes_received,
+        lines_total=chunker.lines_total,
+        threat_lines=chunker.threat_lines,
+        threat_model_available=prerag_filter_service.available,
+        lines_analyzed=chunker.lines_analyzed,
+        chunks_analyzed=chunker.chunks,
+        truncated=chunker.truncated,
+        tokens_dropped=chunker.tokens_dropped,
+        analyses=analyses,
+        processing_time_ms=processing_time
+    )
+
+async def _summarize_and_match(
+    request: LogAnalysisRequest
+) -> Tuple[str, List[Dict[str, Any]], List[AttackTechnique], Optional[PreRAGFilterReport]]:
+    """
+    Filter and summarize the logs, search matching ATT&CK techniques and validate them.
+    
+    Returns:
+        Tuple of (summary with any validation warning appended, raw search results,
+        validated techniques, pre-RAG filter report or None if the logs were not filtered)
+    """
+    logger.info(f"Starting log analysis for {len(request.logs)} characters of logs")
+    
+    # Step 0: Drop non-threat lines so noise does not consume prompt tokens
+    logs, prerag_result = request.logs, None
+    if request.prerag_filter:
+        logs, prerag_result = await prerag_filter_service.filter_logs(request.logs)
+    prerag_report = PreRAGFilterReport(**prerag_result.report()) if prerag_result else None
+    
+    # Step 1: Summarize logs with Gemini AI
+    logger.info("Generating log summary with Gemini AI")
+    summary = await gemini_service.summarize_logs(logs)
+    
+    if not summary:
+        logger.error("Failed to generate summary: empty response")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate log summary: empty response"
+        )
+    
+    # Clean the summary - remove any error prefixes that might be mistaken for actual errors
+    if summary.startswith("Error generating summary:"):
+        logger.error(f"Failed to generate summary: {summary}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate log summary: {summary}"
+        )
+    
+    # Step 2: Search for matching MITRE ATT&CK techniques
+    logger.info("Searching for matching ATT&CK techniques")
+    techniques_data = await chromadb_service.search_techniques(
+        query=summary,
+        n_results=request.max_results
+    )
+    
+    # Convert to response models
+    matched_techniques = [
+        AttackTechnique(
+            technique_id=tech['technique_id'],
+            name=tech['name'],
+            description=tech['description'],
+            kill_chain_phases=tech['kill_chain_phases'],
+            platforms=tech['platforms'],
+            relevance_score=tech['relevance_score']
+        )
+        for tech in techniques_data
+    ]
+    
+    # Step 2.5: Validate MITRE techniques to prevent hallucination
+    logger.info("Validating MITRE techniques against official framework")
+    validation_report = mitre_validation_service.validate_techniques_list(
+        [tech.model_dump() for tech in matched_techniques]
+    )
+    
+    # Check validation results and add warning to summary if needed
+    validation_summary = validation_report['validation_summary']
+    logger.info(f"Validation: {validation_summary['valid_techniques']}/{validation_summary['total_techniques']} "
+               f"techniques valid (confidence: {validation_summary['average_confidence']:.2f})")
+    
+    # Define validation thresholds for warning
+    min_validation_rate = 0.6  # At least 60% of techniques should be valid
+    min_avg_confidence = 0.5   # Average confidence should be at least 50%
+    max_hallucinated = 3       # Maximum 3 hallucinated techniques
+    
+    validation_rate = validation_summary['validation_rate']
+    avg_confidence = validation_summary['average_confidence']
+    hallucinated_count = validation_report['issues']['likely_hallucinated']
+    
+    # Filter out low-confidence techniques and prepare validation warning
+    validated_techniques = []
+    filtered_count = 0
+    validation_warning = ""
+    
+    for i, result in enumerate(validation_report['detailed_results']):
+        if result.is_valid or result.confidence_score > 0.7:
+            # Use corrected data if available
+            if result.corrected_data:
+                validated_techniques.append(AttackTechnique(**result.corrected_data))
+                logger.info(f"Using corrected data for technique: {result.technique_id}")
+            else:
+                validated_techniques.append(matched_techniques[i])
+        else:
+            filtered_count += 1
+            logger.warning(f"Filtered out low-confidence technique: {result.technique_id} "
+                         f"(confidence: {result.confidence_score:.2f})")
+    
+    matched_techniques = validated_techniques
+    
+    # Add validation warning to summary if quality is poor
+    if (validation_rate < min_validation_rate or 
+        avg_confidence < min_avg_confidence or 
+        hallucinated_count > max_hallucinated or
+        filtered_count > 0):
+        
+        warning_parts = []
+        if filtered_count > 0:
+            warning_parts.append(f"filtered out {filtered_count} unverified technique(s)")
+        if hallucinated_count > 0:
+            warning_parts.append(f"detected {hallucinated_count} potentially hallucinated technique(s)")
+        if validation_rate < min_validation_rate:
+            warning_parts.append(f"validation rate was {validation_rate:.1%} (below recommended 60%)")
+        
+        validation_warning = (
+            f"\n\n⚠️ MITRE ATT&CK Validation Notice: "
+            f"The MITRE framework identification may not be fully accurate. "
+            f"Analysis {', '.join(warning_parts)}. "
+            f"Please verify technique relevance manually. "
+            f"Consider refining your log query for better technique matching."
+        )
+        
+        logger.warning(f"Added validation warning to summary: {len(warning_parts)} issues detected")
+    
+    # Append validation warning to summary if present
+    if validation_warning:
+        summary += validation_warning
+    
+    if filtered_count > 0:
+        logger.info(f"Filtered out {filtered_count} low-confidence techniques, proceeding with {len(matched_techniques)} validated techniques")
+    
+    return summary, techniques_data, matched_techniques, prerag_report
+
+async def _store_analysis(current_user: dict, request: LogAnalysisRequest, response: LogAnalysisResponse) -> Optional[str]:
+    """Store the analysis result in encrypted format; storage failures never fail the request."""
+    try:
+        analysis_id = await analysis_storage_service.store_analysis_result(
+            user_id=current_user["username"],
+            request=request,
+            response=response
+        )
+        logger.info(f"Stored analysis result with ID {analysis_id} for user {current_user['username']}")
+        return analysis_id
+    except Exception as e:
+        logger.error(f"Failed to store analysis result: {str(e)}")
+        # Continue without failing the request - storage is not critical for the response
+        return None
+
 
 @router.post("/search-techniques")
 async def search_techniques(query: str, max_results: int = 5) -> Dict[str, Any]:
@@ -328,25 +564,182 @@ async def get_analysis_history(
             detail=f"Failed to get analysis history: {str(e)}"
         )
 
-@router.get("/history/{analysis_id}", response_model=LogAnalysisResponse)
+@router.get("/history/page", response_model=AnalysisHistoryPage)
+async def get_analysis_history_page(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+) -> AnalysisHistoryPage:
+    """
+    Get one page of the user's analysis history using cursor (keyset) pagination.
+    
+    Unlike offset pagination, deep pages cost the same as the first one.
+    
+    Args:
+        limit: Maximum number of results to return (default: 10, max: 50)
+        cursor: next_cursor from the previous page; omit for the first page
+        current_user: Current authenticated user
+        
+    Returns:
+        History items (without sensitive data) and the cursor for the next page
+    """
+    if limit > 50:
+        limit = 50
+    if limit < 1:
+        limit = 10
+    
+    try:
+        items, next_cursor = await analysis_storage_service.get_user_analysis_history_page(
+            user_id=current_user["username"],
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting analysis history page: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get analysis history: {str(e)}"
+        )
+    
+    logger.info(f"Retrieved {len(items)} history items for user {current_user['username']}")
+    return {"items": items, "next_cursor": next_cursor}
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated `fields` query parameter."""
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _csv_row(values: List[Any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+@router.get("/history/export")
+async def export_analysis_history(
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+) -> StreamingResponse:
+    """
+    Export the user's whole analysis history, decrypted, as a streamed download.
+    
+    Analyses are streamed newest first straight from a database cursor, so memory use
+    does not grow with the history size.
+    
+    Args:
+        format: "ndjson" (one JSON object per line) or "csv"
+        fields: Comma-separated fields to include (summary, matched_techniques, enhanced_analysis; default: all)
+        current_user: Current authenticated user
+        
+    Returns:
+        Streaming NDJSON or CSV download
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format} (use ndjson or csv)")
+    try:
+        selected_fields = analysis_storage_service.resolve_fields(_parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    user_id = current_user["username"]
+    
+    async def generate():
+        exported = 0
+        if format == "csv":
+            yield _csv_row(["id", "analysis_timestamp", "processing_time_ms"] + selected_fields)
+        try:
+            async for item in analysis_storage_service.iter_decrypted_analyses(user_id, selected_fields):
+                if format == "csv":
+                    values = [item["id"], item["analysis_timestamp"], item["processing_time_ms"]]
+                    for field in selected_fields:
+                        value = item.get(field)
+                        if field == "matched_techniques":
+                            # Technique IDs keep CSV cells readable; NDJSON carries the full objects
+                            value = ";".join(t.get("technique_id", "") for t in value or [])
+                        values.append(value if value is not None else "")
+                    yield _csv_row(values)
+                else:
+                    yield json.dumps(item, default=str, ensure_ascii=False) + "\n"
+                exported += 1
+        except Exception as e:
+            # Headers are already sent; mark the NDJSON export as truncated
+            logger.error(f"History export for user {user_id} failed after {exported} items: {str(e)}")
+            if format == "ndjson":
+                yield json.dumps({"error": "Export interrupted", "exported": exported}) + "\n"
+            return
+        logger.info(f"Exported {exported} analyses for user {user_id} as {format}")
+    
+    filename = f"logiq-history-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/history/batch", response_model=List[AnalysisResultView], response_model_exclude_unset=True)
+async def get_analysis_results_batch(
+    request: AnalysisBatchRequest,
+    current_user: dict = Depends(get_current_user)
+) -> List[AnalysisResultView]:
+    """
+    Get several analysis results at once, decrypting them in parallel.
+    
+    Args:
+        request: Analysis IDs (max 100) and optionally the fields to decrypt
+        current_user: Current authenticated user
+        
+    Returns:
+        Results in request order; IDs that are not found are omitted
+    """
+    try:
+        results = await analysis_storage_service.get_analysis_results(
+            user_id=current_user["username"],
+            analysis_ids=request.analysis_ids,
+            fields=request.fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting analysis results batch: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get analysis results: {str(e)}"
+        )
+    
+    logger.info(f"Retrieved {len(results)}/{len(request.analysis_ids)} analysis results for user {current_user['username']}")
+    return results
+
+@router.get("/history/{analysis_id}", response_model=AnalysisResultView, response_model_exclude_unset=True)
 async def get_analysis_result(
     analysis_id: str,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
-) -> LogAnalysisResponse:
+) -> AnalysisResultView:
     """
     Get a specific analysis result by ID.
     
     Args:
         analysis_id: The analysis ID to retrieve
+        fields: Comma-separated fields to read and decrypt, e.g. "matched_techniques"
+            (summary, matched_techniques, enhanced_analysis; default: all)
         current_user: Current authenticated user
         
     Returns:
-        Complete analysis result with decrypted data
+        Analysis result with the requested fields decrypted
     """
     try:
         result = await analysis_storage_service.get_analysis_result(
             user_id=current_user["username"],
-            analysis_id=analysis_id
+            analysis_id=analysis_id,
+            fields=_parse_fields(fields)
         )
         
         if not result:
@@ -360,6 +753,8 @@ async def get_analysis_result(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting analysis result {analysis_id}: {str(e)}")
         raise HTTPException(
@@ -367,6 +762,61 @@ async def get_analysis_result(
             detail=f"Failed to get analysis result: {str(e)}"
         )
 
+@router.get("/history/{analysis_id}/logs", response_class=PlainTextResponse)
+async def get_analysis_logs(
+    analysis_id: str,
+    current_user: dict = Depends(get_current_user)
+) -> PlainTextResponse:
+    """
+    Get the archived raw logs an analysis was run on.
+    
+    Args:
+        analysis_id: The analysis ID
+        current_user: Current authenticated user
+        
+    Returns:
+        The original logs as plain text
+    """
+    logs = await analysis_storage_service.get_analysis_logs(current_user["username"], analysis_id)
+    if logs is None:
+        raise HTTPException(status_code=404, detail="Archived logs not found for this analysis")
+    return PlainTextResponse(logs)
+
+@router.post("/history/{analysis_id}/reanalyze", response_model=LogAnalysisResponse,
+             dependencies=ANALYZE_ADMISSION)
+async def reanalyze_logs(
+    analysis_id: str,
+    enhance_with_ai: bool = True,
+    max_results: int = 5,
+    current_user: dict = Depends(get_current_user)
+) -> LogAnalysisResponse:
+    """
+    Re-run analysis on the archived logs of a previous analysis.
+    
+    The new result is stored as a separate analysis referencing the same archived logs,
+    so nothing needs to be re-sent.
+    
+    Args:
+        analysis_id: The analysis whose logs should be re-analyzed
+        enhance_with_ai: Whether to enhance analysis with AI
+        max_results: Maximum number of ATT&CK techniques to return
+        current_user: Current authenticated user
+        
+    Returns:
+        LogAnalysisResponse for the new analysis
+    """
+    logs = await analysis_storage_service.get_analysis_logs(current_user["username"], analysis_id)
+    if logs is None:
+        raise HTTPException(status_code=404, detail="Archived logs not found for this analysis")
+    
+    try:
+        request = LogAnalysisRequest(logs=logs, enhance_with_ai=enhance_with_ai, max_results=max_results)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Cannot re-analyze archived logs: {e.errors()[0]['msg']}")
+    
+    logger.info(f"Re-analyzing archived logs of analysis {analysis_id} for user {current_user['username']}")
+    return await analyze_logs(request, current_user)
+
 @router.delete("/history/{analysis_id}")
 async def delete_analysis_result(
     analysis_id: str,
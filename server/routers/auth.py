@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer,OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from core import  security
+from core import  security, Config, TTLCache
 from core.config import settings
 from model.users import UserBase,UserCreate,UserInDB,Token,TokenData,LoginRequest
 from db import database
@@ -11,6 +11,16 @@ router = APIRouter(tags=["Authentication"])
 # Updated tokenUrl to match the OAuth2 token endpoint for Swagger UI
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+# Authenticated user documents keyed by (username, token issued-at), so hot endpoints
+# skip the user lookup. Short TTL bounds staleness across worker processes.
+user_cache = TTLCache(
+    maxsize=Config.AUTH_USER_CACHE_SIZE, ttl=Config.AUTH_USER_CACHE_TTL_SECONDS, name="auth_users"
+)
+
+def invalidate_cached_user(username: str) -> None:
+    """Drop cached user documents for a username (after profile/password changes or deletion)."""
+    user_cache.pop_where(lambda key: key[0] == username)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -25,10 +35,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = await database.user_collection.find_one({"username": token_data.username})
+    cache_key = (token_data.username, payload.get("iat"))
+    user = user_cache.get(cache_key)
     if user is None:
-        raise credentials_exception
-    return user
+        user = await database.user_collection.find_one({"username": token_data.username})
+        if user is None:
+            raise credentials_exception
+        user_cache.set(cache_key, user)
+    # Callers get their own copy so they cannot alter the cached document
+    return dict(user)
 
 @router.post("/register", response_model=UserBase)
 async def register_user(user: UserCreate):
@@ -36,7 +51,7 @@ async def register_user(user: UserCreate):
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = security.get_password_hash(user.password)
+    hashed_password = await security.get_password_hash_async(user.password)
     user_in_db = UserInDB(
         email=user.email, 
         username=user.username, 
@@ -65,7 +80,7 @@ async def login(login_data: LoginRequest):
     if not user:
         user = await database.user_collection.find_one({"username": username_or_email})
     
-    if not user or not security.verify_password(password, user["hashed_password"]):
+    if not user or not await security.verify_password_async(password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -89,7 +104,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     if not user:
         user = await database.user_collection.find_one({"username": form_data.username})
     
-    if not user or not security.verify_password(form_data.password, user["hashed_password"]):
+    if not user or not await security.verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
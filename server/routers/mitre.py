@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, Body
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Body, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional, Tuple
 import json
+import time
 from pydantic import BaseModel, Field
 import json
 from core import logger
-from services import AWSBedrockService, ChromaDBService, GeminiService
+from core.admission import Overloaded, admission, rag_query_admission, batch_search_admission
+from services import AWSBedrockService, ChromaDBService, GeminiService, LLMProviderRouter
+from services.streaming import format_sse_event, SSE_HEADERS
+from services.rag_context_builder import rag_context_builder, RagContext, estimate_tokens, MIN_TOKEN_BUDGET
 
 router = APIRouter(prefix="/api/mitre", tags=["MITRE ATT&CK Framework"])
 
@@ -12,13 +17,21 @@ router = APIRouter(prefix="/api/mitre", tags=["MITRE ATT&CK Framework"])
 aws_bedrock_service: Optional[AWSBedrockService] = None
 chromadb_service: Optional[ChromaDBService] = None
 gemini_service: Optional[GeminiService] = None
+llm_router: Optional[LLMProviderRouter] = None
 
-def set_mitre_services(bedrock_service: AWSBedrockService, chroma_service: ChromaDBService, gemini_svc: Optional[GeminiService] = None):
+def set_mitre_services(bedrock_service: AWSBedrockService, chroma_service: ChromaDBService, gemini_svc: Optional[GeminiService] = None, router_svc: Optional[LLMProviderRouter] = None):
     """Set the services for the MITRE router."""
-    global aws_bedrock_service, chromadb_service, gemini_service
+    global aws_bedrock_service, chromadb_service, gemini_service, llm_router
     aws_bedrock_service = bedrock_service
     chromadb_service = chroma_service
     gemini_service = gemini_svc
+    llm_router = router_svc
+
+def _conversational_llm():
+    """LLM used for conversational answers: the hedging router when configured, else Gemini -> AWS Bedrock."""
+    if llm_router:
+        return llm_router
+    return gemini_service if gemini_service else aws_bedrock_service
 
 # Request/Response Models
 class MitreSearchRequest(BaseModel):
@@ -49,6 +62,7 @@ class RagQueryRequest(BaseModel):
     query: str = Field(..., description="User query for RAG-based MITRE analysis")
     max_context_techniques: Optional[int] = Field(5, description="Maximum number of techniques to include in context", ge=1, le=10)
     include_source_techniques: Optional[bool] = Field(True, description="Whether to include source technique details in response")
+    context_token_budget: Optional[int] = Field(None, description="Token budget for the generated prompt (defaults to server setting)", ge=MIN_TOKEN_BUDGET, le=32000)
 
 class RagQueryResponse(BaseModel):
     query: str
@@ -58,6 +72,7 @@ class RagQueryResponse(BaseModel):
     processing_time_ms: float
     embedding_model: str
     total_techniques_found: int
+    prompt_tokens: Optional[int] = None
 
 @router.post("/search", response_model=MitreSearchResponse)
 async def search_mitre_techniques(request: MitreSearchRequest):
@@ -360,7 +375,8 @@ async def get_all_techniques(
             detail=f"Internal server error: {str(e)}"
         )
 
-@router.post("/batch-search", response_model=List[MitreSearchResponse])
+@router.post("/batch-search", response_model=List[MitreSearchResponse],
+             dependencies=[Depends(admission(batch_search_admission))])
 async def batch_search_mitre_techniques(
     queries: List[str] = Body(..., description="List of search queries", max_items=10)
 ):
@@ -423,7 +439,7 @@ async def batch_search_mitre_techniques(
             detail=f"Internal server error during batch search: {str(e)}"
         )
 
-@router.post("/rag-query", response_model=RagQueryResponse)
+@router.post("/rag-query", response_model=RagQueryResponse, dependencies=[Depends(admission(rag_query_admission))])
 async def rag_mitre_query(request: RagQueryRequest):
     """
     RAG-based query endpoint for conversational MITRE ATT&CK analysis.
@@ -443,51 +459,19 @@ async def rag_mitre_query(request: RagQueryRequest):
             )
         
         logger.info(f"Processing RAG query: {request.query}")
-
-        # Search for relevant techniques using embeddings
-        relevant_techniques = await aws_bedrock_service.search_mitre_techniques(
-            query=request.query,
-            chromadb_service=chromadb_service,
-            n_results=request.max_context_techniques
-        )
-
-        # Detect if the user is asking for a general MITRE ATT&CK overview (high-level intent)
-        lower_q = (request.query or "").lower()
-        overview_triggers = [
-            'what is mitre', 'what is mitre attack', 'explain mitre', 'explain mitre attack',
-            'mitre overview', 'mitre attack overview', 'overview of mitre', 'what is the mitre'
-        ]
-        is_overview_intent = any(trigger in lower_q for trigger in overview_triggers) or (len(request.query.split()) <= 4 and ('mitre' in lower_q or 'attack' in lower_q))
-
-        if is_overview_intent:
-            logger.info('Detected overview intent; generating MITRE ATT&CK overview context.')
-            context = _prepare_overview_context(request.query, relevant_techniques)
-        else:
-            if not relevant_techniques:
-                logger.info('No relevant techniques found; generating a general conversational response.')
-                # Create a general context prompting the model to act as a knowledgeable security assistant
-                context = _prepare_general_context(request.query)
-            else:
-                # Prepare context for AI response generation from found techniques
-                context = _prepare_rag_context(request.query, relevant_techniques)
+        relevant_techniques, context, prompt_tokens = await _retrieve_rag_context(request)
         
-        # Generate conversational response using LLM service (prefer Gemini, fall back to AWS Bedrock)
-        llm_for_response = gemini_service if gemini_service else aws_bedrock_service
+        # Generate conversational response (Gemini first, hedged/failed over to AWS Bedrock)
         try:
-            response_text = await llm_for_response.generate_conversational_response(
+            response_text = await _conversational_llm().generate_conversational_response(
                 query=request.query,
                 context=context
             )
         except Exception as e:
-            logger.warning(f"LLM response generation failed ({'gemini' if gemini_service else 'aws_bedrock'}): {str(e)}, using fallback")
+            logger.warning(f"LLM response generation failed: {str(e)}, using fallback")
             response_text = _generate_fallback_response(request.query, relevant_techniques)
         
-        # Calculate confidence score based on relevance scores (guard against empty list)
-        if relevant_techniques:
-            avg_relevance = sum(tech.get('relevance_score', 0.0) for tech in relevant_techniques) / len(relevant_techniques)
-            confidence_score = min(avg_relevance * 1.2, 1.0)  # Boost confidence slightly
-        else:
-            confidence_score = 0.0
+        confidence_score = _calculate_confidence(relevant_techniques)
         
         processing_time = (time.time() - start_time) * 1000
         
@@ -501,7 +485,8 @@ async def rag_mitre_query(request: RagQueryRequest):
             confidence_score=round(confidence_score, 3),
             processing_time_ms=round(processing_time, 2),
             embedding_model="aws-titan-v2",
-            total_techniques_found=len(relevant_techniques)
+            total_techniques_found=len(relevant_techniques),
+            prompt_tokens=prompt_tokens
         )
         
     except Exception as e:
@@ -511,109 +496,125 @@ async def rag_mitre_query(request: RagQueryRequest):
             detail=f"Internal server error during RAG query: {str(e)}"
         )
 
-def _prepare_rag_context(query: str, techniques: List[Dict[str, Any]]) -> str:
-    """Prepare a high-quality instruction prompt for the model using the top techniques.
+@router.post("/rag-query/stream", dependencies=[Depends(admission(rag_query_admission))])
+async def rag_mitre_query_stream(request: RagQueryRequest, http_request: Request):
+    """
+    Server-Sent Events variant of the RAG query endpoint.
 
-    The prompt asks the model to act as a senior incident responder and MITRE ATT&CK expert.
-    It requests a single JSON object with a clear schema (answer, summary, prioritized findings,
-    detection queries, recommendations, references, follow-up questions, and a confidence score).
-    An example JSON is included to guide the model.
+    Emits a `techniques` event with the matched techniques as soon as retrieval finishes,
+    then one `token` event per chunk generated by the LLM, and a final `done` event with
+    the confidence score and processing time. Failures after the stream has started are
+    reported as an `error` event. The LLM stream holds its own admission slot; if it is
+    shed, the `error` event carries `retry_after` and no tokens are sent.
     """
-    # Limit to top 5 techniques for context
-    context_parts = []
-    for i, technique in enumerate(techniques[:5]):
-        context_parts.append(
-            {
-                "rank": i + 1,
-                "technique_id": technique.get('technique_id', ''),
-                "name": technique.get('name', ''),
-                "description": technique.get('description', ''),
-                "tactics": technique.get('kill_chain_phases', []),
-                "platforms": technique.get('platforms', []),
-                "relevance_score": round(float(technique.get('relevance_score', 0.0)), 3),
-                "source_document": technique.get('document', '')
-            }
+    start_time = time.time()
+
+    if not chromadb_service or not (aws_bedrock_service or gemini_service):
+        raise HTTPException(
+            status_code=503,
+            detail="MITRE RAG services not available: missing ChromaDB or LLM service"
         )
 
-    schema_instructions = (
-        "Return a single, valid JSON object ONLY (no leading/trailing text, no markdown).\n"
-        "Schema (keys and types):\n"
-        "{\n"
-        "  \"version\": string,                    // prompt schema version, e.g. \"1.0\"\n"
-        "  \"answer\": string,                     // concise human-friendly answer (<= 400 words)\n"
-        "  \"summary\": string,                    // 2-3 sentence technical summary\n"
-        "  \"top_findings\": [                     // prioritized findings\n"
-        "    {\n"
-        "      \"technique_id\": string,\n"
-        "      \"name\": string,\n"
-        "      \"relevance_score\": number,\n"
-        "      \"impact\": string,                // Low/Medium/High\n"
-        "      \"recommended_detections\": [string],\n"
-        "      \"recommended_mitigations\": [string]\n"
-        "    }\n"
-        "  ],\n"
-        "  \"detection_queries\": [                 // actionable SIEM/search snippets\n"
-        "    { \"name\": string, \"query\": string, \"log_source\": string, \"priority\": string, \"confidence\": number }\n"
-        "  ],\n"
-        "  \"recommendations\": [string],\n"
-        "  \"references\": [{ \"technique_id\": string, \"url\": string }],\n"
-        "  \"follow_up_questions\": [string],\n"
-        "  \"evidence\": [string],                 // short snippets or doc refs used to justify findings\n"
-        "  \"confidence\": number                  // 0.0 - 1.0\n"
-        "}\n"
-    )
+    try:
+        logger.info(f"Processing streaming RAG query: {request.query}")
+        relevant_techniques, context, prompt_tokens = await _retrieve_rag_context(request)
+    except Exception as e:
+        logger.error(f"Error preparing streaming RAG query: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error during RAG query: {str(e)}"
+        )
 
-    example = (
-        "Example JSON (must follow schema exactly):\n"
-        "{\n"
-        "  \"version\": \"1.0\",\n"
-        "  \"answer\": \"Short, clear answer focusing on practical steps.\",\n"
-        "  \"summary\": \"Two to three sentence summary.\",\n"
-        "  \"top_findings\": [\n"
-        "    {\n"
-        "      \"technique_id\": \"T1055\",\n"
-        "      \"name\": \"Process Injection\",\n"
-        "      \"relevance_score\": 0.92,\n"
-        "      \"impact\": \"High\",\n"
-        "      \"recommended_detections\": [\"Monitor for suspicious DLL loads\"],\n"
-        "      \"recommended_mitigations\": [\"Enable code signing policies\"]\n"
-        "    }\n"
-        "  ],\n"
-        "  \"detection_queries\": [\n"
-        "    {\n"
-        "      \"name\": \"Process Injection - Windows\",\n"
-        "      \"query\": \"EventID=4688 AND CommandLine LIKE '%-Inject%'%\",\n"
-        "      \"log_source\": \"windows_security\",\n"
-        "      \"priority\": \"high\",\n"
-        "      \"confidence\": 0.9\n"
-        "    }\n"
-        "  ],\n"
-        "  \"recommendations\": [\"Investigate hosts X,Y\", \"Collect memory for analysis\"],\n"
-        "  \"references\": [ { \"technique_id\": \"T1055\", \"url\": \"https://attack.mitre.org/techniques/T1055/\" } ],\n"
-        "  \"follow_up_questions\": [\"When did you first observe the activity?\"],\n"
-        "  \"evidence\": [\"Technique description excerpt or source doc link\"],\n"
-        "  \"confidence\": 0.87\n"
-        "}\n"
-    )
+    confidence_score = _calculate_confidence(relevant_techniques)
+    llm_for_response = _conversational_llm()
 
-    prompt = (
-        f"You are a senior incident responder and MITRE ATT&CK expert.\n"
-        f"User Query: {query}\n\n"
-        f"Relevant Techniques (top {min(5, len(techniques))}):\n"
-        f"{json.dumps(context_parts, indent=2)}\n\n"
-        "Instructions (important):\n"
-        "- Use the techniques provided to produce a prioritized, operationally-focused analysis.\n"
-        "- Output MUST be valid JSON that adheres exactly to the schema below. Do NOT include any explanatory text, markdown, or commentary.\n"
-        "- Ensure detection queries are copy-paste ready for common SIEMs and label the log source.\n"
-        "- Include brief 'evidence' entries that point to the part of the technique or doc used to justify each top finding.\n"
-        "- Keep 'answer' concise and actionable; keep technical details in 'summary' and 'top_findings'.\n"
-        "- If uncertain, lower the 'confidence' and call out assumptions in 'evidence'.\n\n"
-        f"{schema_instructions}\n\n"
-        f"{example}\n\n"
-        "Now produce the JSON output exactly as specified." 
+    async def event_stream():
+        yield format_sse_event("techniques", {
+            "query": request.query,
+            "relevant_techniques": relevant_techniques if request.include_source_techniques else [],
+            "total_techniques_found": len(relevant_techniques),
+            "embedding_model": "aws-titan-v2",
+            "prompt_tokens": prompt_tokens
+        })
+
+        emitted_tokens = False
+        try:
+            async with rag_query_admission.admit_request(http_request):
+                async for text in llm_for_response.stream_conversational_response(
+                    query=request.query,
+                    context=context
+                ):
+                    emitted_tokens = True
+                    yield format_sse_event("token", {"text": text})
+        except Overloaded as e:
+            logger.warning(f"Shedding RAG response stream: {e.reason}")
+            yield format_sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.warning(f"LLM streaming failed: {str(e)}")
+            if emitted_tokens:
+                yield format_sse_event("error", {"detail": f"Response generation interrupted: {str(e)}"})
+            else:
+                yield format_sse_event("token", {"text": _generate_fallback_response(request.query, relevant_techniques)})
+
+        yield format_sse_event("done", {
+            "confidence_score": round(confidence_score, 3),
+            "processing_time_ms": round((time.time() - start_time) * 1000, 2)
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _retrieve_rag_context(request: RagQueryRequest) -> Tuple[List[Dict[str, Any]], str, int]:
+    """Find techniques relevant to the RAG query and build the LLM prompt for them.
+
+    Returns:
+        Tuple of (relevant techniques, prompt, estimated prompt tokens)
+    """
+    # Search for relevant techniques using embeddings
+    relevant_techniques = await aws_bedrock_service.search_mitre_techniques(
+        query=request.query,
+        chromadb_service=chromadb_service,
+        n_results=request.max_context_techniques
     )
 
-    return prompt
+    # Detect if the user is asking for a general MITRE ATT&CK overview (high-level intent)
+    lower_q = (request.query or "").lower()
+    overview_triggers = [
+        'what is mitre', 'what is mitre attack', 'explain mitre', 'explain mitre attack',
+        'mitre overview', 'mitre attack overview', 'overview of mitre', 'what is the mitre'
+    ]
+    is_overview_intent = any(trigger in lower_q for trigger in overview_triggers) or (len(request.query.split()) <= 4 and ('mitre' in lower_q or 'attack' in lower_q))
+
+    if is_overview_intent:
+        logger.info('Detected overview intent; generating MITRE ATT&CK overview context.')
+        context = _prepare_overview_context(request.query, relevant_techniques)
+    else:
+        if not relevant_techniques:
+            logger.info('No relevant techniques found; generating a general conversational response.')
+            # Create a general context prompting the model to act as a knowledgeable security assistant
+            context = _prepare_general_context(request.query)
+        else:
+            # Prepare context for AI response generation from found techniques
+            rag_context = _prepare_rag_context(request.query, relevant_techniques, request.context_token_budget)
+            return relevant_techniques, rag_context.prompt, rag_context.prompt_tokens
+
+    return relevant_techniques, context, estimate_tokens(context)
+
+def _calculate_confidence(relevant_techniques: List[Dict[str, Any]]) -> float:
+    """Calculate confidence score based on relevance scores (guard against empty list)."""
+    if not relevant_techniques:
+        return 0.0
+    avg_relevance = sum(tech.get('relevance_score', 0.0) for tech in relevant_techniques) / len(relevant_techniques)
+    return min(avg_relevance * 1.2, 1.0)  # Boost confidence slightly
+
+def _prepare_rag_context(query: str, techniques: List[Dict[str, Any]], token_budget: Optional[int] = None) -> RagContext:
+    """Prepare a high-quality instruction prompt for the model using the top techniques.
+
+    The prompt asks the model to act as a senior incident responder and MITRE ATT&CK expert.
+    It requests a single JSON object with a clear schema (answer, summary, prioritized findings,
+    detection queries, recommendations, references, follow-up questions, and a confidence score).
+    Techniques are ranked, de-duplicated and trimmed so the prompt fits the token budget.
+    """
+    return rag_context_builder.build(query, techniques, token_budget=token_budget)
 
 
 def _prepare_general_context(query: str) -> str:
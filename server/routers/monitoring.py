@@ -2,7 +2,7 @@
 API endpoints for monitoring and analysis storage.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -44,6 +44,23 @@ class AnalysisResponse(BaseModel):
     status: str = Field(..., description="Storage status")
     message: str = Field(..., description="Status message")
 
+class BulkStoreAnalysisRequest(BaseModel):
+    """Request model for storing many analysis results at once."""
+    items: List[StoreAnalysisRequest] = Field(..., min_length=1, max_length=500, description="Analyses to store")
+
+class BulkStoreItemResult(BaseModel):
+    """Outcome of one item of a bulk store."""
+    index: int = Field(..., description="Position of the item in the request")
+    status: str = Field(..., description="stored or error")
+    analysis_id: Optional[str] = Field(None, description="Analysis ID when stored")
+    error: Optional[str] = Field(None, description="Error message when not stored")
+
+class BulkStoreResponse(BaseModel):
+    """Response model for bulk analysis storage."""
+    stored: int = Field(..., description="Number of analyses stored")
+    failed: int = Field(..., description="Number of analyses that could not be stored")
+    results: List[BulkStoreItemResult] = Field(..., description="Per-item outcomes, in request order")
+
 @router.post("/monitoring/sessions", response_model=SessionResponse)
 async def create_monitoring_session(
     request: CreateSessionRequest,
@@ -203,6 +220,44 @@ async def store_analysis_result(
         logger.error(f"Failed to store analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analysis/store/bulk", response_model=BulkStoreResponse)
+async def store_analysis_results_bulk(
+    request: BulkStoreAnalysisRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Store many analysis results (e.g. a replayed monitoring backlog) in one request."""
+    user_id = current_user.get('username')
+    
+    items, results = [], []
+    for index, item in enumerate(request.items):
+        if item.username and item.username != user_id:
+            results.append({"index": index, "status": "error",
+                            "error": "Username does not match the authenticated user"})
+            continue
+        # Same payload shape as /analysis/store (data nested under additionalProp1)
+        analysis_data = item.analysis_result.get('additionalProp1', {})
+        items.append((index, {
+            "summary": analysis_data.get('summary', 'No summary provided'),
+            "matched_techniques": [tech for tech in analysis_data.get('matched_techniques', []) if isinstance(tech, dict)],
+            "enhanced_analysis": analysis_data.get('enhanced_analysis'),
+            "processing_time_ms": analysis_data.get('processing_time_ms', 0),
+            "logs": item.log_content
+        }))
+    
+    if items:
+        try:
+            outcomes = await storage_service.store_analysis_results_bulk(user_id, [item for _, item in items])
+        except Exception as e:
+            logger.error(f"Failed to bulk store analyses: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        # Map positions in the stored subset back to request positions
+        for (index, _), outcome in zip(items, outcomes):
+            results.append({**outcome, "index": index})
+    
+    results.sort(key=lambda result: result["index"])
+    stored = sum(1 for result in results if result["status"] == "stored")
+    return BulkStoreResponse(stored=stored, failed=len(results) - stored, results=results)
+
 @router.get("/analysis/{analysis_id}", response_model=Dict[str, Any])
 async def get_analysis_result(
     analysis_id: str,
@@ -258,13 +313,12 @@ async def get_analysis_statistics(
 
 @router.delete("/analysis/cleanup")
 async def cleanup_old_analyses(
-    days: int = 90,
+    days: int = Query(90, description="Delete analyses older than this many days", ge=1),
     current_user: dict = Depends(get_current_user)
 ):
-    """Clean up old analysis records (admin only)."""
+    """Clean up the current user's old analysis records."""
     try:
-        # Note: In a real implementation, you'd check for admin privileges
-        deleted_count = await storage_service.cleanup_old_analyses(days)
+        deleted_count = await storage_service.cleanup_old_analyses(current_user["username"], days)
         
         return {
             "status": "success",
@@ -5,12 +5,23 @@ from bson import ObjectId
 
 from core import security
 from core.config import settings
-from model.users import UserBase,UserUpdate,PasswordChange,UserUpdateUsername
+from model.users import UserBase,UserUpdate,PasswordChange,UserUpdateUsername,ReencryptionStatus
 from db import database
-from routers.auth import get_current_user
+from routers.auth import get_current_user, invalidate_cached_user
+from services.analysis_storage_service import analysis_storage_service
+from services.reencryption_service import reencryption_service
+from services.cache_invalidation_service import cache_invalidation_service
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+def _invalidate_user_caches(username: str):
+    """Forget cached auth documents and encryption keys for a user."""
+    invalidate_cached_user(username)
+    analysis_storage_service.invalidate_user_key(username)
+
+# Applied here and, through the invalidation feed, on every other worker
+cache_invalidation_service.register(_invalidate_user_caches)
+
 @router.put("/update-username", response_model=UserBase)
 async def update_username(user_update: UserUpdateUsername):
     """Update username if email exists, otherwise error"""
@@ -23,6 +34,7 @@ async def update_username(user_update: UserUpdateUsername):
         {"email": user_update.email},
         {"$set": {"username": user_update.username}}
     )
+    await cache_invalidation_service.publish(user["username"])
 
     user["username"] = user_update.username  # reflect change
     return UserBase(**user)
@@ -62,6 +74,7 @@ async def update_current_user(
         {"username": current_user["username"]},
         {"$set": update_data}
     )
+    await cache_invalidation_service.publish(current_user["username"])
     
     # Return updated user 
     updated_user = await database.user_collection.find_one({"username": current_user["username"]})
@@ -75,14 +88,17 @@ async def change_password(
 ):
     """Change the current user's password"""
     # Verify current password
-    if not security.verify_password(password_change.current_password, current_user["hashed_password"]):
+    if not await security.verify_password_async(password_change.current_password, current_user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password"
         )
     
     # Hash new password
-    new_hashed_password = security.get_password_hash(password_change.new_password)
+    new_hashed_password = await security.get_password_hash_async(password_change.new_password)
+    
+    # Stored analyses and logs are encrypted with the old hash: keep it before replacing it
+    await reencryption_service.save_old_key(current_user["username"], current_user["hashed_password"])
     
     # Update password in database
     result = await database.user_collection.update_one(
@@ -93,7 +109,27 @@ async def change_password(
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Password update failed")
     
-    return {"message": "Password updated successfully"}
+    # Move the stored data over to the new key (the job first drops every worker's
+    # cached ciphers derived from the old hash)
+    job = await reencryption_service.start_job(current_user["username"], current_user["hashed_password"])
+    
+    return {"message": "Password updated successfully", "reencryption": job}
+
+@router.get("/me/reencryption", response_model=ReencryptionStatus)
+async def get_reencryption_status(current_user: dict = Depends(get_current_user)):
+    """Progress of re-encrypting stored data after the last password change"""
+    job = await reencryption_service.get_status(current_user["username"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="No re-encryption job")
+    return ReencryptionStatus(**job)
+
+@router.post("/me/reencryption", response_model=ReencryptionStatus)
+async def resume_reencryption(current_user: dict = Depends(get_current_user)):
+    """Resume a failed or interrupted re-encryption job (retries failed items if it completed)"""
+    job = await reencryption_service.resume_job(current_user["username"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="No re-encryption job to resume")
+    return ReencryptionStatus(**job)
 
 @router.delete("/me")
 async def delete_current_user(current_user: dict = Depends(get_current_user)):
@@ -103,6 +139,8 @@ async def delete_current_user(current_user: dict = Depends(get_current_user)):
     if result.deleted_count == 0:
         raise HTTPException(status_code=400, detail="Account deletion failed")
     
+    await cache_invalidation_service.publish(current_user["username"])
+    
     return {"message": "Account deleted successfully"}
 
 @router.get("/me", response_model=UserBase)
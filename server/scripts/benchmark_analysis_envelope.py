@@ -0,0 +1,100 @@
+"""
+Measure stored ciphertext size for analysis results: legacy Fernet text vs compressed envelopes.
+
+Usage (from the server directory):
+    python scripts/benchmark_analysis_envelope.py [exports.json ...] [--catalog-descriptions]
+
+Each export file holds a JSON list of analyses with `summary`, `matched_techniques` and an
+optional `enhanced_analysis` (the CLI export format; defaults to the demo exports). Stored
+techniques carry the full ATT&CK description, which exports omit; --catalog-descriptions
+fills them in from the ATT&CK catalog so sizes match what the server stores.
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet  # noqa: E402
+from services.encryption_service import EncryptionService  # noqa: E402
+
+DEFAULT_EXPORTS = [os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "aiagent", "demo_exports", "sample_analysis.json"
+)]
+
+
+def load_analyses(paths, catalog_descriptions: bool):
+    by_id = {}
+    if catalog_descriptions:
+        from services.attack_catalog import attack_catalog
+        attack_catalog.ensure_loaded()
+        by_id = attack_catalog.by_id
+
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for analysis in json.load(f):
+                techniques = []
+                for tech in analysis.get("matched_techniques", []):
+                    technique = by_id.get(tech.get("technique_id"))
+                    techniques.append({
+                        "technique_id": tech.get("technique_id", ""),
+                        "name": tech.get("name", ""),
+                        "description": tech.get("description") or (technique.description if technique else ""),
+                        "kill_chain_phases": tech.get("kill_chain_phases") or (list(technique.kill_chain_phases) if technique else []),
+                        "platforms": tech.get("platforms") or (list(technique.platforms) if technique else []),
+                        "relevance_score": tech.get("relevance_score", 0.0)
+                    })
+                yield {
+                    "summary": analysis.get("summary", ""),
+                    "techniques": json.dumps(techniques),
+                    "enhanced_analysis": analysis.get("enhanced_analysis") or ""
+                }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("exports", nargs="*", default=DEFAULT_EXPORTS, help="Export JSON files")
+    parser.add_argument("--catalog-descriptions", action="store_true",
+                        help="Fill technique descriptions from the ATT&CK catalog")
+    args = parser.parse_args()
+
+    cipher = Fernet(Fernet.generate_key())
+    totals = {"plaintext": 0, "legacy": 0, "double_base64": 0, "envelope": 0}
+    ratios = []
+    analyses = 0
+    for analysis in load_analyses(args.exports, args.catalog_descriptions):
+        analyses += 1
+        legacy = envelope = 0
+        for text in analysis.values():
+            if not text:
+                continue
+            plaintext = text.encode('utf-8')
+            token = cipher.encrypt(plaintext)
+            totals["plaintext"] += len(plaintext)
+            totals["double_base64"] += len(base64.b64encode(token))
+            legacy += len(token)
+            envelope += len(EncryptionService._seal(cipher, plaintext))
+        totals["legacy"] += legacy
+        totals["envelope"] += envelope
+        if legacy:
+            ratios.append(envelope / legacy)
+
+    if not analyses:
+        print("No analyses found")
+        return
+
+    print(f"Analyses: {analyses} from {len(args.exports)} file(s)")
+    for label, key in (("Plaintext", "plaintext"), ("Legacy Fernet text", "legacy"),
+                       ("Legacy base64(Fernet)", "double_base64"), ("Compressed envelope", "envelope")):
+        print(f"{label:22} {totals[key]:10,d} bytes  ({totals[key] / analyses:8.0f} per analysis)")
+    print(f"Envelope vs legacy:    {totals['envelope'] / totals['legacy']:.1%} of the size "
+          f"(median per analysis {statistics.median(ratios):.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compare loading the ATT&CK STIX bundle the old way against the shared streaming catalog.
+
+Usage (from the server directory):
+    python scripts/benchmark_attack_catalog.py [path/to/enterprise-attack.json]
+
+"Before" reproduces what the server used to do at startup: json.load the bundle once for
+the ChromaDB loader and once more for the validator, each keeping its own dict copies.
+"After" streams the bundle into the shared AttackCatalog once, and "cached" loads the
+same catalog from its binary cache. Reports load time, peak traced memory during the
+load and memory still held afterwards.
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import Config  # noqa: E402
+from services.attack_catalog import AttackCatalog  # noqa: E402
+
+
+def legacy_load(path: str):
+    """The two separate json.load passes and dict-of-dicts copies the services used to build."""
+    with open(path, 'r', encoding='utf-8') as f:
+        stix_data = json.load(f)
+    processor_techniques = []
+    for obj in stix_data.get('objects', []):
+        if obj.get('type') == 'attack-pattern':
+            technique = {
+                'id': obj.get('id', ''),
+                'technique_id': obj.get('external_references', [{}])[0].get('external_id', ''),
+                'name': obj.get('name', ''),
+                'description': obj.get('description', ''),
+                'kill_chain_phases': [phase.get('phase_name', '') for phase in obj.get('kill_chain_phases', [])],
+                'platforms': obj.get('x_mitre_platforms', []),
+                'tactics': obj.get('kill_chain_phases', []),
+                'modified': obj.get('modified', ''),
+                'created': obj.get('created', '')
+            }
+            technique['searchable_text'] = f"{technique['name']} {technique['description']} {' '.join(technique['kill_chain_phases'])} {' '.join(technique['platforms'])}"
+            processor_techniques.append(technique)
+    del stix_data
+
+    with open(path, 'r', encoding='utf-8') as f:
+        stix_data = json.load(f)
+    mitre_data = {}
+    for obj in stix_data.get('objects', []):
+        if obj.get('type') != 'attack-pattern':
+            continue
+        tech_id = next((ref.get('external_id') for ref in obj.get('external_references', [])
+                        if ref.get('source_name') == 'mitre-attack'), None)
+        if tech_id:
+            mitre_data[tech_id] = {
+                'id': tech_id,
+                'name': obj.get('name', ''),
+                'description': obj.get('description', ''),
+                'kill_chain_phases': [phase.get('phase_name', '') for phase in obj.get('kill_chain_phases', [])],
+                'platforms': obj.get('x_mitre_platforms', []),
+                'data_sources': obj.get('x_mitre_data_sources', []),
+                'created': obj.get('created', ''),
+                'modified': obj.get('modified', ''),
+                'aliases': obj.get('aliases', [])
+            }
+    del stix_data
+    return processor_techniques, mitre_data
+
+
+def catalog_load(path: str):
+    catalog = AttackCatalog(path, cache_path='')
+    catalog.ensure_loaded()
+    return catalog
+
+
+def cached_catalog_load(path: str):
+    catalog = AttackCatalog(path)
+    catalog.ensure_loaded()
+    return catalog
+
+
+def measure(label: str, loader, path: str):
+    # Time without tracemalloc (it slows allocation-heavy code), then trace memory separately
+    gc.collect()
+    start = time.perf_counter()
+    loader(path)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    result = loader(path)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:8} load {elapsed * 1000:9.1f}ms   peak {peak / 2**20:8.1f} MiB   retained {retained / 2**20:8.1f} MiB")
+    return result
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else Config.ATTACK_DATA_PATH
+    print(f"STIX bundle: {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+    before = measure("before", legacy_load, path)
+    del before
+    after = measure("after", catalog_load, path)
+    print(f"Catalog: {len(after.techniques)} attack patterns, {len(after.by_id)} technique IDs")
+    del after
+
+    # Make sure a fresh binary cache exists, then time loading from it
+    AttackCatalog(path).ensure_loaded()
+    measure("cached", cached_catalog_load, path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark MitreValidationService.get_technique_suggestions against the full partial_ratio scan.
+
+Usage (from the server directory):
+    python scripts/benchmark_suggestions.py [--limit 5] [--repeat 3]
+
+The full scan slides a SequenceMatcher over every technique name and description and
+takes tens of seconds per query on the enterprise catalog, so it runs once per query.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.mitre_validation_service import mitre_validation_service, partial_ratio  # noqa: E402
+
+QUERIES = [
+    "credential dumping",
+    "lsass memory",
+    "powershell",
+    "scheduled task",
+    "phishing attachment",
+    "brute force ssh",
+    "pass the hash",
+    "kerberoasting",
+    "exfiltration over dns",
+    "remote desktop protocol",
+    "keylogging",
+    "registry run keys persistence",
+    "credentail dumpng",
+    "ransomware encrypting files",
+]
+
+
+def full_scan_suggestions(query: str, limit: int):
+    """The original suggestion scan: partial_ratio against every name and description."""
+    suggestions = []
+    query_lower = query.lower()
+    for tech_id, technique in mitre_validation_service.mitre_data.items():
+        name_similarity = partial_ratio(query_lower, technique.name.lower())
+        desc_similarity = partial_ratio(query_lower, technique.description.lower())
+        relevance = max(name_similarity, desc_similarity * 0.8)
+        if relevance > 60:
+            suggestions.append((tech_id, relevance))
+    suggestions.sort(key=lambda x: x[1], reverse=True)
+    return suggestions[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=5, help="Suggestions per query")
+    parser.add_argument("--repeat", type=int, default=3, help="Indexed runs per query (best is reported)")
+    parser.add_argument("queries", nargs="*", help="Queries to run instead of the built-in set")
+    args = parser.parse_args()
+
+    service = mitre_validation_service
+    print(f"Catalog: {len(service.mitre_data)} techniques")
+
+    full_times, indexed_times, overlaps, score_gaps = [], [], [], []
+    for query in args.queries or QUERIES:
+        start = time.perf_counter()
+        expected = full_scan_suggestions(query, args.limit)
+        full_times.append(time.perf_counter() - start)
+
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            actual = service.get_technique_suggestions(query, limit=args.limit)
+            best = min(best, time.perf_counter() - start)
+        indexed_times.append(best)
+
+        expected_ids = {tech_id for tech_id, _ in expected}
+        actual_ids = {s['technique_id'] for s in actual}
+        overlaps.append(len(expected_ids & actual_ids) / len(expected_ids) if expected_ids else 1.0)
+        if expected and actual:
+            score_gaps.append(statistics.mean(r for _, r in expected) - statistics.mean(s['relevance'] for s in actual))
+
+        print(f"{query[:32]:32} full {full_times[-1]:8.2f}s  indexed {best * 1000:8.1f}ms  "
+              f"top-{args.limit} overlap {overlaps[-1]:.0%}")
+
+    print()
+    print(f"Mean full scan:     {statistics.mean(full_times):.2f}s per query")
+    print(f"Mean indexed:       {statistics.mean(indexed_times) * 1000:.1f}ms per query")
+    print(f"Speedup:            {statistics.mean(full_times) / statistics.mean(indexed_times):.0f}x")
+    print(f"Mean top-k overlap: {statistics.mean(overlaps):.0%} (ties at equal relevance may differ)")
+    if score_gaps:
+        print(f"Mean relevance gap: {statistics.mean(score_gaps):.2f} points")
+
+
+if __name__ == "__main__":
+    main()
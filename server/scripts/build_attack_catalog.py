@@ -0,0 +1,48 @@
+"""
+Build the binary ATT&CK catalog cache from the STIX bundle.
+
+Usage (from the server directory):
+    python scripts/build_attack_catalog.py [path/to/enterprise-attack.json] [--check]
+
+The server rebuilds a missing or stale cache on its own at startup; run this as a build
+or deploy step so the first start does not pay for parsing the bundle. With --check,
+only report whether the existing cache matches the bundle (exit code 1 if not).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import Config  # noqa: E402
+from services.attack_catalog import AttackCatalog, read_catalog_cache  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data_path", nargs="?", default=Config.ATTACK_DATA_PATH, help="STIX bundle to read")
+    parser.add_argument("--output", help="Cache path (defaults to the bundle path with a .catalog extension)")
+    parser.add_argument("--check", action="store_true", help="Only check that the cache is up to date")
+    args = parser.parse_args()
+
+    catalog = AttackCatalog(args.data_path, cache_path=args.output)
+
+    if args.check:
+        fresh = read_catalog_cache(catalog.cache_path, catalog.data_path) is not None
+        print(f"{catalog.cache_path}: {'up to date' if fresh else 'missing or stale'}")
+        sys.exit(0 if fresh else 1)
+
+    start = time.perf_counter()
+    techniques = catalog.build_cache()
+    print(f"Parsed {len(techniques)} attack patterns from {catalog.data_path} in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    read_catalog_cache(catalog.cache_path, catalog.data_path)
+    print(f"Wrote {catalog.cache_path} ({os.path.getsize(catalog.cache_path) / 2**20:.1f} MiB), "
+          f"loads in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measure the byte savings and CPU cost of compressing analysis requests.
+
+Usage (from the server directory):
+    python scripts/measure_compression.py LOGFILE [LOGFILE ...] [--request-chars 45000]
+
+Each log file is cut into /analyze request bodies the way the CLI builds them (JSON with up
+to --request-chars characters of log lines). Each body is compressed with gzip at several
+levels (and zstd when the zstandard package is installed). The script prints the
+compression ratio, client-side compression time and server-side decompression time, the
+latter through the same decompress() the request middleware uses.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.compression import decompress, zstandard  # noqa: E402
+
+REPEATS = 5
+
+
+def request_bodies(path, request_chars):
+    """/analyze bodies for a log file, each holding up to request_chars characters of lines."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    chunk, size = [], 0
+    for line in lines:
+        if chunk and size + len(line) + 1 > request_chars:
+            yield json.dumps({"logs": "\n".join(chunk), "enhance_with_ai": True, "max_results": 5}).encode("utf-8")
+            chunk, size = [], 0
+        chunk.append(line[:request_chars])
+        size += len(line) + 1
+    if chunk:
+        yield json.dumps({"logs": "\n".join(chunk), "enhance_with_ai": True, "max_results": 5}).encode("utf-8")
+
+
+def timed_ms(func, *args):
+    started_at = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func(*args)
+    return result, (time.perf_counter() - started_at) * 1000 / REPEATS
+
+
+def codecs():
+    for level in (1, 6, 9):
+        yield f"gzip-{level}", "gzip", lambda body, level=level: gzip.compress(body, compresslevel=level)
+    if zstandard is not None:
+        for level in (3, 10):
+            yield f"zstd-{level}", "zstd", zstandard.ZstdCompressor(level=level).compress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logfiles", nargs="+")
+    parser.add_argument("--request-chars", type=int, default=45000, help="Log characters per request (CLI default)")
+    args = parser.parse_args()
+
+    bodies = [body for path in args.logfiles for body in request_bodies(path, args.request_chars)]
+    raw_bytes = sum(len(body) for body in bodies)
+    print(f"{len(bodies)} requests, {raw_bytes:,} bytes of JSON from {len(args.logfiles)} file(s)\n")
+    print(f"{'codec':8} {'bytes':>12} {'ratio':>7} {'saved':>7} {'compress ms/req':>16} {'decompress ms/req':>18}")
+    for name, encoding, compress in codecs():
+        compressed_bytes = compress_ms = decompress_ms = 0.0
+        for body in bodies:
+            compressed, elapsed = timed_ms(compress, body)
+            compressed_bytes += len(compressed)
+            compress_ms += elapsed
+            restored, elapsed = timed_ms(decompress, compressed, encoding, len(body))
+            assert restored == body
+            decompress_ms += elapsed
+        print(f"{name:8} {int(compressed_bytes):12,} {raw_bytes / compressed_bytes:6.1f}x "
+              f"{1 - compressed_bytes / raw_bytes:6.1%} {compress_ms / len(bodies):16.2f} "
+              f"{decompress_ms / len(bodies):18.2f}")
+
+
+if __name__ == "__main__":
+    main()
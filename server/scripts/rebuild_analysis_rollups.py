@@ -0,0 +1,40 @@
+"""
+Recompute the analysis rollups from the stored analysis_results.
+
+Usage (from the server directory):
+    python scripts/rebuild_analysis_rollups.py [--user USERNAME]
+
+Rollups are maintained on every store and delete, and a user's first read backfills
+their pre-rollup analyses on its own. Run this once after deploying rollups (to fill in
+the global totals for every user at once), or to repair drift. Stop writers first:
+analyses stored while a rebuild runs may be miscounted.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.analysis_rollup_service import analysis_rollup_service  # noqa: E402
+
+
+async def run(user_id):
+    start = time.perf_counter()
+    groups = await analysis_rollup_service.rebuild(user_id)
+    scope = f"user {user_id}" if user_id else "all users"
+    print(f"Rebuilt rollups for {scope} from {groups} groups in {time.perf_counter() - start:.2f}s")
+    print(await analysis_rollup_service.get_global_stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+    asyncio.run(run(args.user))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Inspect, resume or start re-encryption jobs (admin key rotation and recovery).
+
+Usage (from the server directory):
+    python scripts/reencrypt_user_data.py --list
+    python scripts/reencrypt_user_data.py --user USERNAME [--old-hash HASH]
+
+Password changes start a job on their own and the server resumes interrupted jobs at
+startup. With --user this resumes (or retries) the user's job in the foreground; with
+--old-hash it starts one that moves data still encrypted under that earlier password hash
+(e.g. from a restored backup) to the user's current key. Progress is printed until done.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.reencryption_service import reencryption_service, STATUS_RUNNING  # noqa: E402
+
+
+def describe(user_id, job):
+    return (f"{user_id}: {job['status']} ({job['phase']}) {job['analyses_reencrypted']}/{job['analyses_total']} "
+            f"analyses, {job['chunks_reencrypted']} log chunks, {job['failed']} failed"
+            + (f" - {job['error']}" if job.get("error") else ""))
+
+
+async def list_jobs():
+    async for doc in reencryption_service.jobs.find({}, {"old_keys": 0}):
+        print(describe(doc["_id"], reencryption_service._public(doc)))
+
+
+async def run(user_id, old_hash):
+    if old_hash:
+        job = await reencryption_service.start_job(user_id, old_hash)
+    else:
+        job = await reencryption_service.resume_job(user_id)
+        if job is None:
+            print(f"No re-encryption job for {user_id}")
+            return
+    while job["status"] == STATUS_RUNNING:
+        print(describe(user_id, job))
+        await asyncio.sleep(2)
+        job = await reencryption_service.get_status(user_id)
+    print(describe(user_id, job))
+    await reencryption_service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--list", action="store_true", help="List every job and its progress")
+    parser.add_argument("--user", help="Resume this user's job")
+    parser.add_argument("--old-hash", help="Start a job for data encrypted under this earlier password hash")
+    args = parser.parse_args()
+    if args.list:
+        asyncio.run(list_jobs())
+    elif args.user:
+        asyncio.run(run(args.user, args.old_hash))
+    else:
+        parser.error("pass --list or --user")
+
+
+if __name__ == "__main__":
+    main()
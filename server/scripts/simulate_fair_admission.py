@@ -0,0 +1,113 @@
+"""
+Simulate one heavy user and several light users sharing the analyze admission controller.
+
+Usage (from the server directory):
+    python scripts/simulate_fair_admission.py [--slots 4] [--light-users 4] [--seconds 20]
+
+The heavy user keeps --heavy-concurrency large requests outstanding (a monitoring agent
+across many hosts; interactive by default, like clients that do not mark their traffic
+as background, which priorities alone cannot help with); each light user sends a small
+interactive request every --light-interval seconds. Service time is simulated from the request size. The
+run is repeated with per-user quotas and fair queuing disabled (plain FIFO) and enabled,
+and prints queue wait percentiles and sheds per user for both.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import metrics  # noqa: E402
+from core.admission import AdmissionController, Overloaded, BACKGROUND, INTERACTIVE  # noqa: E402
+
+HEAVY_BYTES = 48000
+LIGHT_BYTES = 4000
+
+
+def percentile(samples, quantile):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(quantile * (len(ordered) - 1))))]
+
+
+async def run(args, fair: bool):
+    controller = AdmissionController(
+        f"simulated_{'fair' if fair else 'fifo'}",
+        max_concurrent=args.slots,
+        max_queue=args.queue,
+        max_queue_wait_ms=args.max_wait_ms,
+        background_queue_percent=100,
+        user_max_concurrent=args.user_slots if fair else 0,
+        user_max_queued=0,
+        # A huge quantum serves each user's whole backlog per turn, i.e. FIFO
+        quantum_bytes=65536 if fair else 1 << 40
+    )
+    waits = {}
+    shed = {}
+    deadline = time.monotonic() + args.seconds
+
+    async def request(user, priority, size):
+        enqueued_at = time.monotonic()
+        try:
+            async with controller.admit(priority, user if fair else "", size):
+                waits.setdefault(user, []).append((time.monotonic() - enqueued_at) * 1000)
+                # Simulated LLM latency, roughly proportional to the logs sent
+                await asyncio.sleep(args.base_service_s * size / HEAVY_BYTES * random.uniform(0.8, 1.2) + 0.05)
+        except Overloaded:
+            shed[user] = shed.get(user, 0) + 1
+            await asyncio.sleep(0.5)
+
+    async def heavy():
+        while time.monotonic() < deadline:
+            await request("heavy", args.heavy_priority, HEAVY_BYTES)
+
+    async def light(user):
+        await asyncio.sleep(random.uniform(0, args.light_interval))
+        while time.monotonic() < deadline:
+            await request(user, INTERACTIVE, LIGHT_BYTES)
+            await asyncio.sleep(args.light_interval)
+
+    await asyncio.gather(*(heavy() for _ in range(args.heavy_concurrency)),
+                         *(light(f"light{i}") for i in range(args.light_users)))
+
+    print(f"\n{'Fair queuing + per-user quota' if fair else 'FIFO, no quota'}")
+    print(f"{'user':10} {'served':>7} {'shed':>5} {'p50 wait ms':>12} {'p99 wait ms':>12}")
+    for user in sorted(set(waits) | set(shed)):
+        samples = waits.get(user, [])
+        print(f"{user:10} {len(samples):7d} {shed.get(user, 0):5d} "
+              f"{percentile(samples, 0.5):12.0f} {percentile(samples, 0.99):12.0f}")
+    light_waits = [wait for user, samples in waits.items() if user != "heavy" for wait in samples]
+    if light_waits:
+        print(f"light users overall: mean {statistics.mean(light_waits):.0f}ms, "
+              f"p99 {percentile(light_waits, 0.99):.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=4, help="Concurrent analyses")
+    parser.add_argument("--user-slots", type=int, default=2, help="Per-user quota when fair")
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=30000)
+    parser.add_argument("--heavy-concurrency", type=int, default=16)
+    parser.add_argument("--heavy-priority", choices=[INTERACTIVE, BACKGROUND], default=INTERACTIVE)
+    parser.add_argument("--light-users", type=int, default=4)
+    parser.add_argument("--light-interval", type=float, default=1.0)
+    parser.add_argument("--base-service-s", type=float, default=1.0, help="Service time of a heavy request")
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    asyncio.run(run(args, fair=False))
+    random.seed(1)
+    asyncio.run(run(args, fair=True))
+    print(f"\nShed counters: { {k: v for k, v in metrics.snapshot()['counters'].items() if '.shed.' in k} }")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,14 @@ from .chromadb_service import ChromaDBService
 from .aiclient import get_embedding_from_titan
 from .encryption_service import EncryptionService
 from .analysis_storage_service import AnalysisStorageService, analysis_storage_service
+from .analysis_rollup_service import AnalysisRollupService, analysis_rollup_service
+from .retention_service import RetentionService, retention_service
+from .log_archive_service import LogArchiveService, log_archive_service
+from .reencryption_service import ReencryptionService, reencryption_service
+from .cache_invalidation_service import CacheInvalidationService, cache_invalidation_service
+from .prerag_filter_service import PreRAGFilterService, prerag_filter_service
 from .aws_bedrock_service import AWSBedrockService
+from .llm_router import LLMProviderRouter
 
 __all__ = [
     'GeminiService',
@@ -12,5 +19,18 @@ __all__ = [
     'EncryptionService',
     'AnalysisStorageService',
     'analysis_storage_service',
-    'AWSBedrockService'
+    'AnalysisRollupService',
+    'analysis_rollup_service',
+    'RetentionService',
+    'retention_service',
+    'LogArchiveService',
+    'log_archive_service',
+    'ReencryptionService',
+    'reencryption_service',
+    'CacheInvalidationService',
+    'cache_invalidation_service',
+    'PreRAGFilterService',
+    'prerag_filter_service',
+    'AWSBedrockService',
+    'LLMProviderRouter'
 ]
\ No newline at end of file
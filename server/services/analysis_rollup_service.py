@@ -0,0 +1,300 @@
+"""
+Incrementally maintained analysis rollups.
+
+Every stored (or deleted) analysis adjusts a few counters in the "analysis_rollups"
+collection with atomic $inc upserts, so analytics and dashboard reads are a handful of
+small document lookups instead of scans over a user's whole history:
+
+- "user:<user_id>"              per-user totals and techniques-count histogram
+- "user:<user_id>:day:<date>"   per-user daily bucket
+- "global"                      totals across all users
+- "global:day:<date>"           daily bucket across all users
+
+Only the plaintext metadata already stored next to the encrypted results (timestamp,
+processing time, technique count) is rolled up; matched techniques stay encrypted.
+
+Analyses stored before rollups existed are backfilled per user, once, on the user's
+first read: startup records an "epoch" (the first analysis ID counted incrementally),
+and the first reader to upsert the user's "user:<user_id>:backfill" marker adds the
+user's analyses older than the epoch with the same $inc updates. Concurrent reads and
+writes therefore never recount anything. Deleting a pre-epoch analysis only uncounts it
+once the user's backfill has completed; before that it was never counted, and the
+backfill will no longer find it.
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from db import database
+from core import logger
+
+GLOBAL_KEY = "global"
+EPOCH_KEY = "epoch"
+
+
+def _user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def _backfill_key(user_id: str) -> str:
+    return f"user:{user_id}:backfill"
+
+
+def _day(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def _recent_days(days: int) -> List[str]:
+    """The last `days` UTC dates, oldest first."""
+    today = datetime.utcnow().date()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+
+
+class AnalysisRollupService:
+    """Per-user and global analysis counters kept up to date on every write."""
+
+    def __init__(self):
+        self.collection = database.get_collection("analysis_rollups")
+        self.analysis_collection = database.get_collection("analysis_results")
+        self._epoch: Optional[ObjectId] = None
+        self._backfilled: Set[str] = set()  # Users known to be backfilled, per process
+
+    async def _apply(self, user_id: str, day: str, techniques_count: int,
+                     analyses: int, processing_time_ms: float) -> int:
+        """
+        Add `analyses` analyses (negative to remove) on `day` to every affected rollup.
+
+        Removals never create documents, and a user rollup that drops to zero analyses
+        is deleted so the global unique-user count stays accurate.
+
+        Returns:
+            +1 if this created the user's rollup, -1 if it removed it, else 0
+        """
+        totals = {"analyses": analyses, "processing_time_ms_sum": processing_time_ms}
+        user_inc = {
+            **totals,
+            "techniques_sum": analyses * techniques_count,
+            f"techniques_histogram.{techniques_count}": analyses
+        }
+        user_key = _user_key(user_id)
+
+        if analyses > 0:
+            result = await self.collection.update_one(
+                {"_id": user_key},
+                {"$inc": user_inc, "$setOnInsert": {"user_id": user_id}},
+                upsert=True
+            )
+            user_delta = 1 if result.upserted_id is not None else 0
+        else:
+            user_delta = 0
+            doc = await self.collection.find_one_and_update(
+                {"_id": user_key}, {"$inc": user_inc}, return_document=ReturnDocument.AFTER
+            )
+            if doc is not None and doc.get("analyses", 0) <= 0:
+                deleted = await self.collection.delete_one({"_id": user_key, "analyses": {"$lte": 0}})
+                user_delta = -deleted.deleted_count
+
+        upsert = analyses > 0
+        await self.collection.bulk_write([
+            UpdateOne({"_id": f"{user_key}:day:{day}"},
+                      {"$inc": totals, "$setOnInsert": {"user_id": user_id, "date": day}}, upsert=upsert),
+            UpdateOne({"_id": f"{GLOBAL_KEY}:day:{day}"},
+                      {"$inc": totals, "$setOnInsert": {"date": day}}, upsert=upsert),
+            UpdateOne({"_id": GLOBAL_KEY}, {"$inc": {**totals, "users": user_delta}}, upsert=True),
+        ], ordered=False)
+        return user_delta
+
+    async def ensure_epoch(self) -> None:
+        """
+        Record where incremental counting starts (call at startup, before serving).
+
+        The first server start with rollups sets it; analyses with older IDs are only
+        counted by the per-user backfill.
+        """
+        doc = await self.collection.find_one_and_update(
+            {"_id": EPOCH_KEY},
+            {"$setOnInsert": {"analysis_id": ObjectId(), "created_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._epoch = doc["analysis_id"]
+
+    async def _backfill_user(self, user_id: str) -> None:
+        """Count the user's pre-rollup analyses, exactly once across all workers."""
+        if user_id in self._backfilled:
+            return
+        claim = await self.collection.update_one(
+            {"_id": _backfill_key(user_id)},
+            {"$setOnInsert": {"user_id": user_id, "created_at": datetime.utcnow(), "counting": True}},
+            upsert=True
+        )
+        if claim.upserted_id is not None:
+            if self._epoch is None:
+                await self.ensure_epoch()
+            groups = await self._count_groups({"user_id": user_id, "_id": {"$lt": self._epoch}})
+            await self.collection.update_one({"_id": _backfill_key(user_id)}, {"$unset": {"counting": ""}})
+            if groups:
+                logger.info(f"Backfilled analysis rollups of {user_id} from {groups} groups")
+        self._backfilled.add(user_id)
+
+    async def _counted(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        The documents the rollups have counted: pre-epoch analyses only for users whose
+        backfill has completed (one still counting may or may not have seen them; they
+        are left out, so the error is at most an overcount).
+        """
+        if self._epoch is None:
+            await self.ensure_epoch()
+        pending = {doc["user_id"] for doc in documents
+                   if doc["_id"] < self._epoch and doc["user_id"] not in self._backfilled}
+        if not pending:
+            return documents
+        cursor = self.collection.find(
+            {"_id": {"$in": [_backfill_key(user_id) for user_id in pending]}, "counting": {"$ne": True}},
+            {"user_id": 1}
+        )
+        backfilled = {doc["user_id"] async for doc in cursor}
+        return [doc for doc in documents
+                if doc["_id"] >= self._epoch or doc["user_id"] not in pending or doc["user_id"] in backfilled]
+
+    async def _count_groups(self, match: Dict[str, Any]) -> int:
+        """Add the matching analyses to the rollups, one update per (user, day, techniques_count)."""
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$analysis_timestamp"}},
+                    "techniques_count": {"$ifNull": ["$techniques_count", 0]}
+                },
+                "analyses": {"$sum": 1},
+                "processing_time_ms_sum": {"$sum": {"$ifNull": ["$processing_time_ms", 0]}}
+            }}
+        ]
+        groups = 0
+        async for group in self.analysis_collection.aggregate(pipeline, allowDiskUse=True):
+            key = group["_id"]
+            await self._apply(key["user_id"], key["day"], key["techniques_count"],
+                              group["analyses"], group["processing_time_ms_sum"])
+            groups += 1
+        return groups
+
+    async def record_analysis(self, user_id: str, analysis_timestamp: datetime,
+                              processing_time_ms: float, techniques_count: int) -> None:
+        """Count a newly stored analysis."""
+        await self._apply(user_id, _day(analysis_timestamp), techniques_count, 1, processing_time_ms or 0)
+
+    async def record_analyses(self, documents: List[Dict[str, Any]]) -> None:
+        """Count many newly stored analyses of one or more users, one update per group."""
+        await self._apply_grouped(documents, sign=1)
+
+    async def _apply_grouped(self, documents: List[Dict[str, Any]], sign: int) -> None:
+        """Apply documents to the rollups, one update per (user, day, techniques_count) group."""
+        groups: Dict[tuple, List[float]] = {}
+        for doc in documents:
+            key = (doc["user_id"], _day(doc["analysis_timestamp"]), doc.get("techniques_count", 0))
+            group = groups.setdefault(key, [0, 0.0])
+            group[0] += 1
+            group[1] += doc.get("processing_time_ms") or 0
+        for (user_id, day, techniques_count), (analyses, processing_time_ms) in groups.items():
+            await self._apply(user_id, day, techniques_count, sign * analyses, sign * processing_time_ms)
+
+    async def remove_analyses(self, documents: List[Dict[str, Any]]) -> None:
+        """
+        Uncount deleted analyses (pass the deleted documents' _id and metadata), applying
+        one update per (user, day, techniques_count) group.
+        """
+        await self._apply_grouped(await self._counted(documents), sign=-1)
+
+    async def _daily_counts(self, prefix: str, days: int) -> List[Dict[str, Any]]:
+        dates = _recent_days(days)
+        cursor = self.collection.find({"_id": {"$in": [f"{prefix}:day:{date}" for date in dates]}})
+        counts = {doc["date"]: max(doc.get("analyses", 0), 0) async for doc in cursor}
+        return [{"date": date, "count": counts.get(date, 0)} for date in dates]
+
+    async def _get_user_rollup(self, user_id: str) -> Dict[str, Any]:
+        """The user's rollup document, after counting their pre-rollup analyses (once)."""
+        await self._backfill_user(user_id)
+        return await self.collection.find_one({"_id": _user_key(user_id)}) or {}
+
+    async def get_user_total(self, user_id: str) -> int:
+        doc = await self._get_user_rollup(user_id)
+        return max(doc.get("analyses", 0), 0)
+
+    async def get_user_analytics(self, user_id: str, days: int = 30) -> Dict[str, Any]:
+        """Totals, average processing time, techniques-count histogram and daily timeline."""
+        doc = await self._get_user_rollup(user_id)
+        total = max(doc.get("analyses", 0), 0)
+        histogram = {count: n for count, n in doc.get("techniques_histogram", {}).items() if n > 0}
+        return {
+            "total_analyses": total,
+            "avg_processing_time": doc.get("processing_time_ms_sum", 0) / total if total else 0.0,
+            "avg_techniques_per_analysis": doc.get("techniques_sum", 0) / total if total else 0.0,
+            "techniques_count_histogram": dict(sorted(histogram.items(), key=lambda item: int(item[0]))),
+            "analysis_timeline": await self._daily_counts(_user_key(user_id), days)
+        }
+
+    async def get_global_stats(self, days: int = 30) -> Dict[str, Any]:
+        """Analyses in the last `days` days, today's count, unique users and average processing time."""
+        doc = await self.collection.find_one({"_id": GLOBAL_KEY}) or {}
+        total = max(doc.get("analyses", 0), 0)
+        timeline = await self._daily_counts(GLOBAL_KEY, days)
+        return {
+            "total_analyses": sum(bucket["count"] for bucket in timeline),
+            "analyses_today": timeline[-1]["count"] if timeline else 0,
+            "unique_users": max(doc.get("users", 0), 0),
+            "average_processing_time": doc.get("processing_time_ms_sum", 0) / total if total else 0.0
+        }
+
+    async def rebuild(self, user_id: Optional[str] = None) -> int:
+        """
+        Recompute rollups from analysis_results (all users, or one user).
+
+        Used to repair drift; run it while nothing is writing analyses for the affected
+        users, or their concurrent writes may be lost. Rebuilt users are marked as
+        backfilled, so their pre-rollup analyses are not counted again.
+
+        Returns:
+            Number of (user, day, techniques_count) groups applied
+        """
+        match: Dict[str, Any] = {}
+        if user_id is None:
+            await self.collection.delete_many({"_id": {"$ne": EPOCH_KEY}})
+        else:
+            match = {"user_id": user_id}
+            day_pattern = f"^{re.escape(_user_key(user_id))}:day:"
+            # Take the user's contribution out of the global rollups before recounting it
+            async for bucket in self.collection.find({"_id": {"$regex": day_pattern}}):
+                await self.collection.update_one(
+                    {"_id": f"{GLOBAL_KEY}:day:{bucket['date']}"},
+                    {"$inc": {"analyses": -bucket.get("analyses", 0),
+                              "processing_time_ms_sum": -bucket.get("processing_time_ms_sum", 0)}}
+                )
+            user_doc = await self.collection.find_one({"_id": _user_key(user_id)})
+            if user_doc:
+                await self.collection.update_one({"_id": GLOBAL_KEY}, {"$inc": {
+                    "analyses": -user_doc.get("analyses", 0),
+                    "processing_time_ms_sum": -user_doc.get("processing_time_ms_sum", 0),
+                    "users": -1
+                }})
+            await self.collection.delete_many({"$or": [
+                {"_id": _user_key(user_id)},
+                {"_id": {"$regex": day_pattern}}
+            ]})
+
+        groups = await self._count_groups(match)
+        users = [user_id] if user_id is not None else await self.analysis_collection.distinct("user_id")
+        if users:
+            await self.collection.bulk_write([
+                UpdateOne({"_id": _backfill_key(user)},
+                          {"$setOnInsert": {"user_id": user, "created_at": datetime.utcnow()},
+                           "$unset": {"counting": ""}}, upsert=True)
+                for user in users
+            ], ordered=False)
+        self._backfilled.update(users)
+        logger.info(f"Rebuilt analysis rollups from {groups} groups")
+        return groups
+
+analysis_rollup_service = AnalysisRollupService()
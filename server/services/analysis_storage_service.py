@@ -2,13 +2,32 @@
 MongoDB service for storing and retrieving encrypted analysis data.
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+import asyncio
+import base64
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple
 import uuid
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from services.encryption_service import encryption_service
+from services.analysis_rollup_service import analysis_rollup_service
+from services.retention_service import retention_service
+from services.log_archive_service import log_archive_service
 from db import database
-from core import logger
+from core import Config, logger, TTLCache
+
+# Shared by every storage service instance for batch encryption and decryption;
+# AES and zlib release the GIL, so these threads run in parallel
+_crypto_pool = ThreadPoolExecutor(
+    max_workers=Config.ANALYSIS_DECRYPT_WORKERS or min(4, os.cpu_count() or 1),
+    thread_name_prefix="analysis-crypto"
+)
+# Concurrent log archive writes per bulk store
+BULK_ARCHIVE_CONCURRENCY = 8
 
 class AnalysisStorageService:
     """Service for storing and retrieving encrypted analysis data in MongoDB."""
@@ -16,6 +35,12 @@ class AnalysisStorageService:
     def __init__(self):
         self.collection = database.get_collection("analysis_results")
         self.sessions_collection = database.get_collection("monitoring_sessions")
+        # username -> hashed password (the encryption key material), so repeated reads and
+        # writes skip the user lookup. Invalidated on password/username changes; the TTL
+        # bounds staleness across worker processes.
+        self._user_key_cache = TTLCache(
+            maxsize=Config.USER_KEY_CACHE_SIZE, ttl=Config.USER_KEY_CACHE_TTL_SECONDS, name="user_keys"
+        )
     
     @staticmethod
     def convert_datetime_to_string(value):
@@ -24,15 +49,38 @@ class AnalysisStorageService:
             return value.isoformat()
         return value
     
+    async def _get_user_key(self, user_id: str, refresh: bool = False) -> Optional[str]:
+        """Return the user's hashed password (their encryption key material), cached per user."""
+        if not refresh:
+            hashed_password = self._user_key_cache.get(user_id)
+            if hashed_password is not None:
+                return hashed_password
+        
+        user_doc = await database.get_collection("user_collection").find_one(
+            {"username": user_id}, {"hashed_password": 1}
+        )
+        if not user_doc:
+            logger.error(f"User {user_id} not found in database")
+            return None
+        
+        hashed_password = user_doc.get("hashed_password")
+        if not hashed_password:
+            logger.error(f"Hashed password not found for user {user_id}")
+            return None
+        
+        self._user_key_cache.set(user_id, hashed_password)
+        return hashed_password
+    
+    def invalidate_user_key(self, user_id: str):
+        """Forget cached key material for a user (call after password or username changes)."""
+        hashed_password = self._user_key_cache.pop(user_id)
+        encryption_service.invalidate_user_keys(user_id=user_id, hashed_password=hashed_password)
+    
     async def store_analysis_result(self, user_id: str, request, response) -> str:
         """Store encrypted analysis result using user's hashed password as encryption key."""
         try:
-            # Get user's hashed password from database to use as encryption key
-            user_doc = await database.get_collection("user_collection").find_one({"username": user_id})
-            if not user_doc:
-                raise ValueError(f"User {user_id} not found in database")
-            
-            hashed_password = user_doc.get("hashed_password")
+            # Get user's hashed password (cached) to use as encryption key
+            hashed_password = await self._get_user_key(user_id)
             if not hashed_password:
                 raise ValueError(f"Hashed password not found for user {user_id}")
             
@@ -78,120 +126,471 @@ class AnalysisStorageService:
             logger.info(f"  - Enhanced analysis: {clean_enhanced_analysis}")
             
             # Encrypt the analysis results using user's hashed password
-            encrypted_results, key_id = encryption_service.encrypt_analysis_results(
+            document = self._encrypt_document(
+                user_id=user_id,
                 summary=clean_summary,
                 techniques=serializable_techniques,
                 enhanced_analysis=clean_enhanced_analysis,
-                hashed_password=hashed_password  # Use hashed password instead of user_id
+                processing_time_ms=getattr(response, 'processing_time_ms', 0),
+                hashed_password=hashed_password
             )
             
-            # Create document
-            document = {
-                "user_id": user_id,
-                "encrypted_summary": encrypted_results['summary'],
-                "encrypted_techniques": encrypted_results['techniques'],
-                "encrypted_enhanced_analysis": encrypted_results.get('enhanced_analysis'),
-                "analysis_timestamp": datetime.utcnow(),
-                "processing_time_ms": getattr(response, 'processing_time_ms', 0),
-                "techniques_count": len(serializable_techniques),  # Use serializable_techniques count
-                "encryption_key_id": key_id
-            }
+            # Keep the raw logs (deduplicated) so the analysis can be re-run later
+            logs_hash = await self._archive_logs(user_id, getattr(request, 'logs', None), hashed_password)
+            if logs_hash:
+                document["logs_hash"] = logs_hash
             
             logger.info(f"Document to store - techniques_count: {document['techniques_count']}")
             
             # Store in database
-            result = await self.collection.insert_one(document)
+            try:
+                result = await self.collection.insert_one(document)
+            except Exception:
+                if logs_hash:
+                    await log_archive_service.release_many([document])
+                raise
             analysis_id = str(result.inserted_id)
             
             logger.info(f"Stored encrypted analysis {analysis_id} for user {user_id}")
+            await self._update_rollups(document, added=True)
             return analysis_id
             
         except Exception as e:
             logger.error(f"Failed to store analysis: {e}")
             raise
+    
+    @staticmethod
+    def _encrypt_document(user_id: str, summary: str, techniques: List[Dict[str, Any]],
+                          enhanced_analysis: Optional[str], processing_time_ms: float,
+                          hashed_password: str) -> Dict[str, Any]:
+        """Encrypt an analysis into the document stored in analysis_results."""
+        encrypted_results, key_id = encryption_service.encrypt_analysis_results(
+            summary=summary,
+            techniques=techniques,
+            enhanced_analysis=enhanced_analysis,
+            hashed_password=hashed_password  # Use hashed password instead of user_id
+        )
+        return {
+            "user_id": user_id,
+            "encrypted_summary": encrypted_results['summary'],
+            "encrypted_techniques": encrypted_results['techniques'],
+            "encrypted_enhanced_analysis": encrypted_results.get('enhanced_analysis'),
+            "analysis_timestamp": datetime.utcnow(),
+            "processing_time_ms": processing_time_ms or 0,
+            "techniques_count": len(techniques),
+            "encryption_key_id": key_id
+        }
+    
+    async def store_analysis_results_bulk(self, user_id: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Store many analyses for one user in a single round of work.
+        
+        The user's key is resolved once, items are encrypted on the shared worker pool and
+        written with one unordered insert_many, so one bad item does not block the rest.
+        
+        Args:
+            user_id: Owner of the analyses
+            items: Dicts with summary, matched_techniques (list of dicts), enhanced_analysis,
+                processing_time_ms and optionally logs
+            
+        Returns:
+            One entry per item, in order: {"index", "status": "stored", "analysis_id"} or
+            {"index", "status": "error", "error"}
+            
+        Raises:
+            ValueError: If the user's key cannot be resolved
+        """
+        hashed_password = await self._get_user_key(user_id)
+        if not hashed_password:
+            raise ValueError(f"Hashed password not found for user {user_id}")
+        
+        loop = asyncio.get_running_loop()
+        encrypted = await asyncio.gather(*(
+            loop.run_in_executor(
+                _crypto_pool, self._encrypt_document, user_id,
+                item.get("summary") or "", item.get("matched_techniques") or [],
+                item.get("enhanced_analysis"), item.get("processing_time_ms", 0), hashed_password
+            )
+            for item in items
+        ), return_exceptions=True)
+        
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        documents, positions = [], []
+        for index, document in enumerate(encrypted):
+            if isinstance(document, Exception):
+                outcomes[index] = {"index": index, "status": "error", "error": f"Encryption failed: {document}"}
+            else:
+                documents.append(document)
+                positions.append(index)
+        
+        semaphore = asyncio.Semaphore(BULK_ARCHIVE_CONCURRENCY)
+        
+        async def archive(document: Dict[str, Any], logs: Optional[str]):
+            async with semaphore:
+                logs_hash = await self._archive_logs(user_id, logs, hashed_password)
+            if logs_hash:
+                document["logs_hash"] = logs_hash
+        
+        await asyncio.gather(*(archive(document, items[index].get("logs")) for document, index in zip(documents, positions)))
+        
+        write_errors: Dict[int, str] = {}
+        if documents:
+            try:
+                await self.collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    write_errors[error["index"]] = error.get("errmsg", "Write failed")
+        
+        inserted, orphaned_logs = [], []
+        for position, (document, index) in enumerate(zip(documents, positions)):
+            if position in write_errors:
+                outcomes[index] = {"index": index, "status": "error", "error": write_errors[position]}
+                orphaned_logs.append(document)
+            else:
+                outcomes[index] = {"index": index, "status": "stored", "analysis_id": str(document["_id"])}
+                inserted.append(document)
+        
+        await log_archive_service.release_many(orphaned_logs)
+        if inserted:
+            try:
+                await analysis_rollup_service.record_analyses(inserted)
+            except Exception as e:
+                logger.warning(f"Failed to update analysis rollups for user {user_id}: {e}")
+        
+        logger.info(f"Bulk stored {len(inserted)}/{len(items)} analyses for user {user_id}")
+        return outcomes
+    
+    async def _archive_logs(self, user_id: str, logs: Optional[str], hashed_password: str) -> Optional[str]:
+        """Archive raw logs and return their hash; archiving is best-effort and never fails a store."""
+        if not logs or not Config.LOG_ARCHIVE_ENABLED:
+            return None
+        try:
+            return await log_archive_service.archive(user_id, logs, hashed_password)
+        except Exception as e:
+            logger.warning(f"Failed to archive logs for user {user_id}: {e}")
+            return None
+    
+    async def get_analysis_logs(self, user_id: str, analysis_id: str) -> Optional[str]:
+        """Restore the archived raw logs an analysis was run on; None if unavailable."""
+        if not ObjectId.is_valid(analysis_id):
+            return None
+        doc = await self.collection.find_one(
+            {"user_id": user_id, "_id": ObjectId(analysis_id)}, {"logs_hash": 1}
+        )
+        if not doc or not doc.get("logs_hash"):
+            return None
+        
+        hashed_password = await self._get_user_key(user_id)
+        if not hashed_password:
+            return None
+        logs = await log_archive_service.restore(user_id, doc["logs_hash"], hashed_password)
+        if logs is None:
+            # Cached key may be stale (password changed in another worker): refetch once
+            fresh_password = await self._get_user_key(user_id, refresh=True)
+            if fresh_password and fresh_password != hashed_password:
+                logs = await log_archive_service.restore(user_id, doc["logs_hash"], fresh_password)
+        return logs
+    
+    async def _update_rollups(self, document: Dict[str, Any], added: bool):
+        """Count (or uncount) an analysis in the rollups; failures only skew analytics, so they are logged."""
+        try:
+            if not added:
+                await analysis_rollup_service.remove_analyses([document])
+                return
+            await analysis_rollup_service.record_analysis(
+                user_id=document["user_id"],
+                analysis_timestamp=document["analysis_timestamp"],
+                processing_time_ms=document.get("processing_time_ms", 0),
+                techniques_count=document.get("techniques_count", 0)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update analysis rollups for user {document.get('user_id')}: {e}")
+    
     async def get_total_analysis_count(self, user_id: str) -> int:
         try:
-            query = {"user_id": user_id}
-            total = await self.collection.count_documents(query)
-            return total
+            return await analysis_rollup_service.get_user_total(user_id)
         except Exception as e:
             logger.error(f"Error counting analyses for user {user_id}: {str(e)}")
             return 0
 
-    async def get_analysis_result(self, user_id: str, analysis_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve and decrypt analysis result using user's hashed password as decryption key."""
+    # Selectable analysis fields -> (encrypted document field, decrypt_analysis_results key)
+    ANALYSIS_FIELDS = {
+        "summary": ("encrypted_summary", "summary"),
+        "matched_techniques": ("encrypted_techniques", "techniques"),
+        "enhanced_analysis": ("encrypted_enhanced_analysis", "enhanced_analysis")
+    }
+    
+    @classmethod
+    def resolve_fields(cls, fields: Optional[Iterable[str]]) -> List[str]:
+        """Validate a field selection (None selects every field); raises ValueError on unknown names."""
+        if fields is None:
+            return list(cls.ANALYSIS_FIELDS)
+        fields = list(dict.fromkeys(fields))
+        unknown = [field for field in fields if field not in cls.ANALYSIS_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown analysis fields: {', '.join(unknown)} (allowed: {', '.join(cls.ANALYSIS_FIELDS)})")
+        return fields
+    
+    def _result_projection(self, fields: List[str]) -> Dict[str, int]:
+        """Read only the metadata and the encrypted fields that will be decrypted."""
+        projection = {"analysis_timestamp": 1, "processing_time_ms": 1}
+        projection.update({self.ANALYSIS_FIELDS[field][0]: 1 for field in fields})
+        return projection
+    
+    def _decrypt_document(self, doc: Dict[str, Any], fields: List[str], hashed_password: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Decrypt the selected fields of a stored analysis.
+        
+        Returns:
+            (result, failed); failed is True if a stored field did not decrypt, e.g. with a stale key
+        """
+        encrypted_payload = {
+            self.ANALYSIS_FIELDS[field][1]: doc.get(self.ANALYSIS_FIELDS[field][0]) for field in fields
+        }
+        decrypted_data = encryption_service.decrypt_analysis_results(
+            encrypted_data=encrypted_payload,
+            hashed_password=hashed_password  # Use hashed password instead of user_id
+        )
+        failed = bool(decrypted_data.get("failed_fields"))
+        
+        result = {field: decrypted_data.get(self.ANALYSIS_FIELDS[field][1]) for field in fields}
+        result["analysis_timestamp"] = self.convert_datetime_to_string(doc.get("analysis_timestamp"))
+        result["processing_time_ms"] = doc.get("processing_time_ms", 0)
+        return result, failed
+    
+    async def get_analysis_result(self, user_id: str, analysis_id: str,
+                                  fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve and decrypt analysis result using user's hashed password as decryption key.
+        
+        Args:
+            user_id: Owner of the analysis
+            analysis_id: Analysis ID
+            fields: Subset of ANALYSIS_FIELDS to read and decrypt (default: all)
+            
+        Raises:
+            ValueError: If fields contains an unknown field
+        """
+        fields = self.resolve_fields(fields)
         try:
             # Validate analysis_id format early to avoid ObjectId errors
             if not ObjectId.is_valid(analysis_id):
                 logger.warning(f"Invalid analysis id format: {analysis_id}")
                 return None
 
-            # Get user's hashed password from database to use as decryption key
-            user_doc = await database.get_collection("user_collection").find_one({"username": user_id})
-            if not user_doc:
-                logger.error(f"User {user_id} not found in database")
-                return None
-            
-            hashed_password = user_doc.get("hashed_password")
+            # Get user's hashed password (cached) to use as decryption key
+            hashed_password = await self._get_user_key(user_id)
             if not hashed_password:
-                logger.error(f"Hashed password not found for user {user_id}")
                 return None
             
-            # Find document
-            doc = await self.collection.find_one({
-                "user_id": user_id,
-                "_id": ObjectId(analysis_id)
-            })
+            # Find document, reading only the requested encrypted fields
+            doc = await self.collection.find_one(
+                {"user_id": user_id, "_id": ObjectId(analysis_id)},
+                self._result_projection(fields)
+            )
             
             if not doc:
                 logger.warning(f"Analysis {analysis_id} not found for user {user_id}")
                 return None
             
-            # Decrypt all data at once using user's hashed password
-            encrypted_payload = {
-                "summary": doc.get("encrypted_summary"),
-                "techniques": doc.get("encrypted_techniques"),
-                "enhanced_analysis": doc.get("encrypted_enhanced_analysis")
-            }
+            result, failed = self._decrypt_document(doc, fields, hashed_password)
             
-            decrypted_data = encryption_service.decrypt_analysis_results(
-                encrypted_data=encrypted_payload,
-                hashed_password=hashed_password  # Use hashed password instead of user_id
-            )
+            if failed:
+                # Cached key may be stale (password changed in another worker): refetch once
+                fresh_password = await self._get_user_key(user_id, refresh=True)
+                if fresh_password and fresh_password != hashed_password:
+                    result, _ = self._decrypt_document(doc, fields, fresh_password)
             
-            return {
-                "summary": decrypted_data.get("summary"),
-                "matched_techniques": decrypted_data.get("techniques"),
-                "enhanced_analysis": decrypted_data.get("enhanced_analysis"),
-                "analysis_timestamp": self.convert_datetime_to_string(doc.get("analysis_timestamp")),
-                "processing_time_ms": doc.get("processing_time_ms", 0)
-            }
+            return result
             
         except Exception as e:
             logger.error(f"Failed to decrypt analysis {analysis_id}: {e}")
             return None
     
+    async def get_analysis_results(self, user_id: str, analysis_ids: List[str],
+                                   fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieve and decrypt many analyses at once (e.g. for dashboards).
+        
+        Fetches all documents in one query and decrypts them on the shared worker pool.
+        Unknown or invalid IDs are skipped; results keep the requested order and include "id".
+        
+        Raises:
+            ValueError: If fields contains an unknown field
+        """
+        fields = self.resolve_fields(fields)
+        object_ids = list(dict.fromkeys(ObjectId(i) for i in analysis_ids if ObjectId.is_valid(i)))
+        if not object_ids:
+            return []
+        
+        hashed_password = await self._get_user_key(user_id)
+        if not hashed_password:
+            return []
+        
+        docs = await self.collection.find(
+            {"user_id": user_id, "_id": {"$in": object_ids}},
+            self._result_projection(fields)
+        ).to_list(length=len(object_ids))
+        
+        loop = asyncio.get_running_loop()
+        
+        async def decrypt_all(key: str, batch: List[Dict[str, Any]]):
+            return await asyncio.gather(*(
+                loop.run_in_executor(_crypto_pool, self._decrypt_document, doc, fields, key) for doc in batch
+            ))
+        
+        decrypted = dict(zip((doc["_id"] for doc in docs), await decrypt_all(hashed_password, docs)))
+        
+        stale = [doc for doc in docs if decrypted[doc["_id"]][1]]
+        if stale:
+            # Cached key may be stale (password changed in another worker): refetch once
+            fresh_password = await self._get_user_key(user_id, refresh=True)
+            if fresh_password and fresh_password != hashed_password:
+                decrypted.update(zip((doc["_id"] for doc in stale), await decrypt_all(fresh_password, stale)))
+        
+        results = []
+        for object_id in object_ids:
+            if object_id in decrypted:
+                result, _ = decrypted[object_id]
+                results.append({"id": str(object_id), **result})
+        return results
+    
+    async def iter_decrypted_analyses(self, user_id: str, fields: Optional[Iterable[str]] = None,
+                                      batch_size: int = 100, max_in_flight: int = 32) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream every analysis of a user, newest first, decrypted (e.g. for exports).
+        
+        Documents are read from a cursor `batch_size` at a time and decrypted on the shared
+        worker pool with at most `max_in_flight` pending, so decryption overlaps the reads
+        and memory stays flat however long the history is. Results are yielded in order.
+        
+        Raises:
+            ValueError: If fields contains an unknown field (raised on first iteration)
+        """
+        fields = self.resolve_fields(fields)
+        hashed_password = await self._get_user_key(user_id)
+        if not hashed_password:
+            return
+        
+        loop = asyncio.get_running_loop()
+        key_refreshed = False
+        pending = deque()
+        
+        async def finish(doc, future):
+            nonlocal hashed_password, key_refreshed
+            result, failed = await future
+            if failed and not key_refreshed:
+                # Cached key may be stale (password changed in another worker): refetch once
+                key_refreshed = True
+                fresh_password = await self._get_user_key(user_id, refresh=True)
+                if fresh_password and fresh_password != hashed_password:
+                    hashed_password = fresh_password
+                    result, _ = await loop.run_in_executor(
+                        _crypto_pool, self._decrypt_document, doc, fields, hashed_password
+                    )
+            return {"id": str(doc["_id"]), **result}
+        
+        cursor = self.collection.find(
+            {"user_id": user_id}, self._result_projection(fields)
+        ).sort(self.HISTORY_SORT).batch_size(batch_size)
+        try:
+            async for doc in cursor:
+                pending.append((doc, loop.run_in_executor(
+                    _crypto_pool, self._decrypt_document, doc, fields, hashed_password
+                )))
+                if len(pending) >= max_in_flight:
+                    yield await finish(*pending.popleft())
+            while pending:
+                yield await finish(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+            await cursor.close()
+    
+    # Metadata needed for history listings; skips the encrypted payloads
+    HISTORY_PROJECTION = {"analysis_timestamp": 1, "processing_time_ms": 1, "techniques_count": 1}
+    HISTORY_SORT = [("analysis_timestamp", -1), ("_id", -1)]
+    
+    def _history_item(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": str(doc.get("_id")),
+            "analysis_timestamp": self.convert_datetime_to_string(doc.get("analysis_timestamp")),
+            "processing_time_ms": doc.get("processing_time_ms", 0),
+            "techniques_count": doc.get("techniques_count", 0),
+            "logs_preview": "Preview unavailable"
+        }
+    
+    @staticmethod
+    def encode_history_cursor(analysis_timestamp: datetime, analysis_id: ObjectId) -> str:
+        """Opaque page token for the position just after (timestamp, id) in newest-first order."""
+        payload = json.dumps({"t": analysis_timestamp.isoformat(), "id": str(analysis_id)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_history_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+        """Inverse of encode_history_cursor; raises ValueError for malformed tokens."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+        except Exception as e:
+            raise ValueError(f"Invalid history cursor: {cursor}") from e
+    
     async def get_user_analysis_history(self, user_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
         """Get user analysis history (metadata only)."""
         try:
             cursor = self.collection.find(
-                {"user_id": user_id}
-            ).sort("analysis_timestamp", -1).skip(offset).limit(limit)
+                {"user_id": user_id}, self.HISTORY_PROJECTION
+            ).sort(self.HISTORY_SORT).skip(offset).limit(limit)
             
             analyses = []
             async for doc in cursor:
-                analyses.append({
-                    "id": str(doc.get("_id")),
-                    "analysis_timestamp": self.convert_datetime_to_string(doc.get("analysis_timestamp")),
-                    "processing_time_ms": doc.get("processing_time_ms", 0),
-                    "techniques_count": doc.get("techniques_count", 0),
-                    "logs_preview": "Preview unavailable"
-                })
+                analyses.append(self._history_item(doc))
             
             return analyses
         except Exception as e:
             logger.error(f"Failed to get history: {e}")
             return []
+    
+    async def get_user_analysis_history_page(self, user_id: str, limit: int = 50,
+                                             cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Keyset-paginated history (metadata only), newest first.
+        
+        Seeks past the (analysis_timestamp, _id) of the previous page's last item on the
+        user_history index instead of skipping, so every page costs the same.
+        
+        Args:
+            user_id: Owner of the analyses
+            limit: Page size
+            cursor: next_cursor from the previous page, or None for the first page
+            
+        Returns:
+            (items, next_cursor); next_cursor is None on the last page
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if cursor:
+            last_timestamp, last_id = self.decode_history_cursor(cursor)
+            query["$or"] = [
+                {"analysis_timestamp": {"$lt": last_timestamp}},
+                {"analysis_timestamp": last_timestamp, "_id": {"$lt": last_id}}
+            ]
+        
+        # Fetch one extra document to learn whether another page exists
+        docs = await self.collection.find(query, self.HISTORY_PROJECTION).sort(
+            self.HISTORY_SORT
+        ).limit(limit + 1).to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = self.encode_history_cursor(last["analysis_timestamp"], last["_id"])
+        
+        return [self._history_item(doc) for doc in docs], next_cursor
 
     # ===== MONITORING SESSIONS =====
     async def create_monitoring_session(self, username: str, log_path: str, interval_seconds: int = 300, ai_agent_enabled: bool = True) -> str:
@@ -277,21 +676,21 @@ class AnalysisStorageService:
             logger.error(f"Failed to get monitoring session {session_id}: {e}")
             return None
 
+    async def get_user_analytics(self, user_id: str, days: int = 30) -> Dict[str, Any]:
+        """Get per-user analytics from the rollups (matched techniques are encrypted, so not tallied)."""
+        return await analysis_rollup_service.get_user_analytics(user_id, days)
+    
     async def get_analysis_stats(self, days: int = 30) -> Dict[str, Any]:
         """Get analysis statistics."""
         try:
-            since_date = datetime.utcnow() - timedelta(days=days)
-            
-            total_analyses = await self.collection.count_documents({
-                "analysis_timestamp": {"$gte": since_date}
-            })
+            stats = await analysis_rollup_service.get_global_stats(days)
             
             active_sessions = await self.sessions_collection.count_documents({
                 "status": "active"
             })
             
             return {
-                "total_analyses": total_analyses,
+                **stats,
                 "active_sessions": active_sessions,
                 "period_days": days
             }
@@ -299,10 +698,17 @@ class AnalysisStorageService:
             logger.error(f"Failed to get analysis stats: {e}")
             return {
                 "total_analyses": 0,
+                "analyses_today": 0,
+                "unique_users": 0,
+                "average_processing_time": 0.0,
                 "active_sessions": 0,
                 "period_days": days
             }
 
+    async def cleanup_old_analyses(self, user_id: str, days: int = 90) -> int:
+        """Delete a user's analyses older than `days` days in rate-limited batches; returns the count."""
+        return await retention_service.cleanup_analyses(days, user_id=user_id)
+
     async def delete_analysis_result(self, user_id: str, analysis_id: str) -> bool:
         """Delete an analysis result for a specific user."""
         try:
@@ -310,13 +716,16 @@ class AnalysisStorageService:
                 logger.warning(f"Invalid analysis id format for delete: {analysis_id}")
                 return False
 
-            result = await self.collection.delete_one({
-                "user_id": user_id,
-                "_id": ObjectId(analysis_id)
-            })
+            deleted = await self.collection.find_one_and_delete(
+                {"user_id": user_id, "_id": ObjectId(analysis_id)},
+                projection={"user_id": 1, "analysis_timestamp": 1, "processing_time_ms": 1, "techniques_count": 1,
+                            "logs_hash": 1}
+            )
             
-            if result.deleted_count > 0:
+            if deleted:
                 logger.info(f"Deleted analysis {analysis_id} for user {user_id}")
+                await self._update_rollups(deleted, added=False)
+                await log_archive_service.release_many([deleted])
                 return True
             else:
                 logger.warning(f"Analysis {analysis_id} not found for user {user_id}")
@@ -0,0 +1,410 @@
+"""
+Shared MITRE ATT&CK technique catalog, parsed once per process.
+
+The STIX bundle is streamed: objects in its top-level "objects" array are decoded one
+at a time and everything that is not an attack-pattern is dropped immediately, so the
+full bundle is never held in memory. Techniques are stored as compact `__slots__`
+records with interned identifiers, platforms and tactics.
+
+Parsing the bundle still takes a noticeable part of startup, so the extracted catalog is
+also written to a versioned binary cache next to it (see `write_catalog_cache`). Later
+loads memory-map the cache instead of parsing JSON, as long as it was built from the
+same STIX file (size and mtime, falling back to its SHA-256).
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from core import Config, logger
+
+READ_CHUNK_SIZE = 1 << 20
+
+# Binary cache layout (all integers little-endian u32 unless noted):
+#   header: magic, version, source size (u64), source mtime_ns (u64), source sha256,
+#           technique count, string count
+#   string offsets [string count + 1] into the UTF-8 string blob
+#   one column of string indices per scalar field [technique count]
+#   per list field: item starts [technique count + 1], then item string indices
+#   UTF-8 string blob
+CACHE_MAGIC = b"LQATTCK\0"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<8sIQQ32sII")
+SCALAR_FIELDS = ('stix_id', 'technique_id', 'name', 'description', 'created', 'modified')
+LIST_FIELDS = ('kill_chain_phases', 'platforms', 'data_sources', 'aliases')
+
+
+class Technique:
+    """One ATT&CK attack-pattern."""
+
+    __slots__ = (
+        'stix_id', 'technique_id', 'name', 'description', 'kill_chain_phases',
+        'platforms', 'data_sources', 'aliases', 'created', 'modified'
+    )
+
+    def __init__(self, stix_id: str, technique_id: str, name: str, description: str,
+                 kill_chain_phases: Tuple[str, ...], platforms: Tuple[str, ...],
+                 data_sources: Tuple[str, ...], aliases: Tuple[str, ...],
+                 created: str, modified: str):
+        self.stix_id = stix_id
+        self.technique_id = technique_id
+        self.name = name
+        self.description = description
+        self.kill_chain_phases = kill_chain_phases
+        self.platforms = platforms
+        self.data_sources = data_sources
+        self.aliases = aliases
+        self.created = created
+        self.modified = modified
+
+    @classmethod
+    def from_stix(cls, obj: dict) -> 'Technique':
+        """Build a technique from a STIX attack-pattern object."""
+        intern = sys.intern
+        technique_id = ''
+        for ref in obj.get('external_references', []):
+            if ref.get('source_name') == 'mitre-attack':
+                technique_id = ref.get('external_id', '')
+                break
+
+        return cls(
+            stix_id=obj.get('id', ''),
+            technique_id=intern(technique_id),
+            name=intern(obj.get('name', '')),
+            description=obj.get('description', ''),
+            kill_chain_phases=tuple(intern(phase.get('phase_name', '')) for phase in obj.get('kill_chain_phases', [])),
+            platforms=tuple(intern(p) for p in obj.get('x_mitre_platforms', [])),
+            data_sources=tuple(intern(s) for s in obj.get('x_mitre_data_sources', [])),
+            aliases=tuple(intern(a) for a in obj.get('aliases', [])),
+            created=obj.get('created', ''),
+            modified=obj.get('modified', '')
+        )
+
+    @property
+    def searchable_text(self) -> str:
+        """Name, description, tactics and platforms joined for embedding."""
+        return f"{self.name} {self.description} {' '.join(self.kill_chain_phases)} {' '.join(self.platforms)}"
+
+
+def iter_bundle_objects(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yield the objects of a STIX bundle's "objects" array one at a time.
+
+    Reads the file in chunks and decodes one object at a time with the stdlib decoder,
+    so memory use is bounded by the largest single object plus one chunk.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        eof = not buffer
+
+        def fill() -> bool:
+            nonlocal buffer, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer += chunk
+            return True
+
+        # Find the start of the top-level "objects" array
+        while True:
+            key = buffer.find('"objects"')
+            if key != -1:
+                bracket = buffer.find('[', key)
+                if bracket != -1:
+                    pos = bracket + 1
+                    break
+            if not fill():
+                raise ValueError(f"No 'objects' array found in STIX bundle {path}")
+
+        while True:
+            # Skip whitespace and separators between objects
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    break
+            if pos >= len(buffer):
+                raise ValueError(f"Unterminated 'objects' array in STIX bundle {path}")
+            if buffer[pos] == ']':
+                return
+
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Object spans past the end of the buffer: read more and retry
+                if eof or not fill():
+                    raise
+                continue
+
+            yield obj
+
+            pos = end
+            if pos > chunk_size:
+                # Drop consumed text so the buffer stays around one chunk in size
+                buffer = buffer[pos:]
+                pos = 0
+
+
+class SourceFingerprint(NamedTuple):
+    """Identity of the STIX file a catalog cache was built from."""
+    size: int
+    mtime_ns: int
+    sha256: bytes
+
+
+def _file_sha256(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def fingerprint_source(path: str) -> SourceFingerprint:
+    """Size, mtime and SHA-256 of a STIX bundle."""
+    stat = os.stat(path)
+    return SourceFingerprint(stat.st_size, stat.st_mtime_ns, _file_sha256(path))
+
+
+def _u32(values) -> bytes:
+    column = array('I', values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_catalog_cache(cache_path: str, techniques: List[Technique], source: SourceFingerprint) -> None:
+    """Serialize techniques to the binary cache format, replacing any existing cache atomically."""
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def string_id(value: str) -> int:
+        index = string_ids.get(value)
+        if index is None:
+            index = string_ids[value] = len(strings)
+            strings.append(value)
+        return index
+
+    scalar_columns = [[string_id(getattr(t, field)) for t in techniques] for field in SCALAR_FIELDS]
+    list_columns = []
+    for field in LIST_FIELDS:
+        starts, items = [0], []
+        for technique in techniques:
+            items.extend(string_id(value) for value in getattr(technique, field))
+            starts.append(len(items))
+        list_columns.append((starts, items))
+
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, source.size, source.mtime_ns,
+                               source.sha256, len(techniques), len(strings))
+    parts = [header, _u32(offsets)]
+    parts.extend(_u32(column) for column in scalar_columns)
+    for starts, items in list_columns:
+        parts.append(_u32(starts))
+        parts.append(_u32(items))
+    parts.extend(encoded)
+
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.writelines(parts)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_catalog_cache(cache_path: str, source_path: Optional[str] = None) -> Optional[List[Technique]]:
+    """
+    Load techniques from a binary cache, or return None if it is missing, from another
+    format version, or was built from a different STIX file than `source_path`.
+    """
+    if not os.path.exists(cache_path):
+        return None
+
+    with open(cache_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < CACHE_HEADER.size:
+            return None
+        magic, version, size, mtime_ns, sha256, count, string_count = CACHE_HEADER.unpack_from(data, 0)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return None
+
+        if source_path and os.path.exists(source_path):
+            stat = os.stat(source_path)
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                # Touched or copied files keep their content hash
+                if stat.st_size != size or _file_sha256(source_path) != sha256:
+                    return None
+
+        view = memoryview(data)
+        position = CACHE_HEADER.size
+
+        def column(length: int) -> array:
+            nonlocal position
+            values = array('I')
+            values.frombytes(view[position:position + 4 * length])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            position += 4 * length
+            return values
+
+        try:
+            offsets = column(string_count + 1)
+            scalars = [column(count) for _ in SCALAR_FIELDS]
+            lists = []
+            for _ in LIST_FIELDS:
+                starts = column(count + 1)
+                lists.append((starts, column(starts[-1])))
+
+            blob = bytes(view[position:position + offsets[-1]])
+        finally:
+            view.release()
+
+    strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(string_count)]
+    description_ids = set(scalars[SCALAR_FIELDS.index('description')])
+    intern = sys.intern
+    strings = [value if index in description_ids else intern(value) for index, value in enumerate(strings)]
+
+    techniques = []
+    for i in range(count):
+        fields = {name: strings[values[i]] for name, values in zip(SCALAR_FIELDS, scalars)}
+        for name, (starts, items) in zip(LIST_FIELDS, lists):
+            fields[name] = tuple(strings[index] for index in items[starts[i]:starts[i + 1]])
+        techniques.append(Technique(**fields))
+    return techniques
+
+
+class AttackCatalog:
+    """Process-wide ATT&CK technique catalog shared by the RAG loader and the validator."""
+
+    def __init__(self, data_path: Optional[str] = None, cache_path: Optional[str] = None):
+        """
+        Args:
+            data_path: STIX bundle path (defaults to Config.ATTACK_DATA_PATH)
+            cache_path: Binary cache path (defaults to the bundle path with a .catalog
+                extension; an empty string disables the cache)
+        """
+        self.data_path = data_path or Config.ATTACK_DATA_PATH
+        self.cache_path = os.path.splitext(self.data_path)[0] + '.catalog' if cache_path is None else cache_path
+        self._lock = threading.Lock()
+        self._techniques: Optional[List[Technique]] = None
+        self._by_id: Dict[str, Technique] = {}
+        self._by_name: Dict[str, str] = {}
+        self._platforms: Set[str] = set()
+        self._tactics: Set[str] = set()
+        # Incremented on every (re)load so consumers can drop data derived from an old catalog
+        self.version = 0
+
+    def _parse_bundle(self) -> List[Technique]:
+        return [
+            Technique.from_stix(obj)
+            for obj in iter_bundle_objects(self.data_path)
+            if obj.get('type') == 'attack-pattern'
+        ]
+
+    def _write_cache(self, techniques: List[Technique]) -> None:
+        write_catalog_cache(self.cache_path, techniques, fingerprint_source(self.data_path))
+        logger.info(f"Wrote ATT&CK catalog cache {self.cache_path} ({len(techniques)} attack patterns)")
+
+    def build_cache(self) -> List[Technique]:
+        """Parse the STIX bundle and (re)write the binary cache from it."""
+        techniques = self._parse_bundle()
+        self._write_cache(techniques)
+        return techniques
+
+    def _load_techniques(self, use_cache: bool = True) -> List[Technique]:
+        if not self.cache_path:
+            return self._parse_bundle()
+
+        if use_cache:
+            try:
+                techniques = read_catalog_cache(self.cache_path, self.data_path)
+                if techniques is not None:
+                    return techniques
+                logger.info("ATT&CK catalog cache missing or stale, rebuilding from STIX bundle")
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable ATT&CK catalog cache {self.cache_path}: {e}")
+
+        techniques = self._parse_bundle()
+        try:
+            self._write_cache(techniques)
+        except OSError as e:
+            # A read-only deployment can still serve from the parsed bundle
+            logger.warning(f"Could not write ATT&CK catalog cache {self.cache_path}: {e}")
+        return techniques
+
+    def _load(self, use_cache: bool = True) -> None:
+        techniques = self._load_techniques(use_cache)
+
+        by_id, by_name, platforms, tactics = {}, {}, set(), set()
+        for technique in techniques:
+            if not technique.technique_id:
+                continue
+            by_id[technique.technique_id] = technique
+            by_name[technique.name.lower()] = technique.technique_id
+            platforms.update(technique.platforms)
+            tactics.update(technique.kill_chain_phases)
+
+        self._techniques = techniques
+        self._by_id, self._by_name = by_id, by_name
+        self._platforms, self._tactics = platforms, tactics
+        self.version += 1
+        logger.info(f"ATT&CK catalog loaded: {len(techniques)} attack patterns, {len(by_id)} with technique IDs")
+
+    def ensure_loaded(self) -> None:
+        """Load the catalog on first use (from the cache when fresh); later calls are free."""
+        if self._techniques is not None:
+            return
+        with self._lock:
+            if self._techniques is None:
+                self._load()
+
+    def reload(self) -> None:
+        """Re-parse the bundle (e.g. after the STIX data was updated) and refresh the cache."""
+        with self._lock:
+            self._load(use_cache=False)
+
+    @property
+    def techniques(self) -> List[Technique]:
+        """All attack-patterns in bundle order, including ones without a technique ID."""
+        self.ensure_loaded()
+        return self._techniques
+
+    @property
+    def by_id(self) -> Dict[str, Technique]:
+        """Techniques keyed by ATT&CK technique ID (e.g. T1055.001)."""
+        self.ensure_loaded()
+        return self._by_id
+
+    @property
+    def by_name(self) -> Dict[str, str]:
+        """Technique IDs keyed by lowercased technique name."""
+        self.ensure_loaded()
+        return self._by_name
+
+    @property
+    def platforms(self) -> Set[str]:
+        self.ensure_loaded()
+        return self._platforms
+
+    @property
+    def tactics(self) -> Set[str]:
+        self.ensure_loaded()
+        return self._tactics
+
+# Global catalog instance
+attack_catalog = AttackCatalog()
@@ -1,8 +1,10 @@
+import asyncio
 import boto3
 import json
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from core import Config, logger
+from services.streaming import iterate_in_thread
 
 class AWSBedrockService:
     """Service for AWS Bedrock Titan text embedding model."""
@@ -226,23 +228,11 @@ class AWSBedrockService:
                 "summary": "Error processing query"
             }
     
-    async def generate_conversational_response(self, query: str, context: str, max_tokens: int = 500, structured: bool = False) -> str:
-        """
-        Generate a conversational response using AWS Titan Text Express.
-
-        Args:
-            query (str): User's query
-            context (str): Context from relevant MITRE techniques
-            max_tokens (int): Maximum tokens in response
-            structured (bool): If True, ask the model to return a single JSON object
-
-        Returns:
-            str: Generated conversational response (plain text or JSON string when structured=True)
-        """
-        try:
-            if structured:
-                # Strict prompt asking for a single JSON object. Provide schema and a short example.
-                prompt = f"""
+    def _build_conversational_prompt(self, query: str, context: str, structured: bool = False) -> str:
+        """Build the Titan prompt for a conversational (or structured JSON) MITRE answer."""
+        if structured:
+            # Strict prompt asking for a single JSON object. Provide schema and a short example.
+            prompt = f"""
 You are an expert cybersecurity analyst specialized in MITRE ATT&CK. Based on the context below, return exactly one valid JSON object (no surrounding commentary) that follows the schema described.
 
 Schema (fields and types):
@@ -278,8 +268,8 @@ Example output:
 
 Provide only the JSON object.
 """.strip()
-            else:
-                prompt = f"""
+        else:
+            prompt = f"""
 You are an expert cybersecurity analyst specializing in the MITRE ATT&CK framework. 
 You help users understand attack techniques, tactics, and procedures to improve their security posture.
 
@@ -299,6 +289,24 @@ Guidelines for your response:
 User Query: {query}
 
 Response:"""
+        return prompt
+    
+    async def generate_conversational_response(self, query: str, context: str, max_tokens: int = 500, structured: bool = False, strict: bool = False) -> str:
+        """
+        Generate a conversational response using AWS Titan Text Express.
+
+        Args:
+            query (str): User's query
+            context (str): Context from relevant MITRE techniques
+            max_tokens (int): Maximum tokens in response
+            structured (bool): If True, ask the model to return a single JSON object
+            strict (bool): If True, raise on errors or empty output instead of returning the fallback text
+
+        Returns:
+            str: Generated conversational response (plain text or JSON string when structured=True)
+        """
+        try:
+            prompt = self._build_conversational_prompt(query, context, structured)
             
             logger.info(f"Generating response for query: {query[:50]}...")
             
@@ -314,16 +322,18 @@ Response:"""
             
             logger.info(f"Invoking Titan model: {self.text_model_id}")
             
-            # Invoke the Titan Text model
-            response = self.client.invoke_model(
-                body=json.dumps(body),
-                modelId=self.text_model_id,
-                accept="application/json",
-                contentType="application/json"
-            )
+            # Invoke the Titan Text model off the event loop (boto3 is blocking)
+            def invoke():
+                response = self.client.invoke_model(
+                    body=json.dumps(body),
+                    modelId=self.text_model_id,
+                    accept="application/json",
+                    contentType="application/json"
+                )
+                return json.loads(response.get('body').read())
             
             # Parse the response
-            response_body = json.loads(response.get('body').read())
+            response_body = await asyncio.to_thread(invoke)
             generated_text = response_body.get('results', [{}])[0].get('outputText', '')
             
             logger.info(f"Titan response received, length: {len(generated_text) if generated_text else 0}")
@@ -359,13 +369,58 @@ Response:"""
                 return cleaned_response
             else:
                 logger.warning("No text generated by Titan Text Lite")
+                if strict:
+                    raise ValueError("No text generated by Titan Text Lite")
                 return self._generate_fallback_response(query)
                 
         except Exception as e:
             logger.error(f"Error generating conversational response with Titan: {str(e)}")
             logger.error(f"Exception type: {type(e).__name__}")
+            if strict:
+                raise
             return self._generate_fallback_response(query)
-    
+
+    async def stream_conversational_response(self, query: str, context: str, max_tokens: int = 500) -> AsyncIterator[str]:
+        """
+        Stream a conversational response from Titan Text token by token.
+
+        Args:
+            query (str): User's query
+            context (str): Context from relevant MITRE techniques
+            max_tokens (int): Maximum tokens in response
+
+        Yields:
+            str: Response text chunks as produced by the model
+        """
+        prompt = self._build_conversational_prompt(query, context)
+        body = {
+            "inputText": prompt,
+            "textGenerationConfig": {
+                "maxTokenCount": max_tokens,
+                "temperature": 0.7,
+                "topP": 0.9
+            }
+        }
+
+        def read_stream():
+            response = self.client.invoke_model_with_response_stream(
+                body=json.dumps(body),
+                modelId=self.text_model_id,
+                accept="application/json",
+                contentType="application/json"
+            )
+            for event in response.get('body', []):
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                output_text = json.loads(chunk.get('bytes')).get('outputText', '')
+                if output_text:
+                    yield output_text
+
+        logger.info(f"Streaming Titan response for query: {query[:50]}...")
+        async for text in iterate_in_thread(read_stream):
+            yield text
+
     def _generate_fallback_response(self, query: str) -> str:
         """Generate a fallback response when Titan text generation fails."""
         return f"I understand you're asking about '{query}' in the context of cybersecurity and MITRE ATT&CK. While I'm currently unable to generate a detailed response, I can tell you that the MITRE ATT&CK framework is an excellent resource for understanding adversary behaviors. I recommend exploring the official MITRE ATT&CK website or using the search functionality in our analysis tools to get specific information about techniques, tactics, and procedures relevant to your query."
@@ -0,0 +1,98 @@
+"""
+Cross-worker invalidation of per-user caches.
+
+Auth documents, key material and derived ciphers are cached per worker process (see
+routers/auth.py, AnalysisStorageService and EncryptionService). Invalidating them in the
+process that changed a password is not enough: another worker would keep using the old
+key until its entries expire. publish() therefore also records the invalidation in the
+"cache_invalidations" collection, which every worker polls every
+CACHE_INVALIDATION_POLL_SECONDS and replays through the registered handlers.
+
+Events expire after an hour through a TTL index; workers only look back a short window.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from pymongo.errors import PyMongoError
+from db import database
+from core import Config, TTLCache, logger, metrics
+
+# How far back each poll looks, beyond the poll interval, to tolerate slow inserts
+LOOKBACK_SLACK_SECONDS = 30
+
+
+class CacheInvalidationService:
+    """Publishes per-user cache invalidations and applies those published by other workers."""
+
+    def __init__(self, poll_seconds: float = Config.CACHE_INVALIDATION_POLL_SECONDS):
+        self.collection = database.get_collection("cache_invalidations")
+        self.poll_seconds = poll_seconds
+        self._handlers: List[Callable[[str], None]] = []
+        # Events already applied here, so overlapping polls replay each one once
+        self._seen = TTLCache(maxsize=10000, ttl=poll_seconds + 2 * LOOKBACK_SLACK_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, handler: Callable[[str], None]) -> None:
+        """Call handler(user_id) for every invalidation, local or from another worker."""
+        self._handlers.append(handler)
+
+    def _apply(self, user_id: str) -> None:
+        for handler in self._handlers:
+            try:
+                handler(user_id)
+            except Exception as e:
+                logger.warning(f"Cache invalidation handler failed for user {user_id}: {e}")
+
+    async def publish(self, user_id: str) -> None:
+        """Invalidate a user's cached entries here and, within a poll interval, on every worker."""
+        self._apply(user_id)
+        metrics.increment("cache_invalidation.published")
+        try:
+            result = await self.collection.insert_one({"user_id": user_id, "created_at": datetime.utcnow()})
+            self._seen.set(result.inserted_id, True)
+        except PyMongoError as e:
+            # Other workers fall back to their cache TTLs
+            logger.warning(f"Could not publish cache invalidation for user {user_id}: {e}")
+
+    async def poll_once(self, since: datetime) -> int:
+        """Apply invalidations published since `since` that were not applied yet; returns how many."""
+        applied = 0
+        async for doc in self.collection.find({"created_at": {"$gte": since}}, {"user_id": 1}):
+            if self._seen.get(doc["_id"]) is not None:
+                continue
+            self._seen.set(doc["_id"], True)
+            self._apply(doc["user_id"])
+            applied += 1
+        if applied:
+            metrics.increment("cache_invalidation.applied", applied)
+        return applied
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.poll_once(datetime.utcnow() - timedelta(seconds=self.poll_seconds + LOOKBACK_SLACK_SECONDS))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.increment("cache_invalidation.poll_failures")
+                logger.warning(f"Cache invalidation poll failed: {e}")
+
+    async def start(self) -> None:
+        """Start polling for invalidations from other workers (no-op if disabled)."""
+        if self.poll_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+cache_invalidation_service = CacheInvalidationService()
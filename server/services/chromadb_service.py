@@ -1,10 +1,10 @@
-import json
 import os
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any
 from core import Config, logger
+from services.attack_catalog import attack_catalog, Technique
 
 # Disable ChromaDB telemetry to reduce noise
 os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
@@ -16,34 +16,10 @@ class AttackDataProcessor:
         self.data_path = Config.ATTACK_DATA_PATH
         logger.info("Attack data processor initialized")
     
-    def load_attack_data(self) -> List[Dict[str, Any]]:
-        """Load and process MITRE ATT&CK data from STIX JSON."""
+    def load_attack_data(self) -> List[Technique]:
+        """Load MITRE ATT&CK techniques from the shared catalog."""
         try:
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                stix_data = json.load(f)
-            
-            techniques = []
-            
-            for obj in stix_data.get('objects', []):
-                if obj.get('type') == 'attack-pattern':
-                    technique = {
-                        'id': obj.get('id', ''),
-                        'technique_id': obj.get('external_references', [{}])[0].get('external_id', ''),
-                        'name': obj.get('name', ''),
-                        'description': obj.get('description', ''),
-                        'kill_chain_phases': [phase.get('phase_name', '') for phase in obj.get('kill_chain_phases', [])],
-                        'platforms': obj.get('x_mitre_platforms', []),
-                        'tactics': obj.get('kill_chain_phases', []),
-                        'modified': obj.get('modified', ''),
-                        'created': obj.get('created', '')
-                    }
-                    
-                    # Create searchable text combining multiple fields
-                    searchable_text = f"{technique['name']} {technique['description']} {' '.join(technique['kill_chain_phases'])} {' '.join(technique['platforms'])}"
-                    technique['searchable_text'] = searchable_text
-                    
-                    techniques.append(technique)
-            
+            techniques = attack_catalog.techniques
             logger.info(f"Loaded {len(techniques)} attack techniques")
             return techniques
             
@@ -113,15 +89,15 @@ class ChromaDBService:
             ids = []
             
             for technique in techniques:
-                documents.append(technique['searchable_text'])
+                documents.append(technique.searchable_text)
                 metadatas.append({
-                    'technique_id': technique['technique_id'],
-                    'name': technique['name'],
-                    'description': technique['description'][:1000],  # Limit description length
-                    'kill_chain_phases': ','.join(technique['kill_chain_phases']),
-                    'platforms': ','.join(technique['platforms'])
+                    'technique_id': technique.technique_id,
+                    'name': technique.name,
+                    'description': technique.description[:1000],  # Limit description length
+                    'kill_chain_phases': ','.join(technique.kill_chain_phases),
+                    'platforms': ','.join(technique.platforms)
                 })
-                ids.append(technique['id'])
+                ids.append(technique.stix_id)
             
             # Add to ChromaDB in batches
             batch_size = 100
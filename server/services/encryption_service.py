@@ -7,7 +7,8 @@ import os
 import json
 import hashlib
 import base64
-from typing import Dict, Any, Optional, Tuple
+import zlib
+from typing import Dict, Any, Optional, Tuple, Union
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -15,7 +16,17 @@ from datetime import datetime
 import secrets
 
 from core.config import settings
-from core import logger
+from core import Config, logger, TTLCache
+
+# Envelope format for new ciphertexts, stored as raw bytes (BSON Binary):
+#   [version: 1 byte][codec: 1 byte][Fernet token, base64-decoded]
+# Legacy ciphertexts are text (a Fernet token, or base64 of one) and stay readable.
+ENVELOPE_VERSION = 1
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+# Below this size zlib's header and checksum usually outweigh any savings
+COMPRESSION_MIN_BYTES = 128
+COMPRESSION_LEVEL = 6
 
 class EncryptionService:
     """Service for encrypting and decrypting sensitive analysis data."""
@@ -24,6 +35,13 @@ class EncryptionService:
         self.master_key = settings.ENCRYPTION_MASTER_KEY.encode()
         self.salt_length = 32
         self.key_iteration_count = 100000
+        # Derived keys and ciphers are cached so repeated calls skip PBKDF2 and Fernet setup
+        self._user_ciphers = TTLCache(
+            maxsize=Config.USER_KEY_CACHE_SIZE, ttl=Config.USER_KEY_CACHE_TTL_SECONDS, name="user_ciphers"
+        )
+        self._password_ciphers = TTLCache(
+            maxsize=Config.USER_KEY_CACHE_SIZE, ttl=Config.USER_KEY_CACHE_TTL_SECONDS, name="password_ciphers"
+        )
     
     def _derive_key(self, password: bytes, salt: bytes) -> bytes:
         """Derive encryption key from password and salt using PBKDF2."""
@@ -53,7 +71,76 @@ class EncryptionService:
         
         return key, key_id
     
-    def encrypt_data(self, data: Any, user_id: str) -> Tuple[str, str]:
+    def _get_user_cipher(self, user_id: str) -> Tuple[Fernet, str]:
+        """Return the (cached) Fernet cipher and key ID derived for a user."""
+        cached = self._user_ciphers.get(user_id)
+        if cached is None:
+            key, key_id = self._generate_user_key(user_id)
+            cached = (Fernet(key), key_id)
+            self._user_ciphers.set(user_id, cached)
+        return cached
+    
+    def _get_password_cipher(self, hashed_password: str) -> Tuple[Fernet, str]:
+        """Return the (cached) Fernet cipher and key ID for a user's hashed password."""
+        cached = self._password_ciphers.get(hashed_password)
+        if cached is None:
+            key_material = hashlib.sha256(hashed_password.encode()).digest()
+            key = base64.urlsafe_b64encode(key_material)
+            key_id = self.password_key_id(hashed_password)
+            cached = (Fernet(key), key_id)
+            self._password_ciphers.set(hashed_password, cached)
+        return cached
+    
+    @staticmethod
+    def password_key_id(hashed_password: str) -> str:
+        """Key ID recorded with data encrypted under a user's hashed password."""
+        return f"pwd_{hashlib.md5(hashed_password.encode()).hexdigest()[:8]}"
+    
+    def invalidate_user_keys(self, user_id: Optional[str] = None, hashed_password: Optional[str] = None):
+        """Drop cached keys for a user, e.g. after a password change."""
+        if user_id is not None:
+            self._user_ciphers.pop(user_id)
+        if hashed_password is not None:
+            self._password_ciphers.pop(hashed_password)
+    
+    @staticmethod
+    def _seal(cipher: Fernet, plaintext: bytes) -> bytes:
+        """Compress (when it pays off) and encrypt plaintext into a versioned envelope."""
+        codec = CODEC_NONE
+        if len(plaintext) >= COMPRESSION_MIN_BYTES:
+            compressed = zlib.compress(plaintext, COMPRESSION_LEVEL)
+            if len(compressed) < len(plaintext):
+                plaintext, codec = compressed, CODEC_ZLIB
+        token = cipher.encrypt(plaintext)
+        return bytes((ENVELOPE_VERSION, codec)) + base64.urlsafe_b64decode(token)
+    
+    @staticmethod
+    def _unseal(cipher: Fernet, sealed: Union[str, bytes]) -> bytes:
+        """Decrypt an envelope, or a legacy Fernet token stored as text."""
+        if isinstance(sealed, str):
+            return cipher.decrypt(sealed.encode('ascii'))
+        sealed = bytes(sealed)
+        if len(sealed) < 2 or sealed[0] != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported envelope version: {sealed[:1].hex()}")
+        plaintext = cipher.decrypt(base64.urlsafe_b64encode(sealed[2:]))
+        codec = sealed[1]
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(plaintext)
+        if codec != CODEC_NONE:
+            raise ValueError(f"Unsupported envelope codec: {codec}")
+        return plaintext
+    
+    def encrypt_payload(self, plaintext: bytes, hashed_password: str) -> bytes:
+        """Encrypt raw bytes into an envelope keyed by the user's hashed password."""
+        cipher, _ = self._get_password_cipher(hashed_password)
+        return self._seal(cipher, plaintext)
+    
+    def decrypt_payload(self, sealed: Union[str, bytes], hashed_password: str) -> bytes:
+        """Inverse of encrypt_payload (also reads legacy text tokens); raises on failure."""
+        cipher, _ = self._get_password_cipher(hashed_password)
+        return self._unseal(cipher, sealed)
+    
+    def encrypt_data(self, data: Any, user_id: str) -> Tuple[bytes, str]:
         """
         Encrypt data for a specific user.
         
@@ -62,37 +149,31 @@ class EncryptionService:
             user_id: User identifier
             
         Returns:
-            Tuple of (encrypted_data_base64, key_id)
+            Tuple of (encrypted_envelope, key_id)
         """
         try:
             # Serialize data to JSON
             json_data = json.dumps(data, default=str, ensure_ascii=False)
             
-            # Generate user-specific key
-            key, key_id = self._generate_user_key(user_id)
-            
-            # Create Fernet cipher
-            cipher = Fernet(key)
-            
-            # Encrypt the data
-            encrypted_data = cipher.encrypt(json_data.encode('utf-8'))
+            # User-specific cipher (derived once, then cached)
+            cipher, key_id = self._get_user_cipher(user_id)
             
-            # Encode to base64 for storage
-            encrypted_b64 = base64.b64encode(encrypted_data).decode('ascii')
+            # Compress and encrypt into a binary envelope (no base64 on top)
+            encrypted_data = self._seal(cipher, json_data.encode('utf-8'))
             
             logger.info(f"Successfully encrypted data for user {user_id} with key ID {key_id}")
-            return encrypted_b64, key_id
+            return encrypted_data, key_id
             
         except Exception as e:
             logger.error(f"Failed to encrypt data for user {user_id}: {str(e)}")
             raise
     
-    def decrypt_data(self, encrypted_data_b64: str, user_id: str, key_id: str) -> Any:
+    def decrypt_data(self, encrypted_data: Union[str, bytes], user_id: str, key_id: str) -> Any:
         """
         Decrypt data for a specific user.
         
         Args:
-            encrypted_data_b64: Base64 encoded encrypted data
+            encrypted_data: Binary envelope, or legacy base64 encoded Fernet token
             user_id: User identifier
             key_id: Key ID used for encryption
             
@@ -100,17 +181,14 @@ class EncryptionService:
             Decrypted and deserialized data
         """
         try:
-            # Generate the user key
-            key, regenerated_key_id = self._generate_user_key(user_id)
+            # User-specific cipher (derived once, then cached)
+            cipher, regenerated_key_id = self._get_user_cipher(user_id)
             
-            # Decode from base64
-            encrypted_data = base64.b64decode(encrypted_data_b64.encode('ascii'))
-            
-            # Create Fernet cipher
-            cipher = Fernet(key)
-            
-            # Decrypt the data
-            decrypted_data = cipher.decrypt(encrypted_data)
+            if isinstance(encrypted_data, str):
+                # Legacy format: base64 of the Fernet token
+                decrypted_data = cipher.decrypt(base64.b64decode(encrypted_data.encode('ascii')))
+            else:
+                decrypted_data = self._unseal(cipher, encrypted_data)
             
             # Deserialize JSON
             json_str = decrypted_data.decode('utf-8')
@@ -139,7 +217,7 @@ class EncryptionService:
                                summary: str,
                                techniques: list,
                                enhanced_analysis: Optional[str],
-                               hashed_password: str) -> Tuple[Dict[str, str], str]:
+                               hashed_password: str) -> Tuple[Dict[str, bytes], str]:
         """
         Encrypt all analysis results using user's hashed password as key.
         
@@ -150,78 +228,80 @@ class EncryptionService:
             hashed_password: User's hashed password to use as encryption key
         
         Returns:
-            Tuple of (encrypted_data_dict, key_id)
+            Tuple of (encrypted_data_dict, key_id); values are compressed binary envelopes
         """
         # Use hashed password directly for encryption key derivation
-        key_material = hashlib.sha256(hashed_password.encode()).digest()
-        key = base64.urlsafe_b64encode(key_material)
-        key_id = f"pwd_{hashlib.md5(hashed_password.encode()).hexdigest()[:8]}"
+        cipher, key_id = self._get_password_cipher(hashed_password)
         logger.info(f"Using hashed password for encryption: {key_id}")
         
-        cipher = Fernet(key)
-        
         encrypted_data = {}
         
         # Encrypt summary
-        encrypted_data['summary'] = cipher.encrypt(summary.encode('utf-8')).decode('ascii')
+        encrypted_data['summary'] = self._seal(cipher, summary.encode('utf-8'))
         
         # Encrypt techniques (as JSON)
         techniques_json = json.dumps(techniques)
-        encrypted_data['techniques'] = cipher.encrypt(techniques_json.encode('utf-8')).decode('ascii')
+        encrypted_data['techniques'] = self._seal(cipher, techniques_json.encode('utf-8'))
         
         # Encrypt enhanced analysis if provided
         if enhanced_analysis:
-            encrypted_data['enhanced_analysis'] = cipher.encrypt(enhanced_analysis.encode('utf-8')).decode('ascii')
+            encrypted_data['enhanced_analysis'] = self._seal(cipher, enhanced_analysis.encode('utf-8'))
         
         return encrypted_data, key_id
 
     def decrypt_analysis_results(self,
-                                 encrypted_data: Dict[str, str],
+                                 encrypted_data: Dict[str, Union[str, bytes]],
                                  hashed_password: str) -> Dict[str, Any]:
         """Decrypt all analysis results using user's hashed password as key.
         
         Args:
-            encrypted_data: Dictionary of encrypted data
+            encrypted_data: Dictionary of encrypted data (binary envelopes or legacy text tokens)
             hashed_password: User's hashed password to use as decryption key
+            
+        Returns:
+            The decrypted fields, plus `failed_fields`: the stored fields that did not
+            decrypt (e.g. with a stale key), which are returned empty
         """
         try:
             # Use hashed password directly for decryption key derivation
-            key_material = hashlib.sha256(hashed_password.encode()).digest()
-            key = base64.urlsafe_b64encode(key_material)
+            cipher, _ = self._get_password_cipher(hashed_password)
             logger.info(f"Using hashed password for decryption")
-                
-            cipher = Fernet(key)
             
             decrypted_data = {}
+            failed_fields = []
             
             # Decrypt summary
             if encrypted_data.get('summary'):
                 try:
-                    decrypted_data['summary'] = cipher.decrypt(encrypted_data['summary'].encode('ascii')).decode('utf-8')
+                    decrypted_data['summary'] = self._unseal(cipher, encrypted_data['summary']).decode('utf-8')
                 except Exception:
                     decrypted_data['summary'] = ""
+                    failed_fields.append('summary')
             else:
                 decrypted_data['summary'] = ""
             
             # Decrypt techniques
             if encrypted_data.get('techniques'):
                 try:
-                    decrypted_techniques_json = cipher.decrypt(encrypted_data['techniques'].encode('ascii')).decode('utf-8')
+                    decrypted_techniques_json = self._unseal(cipher, encrypted_data['techniques']).decode('utf-8')
                     decrypted_data['techniques'] = json.loads(decrypted_techniques_json)
                 except Exception:
                     decrypted_data['techniques'] = []
+                    failed_fields.append('techniques')
             else:
                 decrypted_data['techniques'] = []
             
             # Decrypt enhanced analysis if present
             if encrypted_data.get('enhanced_analysis'):
                 try:
-                    decrypted_data['enhanced_analysis'] = cipher.decrypt(encrypted_data['enhanced_analysis'].encode('ascii')).decode('utf-8')
+                    decrypted_data['enhanced_analysis'] = self._unseal(cipher, encrypted_data['enhanced_analysis']).decode('utf-8')
                 except Exception:
                     decrypted_data['enhanced_analysis'] = None
+                    failed_fields.append('enhanced_analysis')
             else:
                 decrypted_data['enhanced_analysis'] = None
                 
+            decrypted_data['failed_fields'] = failed_fields
             return decrypted_data
         
         except Exception as e:
@@ -229,7 +309,8 @@ class EncryptionService:
             return {
                 'summary': "",
                 'techniques': [],
-                'enhanced_analysis': None
+                'enhanced_analysis': None,
+                'failed_fields': [key for key, value in encrypted_data.items() if value]
             }
 
 # Global service instance
@@ -1,5 +1,5 @@
 import google.generativeai as genai
-from typing import Optional
+from typing import Optional, AsyncIterator
 from core import Config, logger
 
 class GeminiService:
@@ -66,6 +66,33 @@ class GeminiService:
             logger.error(f"Error in log summarization: {str(e)}")
             return f"Error generating summary: {str(e)}"
     
+    def _build_threat_analysis_prompt(self, summary: str, attack_techniques: list) -> str:
+        """Build the prompt correlating a log summary with matched ATT&CK techniques."""
+        techniques_text = "\n".join([
+            f"- {tech.get('name', 'Unknown')}: {tech.get('description', 'No description')[:200]}..."
+            for tech in attack_techniques
+        ])
+        
+        prompt = f"""
+        Based on the following log summary and matching MITRE ATT&CK techniques, provide a comprehensive threat analysis:
+
+        LOG SUMMARY:
+        {summary}
+
+        MATCHING ATT&CK TECHNIQUES:
+        {techniques_text}
+
+        Please provide:
+        1. **Threat Assessment**: Overall threat level and confidence
+        2. **Attack Vector Analysis**: How the techniques relate to observed activities
+        3. **Potential Impact**: What could happen if this is a real attack
+        4. **Recommended Actions**: Immediate steps for investigation and mitigation
+        5. **IOCs to Monitor**: Specific indicators to watch for
+
+        ENHANCED ANALYSIS:
+        """
+        return prompt
+    
     async def enhance_threat_analysis(self, summary: str, attack_techniques: list) -> str:
         """
         Enhance the threat analysis by correlating with MITRE ATT&CK techniques.
@@ -78,29 +105,7 @@ class GeminiService:
             str: Enhanced analysis with threat intelligence
         """
         try:
-            techniques_text = "\n".join([
-                f"- {tech.get('name', 'Unknown')}: {tech.get('description', 'No description')[:200]}..."
-                for tech in attack_techniques
-            ])
-            
-            prompt = f"""
-            Based on the following log summary and matching MITRE ATT&CK techniques, provide a comprehensive threat analysis:
-
-            LOG SUMMARY:
-            {summary}
-
-            MATCHING ATT&CK TECHNIQUES:
-            {techniques_text}
-
-            Please provide:
-            1. **Threat Assessment**: Overall threat level and confidence
-            2. **Attack Vector Analysis**: How the techniques relate to observed activities
-            3. **Potential Impact**: What could happen if this is a real attack
-            4. **Recommended Actions**: Immediate steps for investigation and mitigation
-            5. **IOCs to Monitor**: Specific indicators to watch for
-
-            ENHANCED ANALYSIS:
-            """
+            prompt = self._build_threat_analysis_prompt(summary, attack_techniques)
             
             response = self.model.generate_content(prompt)
             
@@ -115,31 +120,78 @@ class GeminiService:
             logger.error(f"Error in threat analysis enhancement: {str(e)}")
             return f"Error enhancing analysis: {str(e)}"
     
-    async def generate_conversational_response(self, query: str, context: str) -> str:
+    async def generate_conversational_response(self, query: str, context: str, strict: bool = False) -> str:
         """
         Generate a conversational response about MITRE ATT&CK using context.
         
         Args:
             query (str): User query
             context (str): Context with techniques or general guidance
+            strict (bool): If True, raise on errors or empty output instead of returning a placeholder
             
         Returns:
             str: Conversational response
         """
         try:
-            response = self.model.generate_content(context)
+            response = await self.model.generate_content_async(context)
             
             if response and response.text:
                 logger.info("Successfully generated conversational response")
                 return response.text.strip()
             else:
                 logger.warning("Empty response from Gemini for conversational query")
+                if strict:
+                    raise ValueError("Empty response from Gemini")
                 return f"I'm unable to provide a detailed response to '{query}' at the moment."
                 
         except Exception as e:
             logger.error(f"Error generating conversational response: {str(e)}")
+            if strict:
+                raise
             return f"Error generating response: {str(e)}"
-    
+
+    async def _stream_content(self, prompt: str) -> AsyncIterator[str]:
+        """Yield text chunks from Gemini as they are generated."""
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata only)
+                continue
+            if text:
+                yield text
+
+    async def stream_conversational_response(self, query: str, context: str) -> AsyncIterator[str]:
+        """
+        Stream a conversational response about MITRE ATT&CK token by token.
+
+        Args:
+            query (str): User query
+            context (str): Context with techniques or general guidance
+
+        Yields:
+            str: Response text chunks as produced by the model
+        """
+        logger.info(f"Streaming conversational response for query: {query[:50]}...")
+        async for text in self._stream_content(context):
+            yield text
+
+    async def stream_threat_analysis(self, summary: str, attack_techniques: list) -> AsyncIterator[str]:
+        """
+        Stream the enhanced threat analysis token by token.
+
+        Args:
+            summary (str): Log summary
+            attack_techniques (list): Matched MITRE ATT&CK techniques
+
+        Yields:
+            str: Enhanced analysis text chunks as produced by the model
+        """
+        prompt = self._build_threat_analysis_prompt(summary, attack_techniques)
+        async for text in self._stream_content(prompt):
+            yield text
+
     async def generate_mitre_response(self, query: str, context_techniques: list) -> dict:
         """
         Generate a comprehensive response about MITRE framework data.
@@ -0,0 +1,260 @@
+"""
+LLM provider router with hedged requests, failover and per-provider circuit breakers.
+
+The primary provider (Gemini) is called first. If it has not answered within its recent
+p95 latency, a hedged request goes to the secondary provider (AWS Bedrock) and whichever
+answers first wins; the loser is cancelled. A provider that keeps failing is skipped
+until its circuit breaker lets a probe request through again.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, List, Optional, Tuple
+from core import logger, metrics
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe after a cool-down."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """
+        Whether a call may be routed to this provider right now.
+
+        Only ask when the call will be made: past the cool-down, the caller that gets
+        True is the probe, and everyone else is refused until its outcome is recorded
+        (or release_probe() is called).
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self.probe_in_flight:
+            return False
+        # A single probe: its outcome closes or re-opens the circuit
+        self.probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """Give up a probe that ended without an outcome (cancelled), so another can run."""
+        self.probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning(f"Circuit breaker for {self.name}: {self.state} -> {state}")
+        self.state = state
+        metrics.set_gauge(f"llm.{self.name}.circuit_open", 1.0 if state == self.OPEN else 0.0)
+
+
+@dataclass
+class _Provider:
+    name: str
+    service: Any
+    breaker: CircuitBreaker = field(init=False)
+
+    def __post_init__(self):
+        self.breaker = CircuitBreaker(self.name)
+
+    @property
+    def latency_metric(self) -> str:
+        return f"llm.{self.name}.latency_ms"
+
+
+class LLMProviderRouter:
+    """Routes conversational LLM calls across providers with hedging and failover."""
+
+    def __init__(self,
+                 primary_name: str,
+                 primary: Any,
+                 secondary_name: Optional[str] = None,
+                 secondary: Any = None,
+                 hedge_quantile: float = 0.95,
+                 default_hedge_delay: float = 3.0,
+                 min_hedge_delay: float = 0.25,
+                 max_hedge_delay: float = 15.0,
+                 min_latency_samples: int = 20):
+        self.providers: List[_Provider] = [_Provider(primary_name, primary)]
+        if secondary is not None:
+            self.providers.append(_Provider(secondary_name or "secondary", secondary))
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.min_latency_samples = min_latency_samples
+        logger.info(f"LLM router initialized with providers: {[p.name for p in self.providers]}")
+
+    @staticmethod
+    def _take_allowed(candidates: List[_Provider]) -> Optional[_Provider]:
+        """Pop candidates until one whose breaker admits a call now (which is then made)."""
+        while candidates:
+            provider = candidates.pop(0)
+            if provider.breaker.allow_request():
+                return provider
+        return None
+
+    def _first_provider(self) -> Tuple[_Provider, List[_Provider]]:
+        """The provider to call first and the backups after it, whose breakers are not asked yet."""
+        candidates = list(self.providers)
+        # With every circuit open, still try the primary rather than failing outright
+        first = self._take_allowed(candidates) or self.providers[0]
+        return first, candidates
+
+    def hedge_delay(self, provider: _Provider) -> float:
+        """Seconds to wait on a provider before hedging, based on its recent p95 latency."""
+        if metrics.sample_count(provider.latency_metric) < self.min_latency_samples:
+            return self.default_hedge_delay
+        p95_ms = metrics.percentile(provider.latency_metric, self.hedge_quantile)
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, p95_ms / 1000))
+
+    async def _call_provider(self, provider: _Provider, query: str, context: str) -> str:
+        start = time.perf_counter()
+        try:
+            result = await provider.service.generate_conversational_response(
+                query=query,
+                context=context,
+                strict=True
+            )
+        except asyncio.CancelledError:
+            # A call cancelled because the other provider won took at least this long;
+            # dropping it would bias the p95 (and so the hedge delay) toward fast calls
+            metrics.increment(f"llm.{provider.name}.cancelled")
+            metrics.observe(provider.latency_metric, (time.perf_counter() - start) * 1000)
+            provider.breaker.release_probe()
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            metrics.increment(f"llm.{provider.name}.failures")
+            raise
+        provider.breaker.record_success()
+        metrics.observe(provider.latency_metric, (time.perf_counter() - start) * 1000)
+        return result
+
+    async def generate_conversational_response(self, query: str, context: str) -> str:
+        """
+        Generate a conversational response, hedging to the secondary provider when slow.
+
+        Args:
+            query (str): User query
+            context (str): Prompt/context for the model
+
+        Returns:
+            str: Response from whichever provider answered first
+
+        Raises:
+            Exception: The last provider error when every provider failed
+        """
+        start = time.perf_counter()
+        first, backups = self._first_provider()
+        tasks = {asyncio.create_task(self._call_provider(first, query, context)): first}
+        hedge_delay = self.hedge_delay(first) if backups else None
+        last_error: Optional[BaseException] = None
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks.keys(),
+                    timeout=hedge_delay if backups else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Primary is slower than its p95: hedge to the next provider
+                    backup = self._take_allowed(backups)
+                    if backup is None:
+                        continue  # Every backup's circuit is open: keep waiting
+                    logger.info(f"Hedging LLM request to {backup.name} after {hedge_delay:.2f}s")
+                    metrics.increment("llm.router.hedged_requests")
+                    tasks[asyncio.create_task(self._call_provider(backup, query, context))] = backup
+                    continue
+
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if provider is not first:
+                            metrics.increment("llm.router.secondary_wins")
+                        metrics.observe("llm.router.latency_ms", (time.perf_counter() - start) * 1000)
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"LLM provider {provider.name} failed: {last_error}")
+
+                backup = self._take_allowed(backups) if backups and not tasks else None
+                if backup is not None:
+                    # Nothing left in flight: fail over immediately instead of waiting
+                    metrics.increment("llm.router.failovers")
+                    tasks[asyncio.create_task(self._call_provider(backup, query, context))] = backup
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        metrics.increment("llm.router.exhausted")
+        raise last_error or RuntimeError("No LLM provider available")
+
+    async def stream_conversational_response(self, query: str, context: str) -> AsyncIterator[str]:
+        """
+        Stream a conversational response, failing over if a provider errors before its first token.
+
+        Args:
+            query (str): User query
+            context (str): Prompt/context for the model
+
+        Yields:
+            str: Response text chunks
+        """
+        last_error: Optional[BaseException] = None
+        provider, backups = self._first_provider()
+        while provider is not None:
+            if last_error is not None:
+                metrics.increment("llm.router.failovers")
+            start = time.perf_counter()
+            emitted = False
+            try:
+                async for text in provider.service.stream_conversational_response(query=query, context=context):
+                    if not emitted:
+                        metrics.observe(f"llm.{provider.name}.time_to_first_token_ms", (time.perf_counter() - start) * 1000)
+                        emitted = True
+                    yield text
+            except Exception as e:
+                provider.breaker.record_failure()
+                metrics.increment(f"llm.{provider.name}.failures")
+                if emitted:
+                    raise
+                logger.warning(f"LLM provider {provider.name} failed before streaming: {e}")
+                last_error = e
+                provider = self._take_allowed(backups)
+                continue
+            except BaseException:
+                # Cancelled, or the consumer stopped reading: no outcome to record
+                provider.breaker.release_probe()
+                raise
+            provider.breaker.record_success()
+            return
+
+        raise last_error or RuntimeError("No LLM provider available")
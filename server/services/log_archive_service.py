@@ -0,0 +1,232 @@
+"""
+Content-addressed archive of the raw logs behind each analysis.
+
+Logs are split into chunks at line boundaries chosen from the content itself (a line
+whose CRC hits a target pattern ends a chunk), so overlapping or re-sent windows produce
+the same chunks wherever the shared lines sit. Each chunk is compressed, encrypted with
+the user's key and stored once per user, addressed by its SHA-256:
+
+- log_archive          one manifest per (user, logs_hash): ordered chunk hashes, reference count
+- log_archive_chunks   one document per (user, chunk_hash): encrypted envelope, reference count
+
+Archiving logs that are already archived only bumps a reference count, so duplicate
+uploads cost no extra storage. Analyses reference their logs by `logs_hash`.
+
+A new manifest takes its chunk references (upserting chunk documents it is the first
+to need) before the manifest itself is written, so a chunk can never be deleted while a
+manifest that lists it exists; concurrent releases only delete chunks at zero references.
+"""
+
+import asyncio
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from db import database
+from services.encryption_service import encryption_service
+from core import Config, logger, metrics
+
+# Cut after a line when this many low CRC bits are zero: 1 line in 2**CUT_BITS on average
+CUT_BITS = 6
+CUT_MASK = (1 << CUT_BITS) - 1
+
+
+def chunk_logs(logs: bytes, target_size: int = Config.LOG_ARCHIVE_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Split logs into content-defined chunks of roughly `target_size` bytes at line boundaries.
+
+    Chunks are at least target_size / 4 and at most target_size * 4 bytes (a single longer
+    line becomes its own chunk). Concatenating the chunks gives back the input.
+    """
+    min_size, max_size = target_size // 4, target_size * 4
+    start = position = 0
+    length = len(logs)
+    while position < length:
+        end = logs.find(b"\n", position)
+        end = length if end == -1 else end + 1
+        size = end - start
+        if size >= max_size or (size >= min_size and zlib.crc32(logs[position:end]) & CUT_MASK == 0):
+            yield logs[start:end]
+            start = end
+        position = end
+    if start < length:
+        yield logs[start:]
+
+
+def _manifest_id(user_id: str, logs_hash: str) -> str:
+    return f"{user_id}:{logs_hash}"
+
+
+def _chunk_id(user_id: str, chunk_hash: str) -> str:
+    return f"{user_id}:{chunk_hash}"
+
+
+class LogArchiveService:
+    """Stores, deduplicates and restores raw logs for a user."""
+
+    def __init__(self):
+        self.manifests = database.get_collection("log_archive")
+        self.chunks = database.get_collection("log_archive_chunks")
+
+    @staticmethod
+    def hash_logs(logs: str) -> str:
+        return encryption_service.hash_data(logs)
+
+    async def archive(self, user_id: str, logs: str, hashed_password: str) -> str:
+        """
+        Archive logs for a user (or add a reference if already archived) and return their hash.
+
+        Args:
+            user_id: Owner of the logs
+            logs: Raw log text
+            hashed_password: User's key material, as for analysis results
+        """
+        logs_hash = self.hash_logs(logs)
+        manifest_id = _manifest_id(user_id, logs_hash)
+
+        existing = await self.manifests.find_one_and_update(
+            {"_id": manifest_id},
+            {"$inc": {"refs": 1}, "$set": {"last_referenced_at": datetime.utcnow()}},
+            projection={"_id": 1}
+        )
+        if existing:
+            metrics.increment("log_archive.duplicate_uploads")
+            return logs_hash
+
+        data = logs.encode("utf-8")
+        chunks: List[Tuple[str, bytes]] = [(hashlib.sha256(chunk).hexdigest(), chunk) for chunk in chunk_logs(data)]
+        unique = dict(chunks)
+
+        # Take a reference on every chunk first, creating the ones this user lacks
+        await self._bulk_upsert([
+            UpdateOne(
+                {"_id": _chunk_id(user_id, chunk_hash)},
+                {"$inc": {"refs": 1},
+                 "$setOnInsert": {"user_id": user_id, "hash": chunk_hash, "size": len(chunk)}},
+                upsert=True
+            )
+            for chunk_hash, chunk in unique.items()
+        ])
+
+        # Only encrypt and write chunks that have no data yet (just created, here or by a
+        # concurrent upload that may not finish)
+        missing = {
+            doc["hash"]: unique[doc["hash"]] async for doc in self.chunks.find(
+                {"_id": {"$in": [_chunk_id(user_id, chunk_hash) for chunk_hash in unique]},
+                 "data": {"$exists": False}},
+                {"hash": 1}
+            )
+        }
+        if missing:
+            loop = asyncio.get_running_loop()
+            sealed = await asyncio.gather(*(
+                loop.run_in_executor(None, encryption_service.encrypt_payload, chunk, hashed_password)
+                for chunk in missing.values()
+            ))
+            await self.chunks.bulk_write([
+                UpdateOne({"_id": _chunk_id(user_id, chunk_hash), "data": {"$exists": False}},
+                          {"$set": {"data": envelope}})
+                for chunk_hash, envelope in zip(missing, sealed)
+            ], ordered=False)
+            metrics.increment("log_archive.chunk_bytes_stored", sum(len(envelope) for envelope in sealed))
+
+        result = await self.manifests.update_one(
+            {"_id": manifest_id},
+            {
+                "$setOnInsert": {
+                    "user_id": user_id,
+                    "logs_hash": logs_hash,
+                    "size": len(data),
+                    "chunks": [chunk_hash for chunk_hash, _ in chunks],
+                    "created_at": datetime.utcnow()
+                },
+                "$inc": {"refs": 1},
+                "$set": {"last_referenced_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            metrics.increment("log_archive.bytes_archived", len(data))
+            logger.info(f"Archived {len(data)} bytes of logs for user {user_id} in {len(chunks)} chunks "
+                        f"({len(missing)} new)")
+        else:
+            # A concurrent upload of the same logs wrote the manifest (holding its own chunk
+            # references) first: give back the references taken above
+            await self._release_chunks(user_id, list(unique))
+            metrics.increment("log_archive.duplicate_uploads")
+        return logs_hash
+
+    async def _bulk_upsert(self, operations: List[UpdateOne]) -> None:
+        """Run upserts, retrying those that lost a concurrent insert race (duplicate key)."""
+        try:
+            await self.chunks.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            # The document exists now, so the retried update applies to it
+            await self.chunks.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+
+    async def _release_chunks(self, user_id: str, chunk_hashes: List[str]) -> None:
+        chunk_ids = [_chunk_id(user_id, chunk_hash) for chunk_hash in set(chunk_hashes)]
+        if chunk_ids:
+            await self.chunks.update_many({"_id": {"$in": chunk_ids}}, {"$inc": {"refs": -1}})
+            await self.chunks.delete_many({"_id": {"$in": chunk_ids}, "refs": {"$lte": 0}})
+
+    async def restore(self, user_id: str, logs_hash: str, hashed_password: str) -> Optional[str]:
+        """Reassemble and decrypt archived logs; None if they are not archived."""
+        manifest = await self.manifests.find_one(
+            {"_id": _manifest_id(user_id, logs_hash)}, {"chunks": 1}
+        )
+        if not manifest:
+            return None
+
+        docs = {
+            doc["hash"]: doc["data"] async for doc in self.chunks.find(
+                {"_id": {"$in": [_chunk_id(user_id, chunk_hash) for chunk_hash in set(manifest["chunks"])]},
+                 "data": {"$exists": True}},
+                {"hash": 1, "data": 1}
+            )
+        }
+        missing = [chunk_hash for chunk_hash in manifest["chunks"] if chunk_hash not in docs]
+        if missing:
+            logger.error(f"Log archive {logs_hash} for user {user_id} is missing {len(missing)} chunks")
+            return None
+
+        loop = asyncio.get_running_loop()
+        plaintexts = dict(zip(docs, await asyncio.gather(*(
+            loop.run_in_executor(None, encryption_service.decrypt_payload, envelope, hashed_password)
+            for envelope in docs.values()
+        ))))
+        logs = b"".join(plaintexts[chunk_hash] for chunk_hash in manifest["chunks"])
+        if hashlib.sha256(logs).hexdigest() != logs_hash:
+            logger.error(f"Log archive {logs_hash} for user {user_id} failed its integrity check")
+            return None
+        return logs.decode("utf-8")
+
+    async def release(self, user_id: str, logs_hash: str) -> None:
+        """Drop one reference to archived logs, deleting the manifest and unshared chunks at zero."""
+        manifest_id = _manifest_id(user_id, logs_hash)
+        manifest = await self.manifests.find_one_and_update(
+            {"_id": manifest_id}, {"$inc": {"refs": -1}}, projection={"refs": 1, "chunks": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not manifest or manifest.get("refs", 0) > 0:
+            return
+        deleted = await self.manifests.delete_one({"_id": manifest_id, "refs": {"$lte": 0}})
+        if deleted.deleted_count:
+            await self._release_chunks(user_id, manifest.get("chunks", []))
+
+    async def release_many(self, references: List[Dict[str, Any]]) -> None:
+        """release() for every document carrying a user_id and logs_hash; failures are logged."""
+        for reference in references:
+            if not reference.get("logs_hash"):
+                continue
+            try:
+                await self.release(reference["user_id"], reference["logs_hash"])
+            except Exception as e:
+                logger.warning(f"Failed to release archived logs {reference['logs_hash']}: {e}")
+
+log_archive_service = LogArchiveService()
@@ -0,0 +1,296 @@
+"""
+Streaming analysis of large uploaded log files.
+
+Uploads are spooled to a temporary file on disk as they arrive (raw or gzip-compressed,
+in a multipart form or as the request body), counting bytes as they come in so neither
+form can exceed UPLOAD_MAX_BYTES on disk, then read back line by line: each line is
+scored by the pre-RAG threat filter and threat lines are packed, in order, into analysis
+chunks of at most UPLOAD_CHUNK_CHARS characters. Memory use is bounded by the chunk size
+and the classifier batch, not by the size of the file.
+
+At most UPLOAD_MAX_CHUNKS chunks are analyzed per upload; reading stops there, so the
+line counts of a truncated upload are lower bounds. If no line is classified as a
+threat, a single chunk of the most suspicious lines seen is analyzed instead. Without a
+threat model every line counts as a threat (and is analyzed, up to the chunk limit).
+
+At most UPLOAD_MAX_CONCURRENT uploads (UPLOAD_USER_MAX_CONCURRENT per user) are spooled
+and analyzed at once, which bounds the spool disk space in use.
+"""
+
+import gzip
+import heapq
+import io
+import tempfile
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from python_multipart.multipart import MultipartParser, parse_options_header
+from core import Config, metrics
+from services.prerag_filter_service import prerag_filter_service
+from services.rag_context_builder import CHARS_PER_TOKEN
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the compressed or decompressed size limit."""
+
+    def __init__(self, limit: int, what: str = "upload"):
+        super().__init__(f"The {what} exceeds the {limit:,} byte limit")
+        self.limit = limit
+
+
+class UploadBusy(Exception):
+    """Raised when too many uploads are in progress, overall or for one user."""
+
+    def __init__(self, reason: str, retry_after: int = 30):
+        super().__init__(f"Too many uploads in progress ({reason}), retry later")
+        self.retry_after = retry_after
+
+
+class UploadLimiter:
+    """Caps concurrent uploads overall and per user; excess uploads are refused, not queued."""
+
+    def __init__(self, max_concurrent: int = Config.UPLOAD_MAX_CONCURRENT,
+                 user_max_concurrent: int = Config.UPLOAD_USER_MAX_CONCURRENT):
+        self.max_concurrent = max(1, max_concurrent)
+        self.user_max_concurrent = max(1, user_max_concurrent)
+        self._in_progress: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def slot(self, user: str) -> AsyncIterator[None]:
+        """
+        Hold an upload slot for the block.
+
+        Raises:
+            UploadBusy: If the global or the user's limit is reached
+        """
+        if sum(self._in_progress.values()) >= self.max_concurrent:
+            metrics.increment("upload.refused_busy")
+            raise UploadBusy("server limit")
+        if self._in_progress.get(user, 0) >= self.user_max_concurrent:
+            metrics.increment("upload.refused_user_limit")
+            raise UploadBusy("per-user limit")
+        self._in_progress[user] = self._in_progress.get(user, 0) + 1
+        metrics.set_gauge("upload.in_progress", sum(self._in_progress.values()))
+        try:
+            yield
+        finally:
+            remaining = self._in_progress[user] - 1
+            if remaining:
+                self._in_progress[user] = remaining
+            else:
+                del self._in_progress[user]
+            metrics.set_gauge("upload.in_progress", sum(self._in_progress.values()))
+
+
+async def spool_stream(chunks: AsyncIterator[bytes], max_bytes: int = Config.UPLOAD_MAX_BYTES) -> BinaryIO:
+    """
+    Write an incoming byte stream to a temporary file (deleted when closed).
+
+    Raises:
+        UploadTooLarge: If the stream exceeds max_bytes; the partial file is discarded
+    """
+    spool = tempfile.TemporaryFile(dir=Config.UPLOAD_SPOOL_DIR or None)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def spool_multipart(chunks: AsyncIterator[bytes], content_type: str, field: str = "file",
+                          max_bytes: int = Config.UPLOAD_MAX_BYTES) -> Tuple[BinaryIO, Optional[str]]:
+    """
+    Stream a multipart form to a temporary file, keeping only the first `field` file part.
+
+    Returns:
+        (file, filename sent with the part)
+
+    Raises:
+        UploadTooLarge: If the request body exceeds max_bytes; the partial file is discarded
+        ValueError: If the form is malformed or has no `field` file part
+    """
+    _, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise ValueError("Multipart upload without a boundary")
+
+    spool = tempfile.TemporaryFile(dir=Config.UPLOAD_SPOOL_DIR or None)
+    part = {"header_field": b"", "header_value": b"", "headers": {}, "target": False}
+    found: Dict[str, Optional[str]] = {}
+
+    def on_part_begin() -> None:
+        part.update(headers={}, target=False)
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        part["header_value"] += data[start:end]
+
+    def on_header_end() -> None:
+        part["headers"][part["header_field"].lower()] = part["header_value"]
+        part.update(header_field=b"", header_value=b"")
+
+    def on_headers_finished() -> None:
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        if disposition.get(b"name") == field.encode() and b"filename" in disposition and not found:
+            part["target"] = True
+            found["filename"] = disposition[b"filename"].decode("utf-8", "replace") or None
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if part["target"]:
+            spool.write(data[start:end])
+
+    def on_part_end() -> None:
+        part["target"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished, "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            parser.write(chunk)
+        parser.finalize()
+        if not found:
+            raise ValueError(f"Multipart uploads must send the log file in a '{field}' field")
+    except BaseException:  # Parse errors are ValueErrors
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, found["filename"]
+
+
+def read_lines(spool: BinaryIO, max_bytes: int = Config.UPLOAD_MAX_DECOMPRESSED_BYTES) -> Iterator[str]:
+    """
+    Lines of a spooled upload, decompressing gzip transparently.
+
+    Raises:
+        UploadTooLarge: Once more than max_bytes of (decompressed) logs have been read
+    """
+    spool.seek(0)
+    raw = gzip.GzipFile(fileobj=spool, mode="rb") if spool.read(2) == GZIP_MAGIC else spool
+    spool.seek(0)
+    text = io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline=None)
+    size = 0
+    try:
+        for line in text:
+            size += len(line)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes, "decompressed upload")
+            yield line.rstrip("\n")
+    except (OSError, EOFError, zlib.error) as e:
+        raise ValueError(f"Upload is not valid gzip: {e}")
+    finally:
+        text.detach()
+
+
+class UploadChunker:
+    """Turns the lines of an upload into threat-only analysis chunks, one chunk at a time."""
+
+    def __init__(self, lines: Iterator[str],
+                 chunk_chars: int = Config.UPLOAD_CHUNK_CHARS,
+                 max_chunks: int = Config.UPLOAD_MAX_CHUNKS):
+        self._scored = prerag_filter_service.score_lines(lines)
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
+        self.lines_total = 0
+        self.lines_analyzed = 0
+        self.chars_total = 0
+        self.chars_analyzed = 0
+        self.threat_lines = 0
+        self.chunks = 0
+        self.truncated = False  # Input left unread at the chunk limit
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        # Most suspicious lines so far, as a min-heap of (probability, line number, line)
+        self._suspicious: List[Tuple[float, int, str]] = []
+        self._suspicious_chars = 0
+        self._done = False
+
+    @property
+    def tokens_dropped(self) -> int:
+        """Estimated prompt tokens saved by not sending the unanalyzed lines."""
+        return max(0, self.chars_total - self.chars_analyzed) // CHARS_PER_TOKEN
+
+    def _remember_suspicious(self, probability: float, line: str) -> None:
+        if self.threat_lines:
+            return  # Only needed while no threat line has been seen
+        heapq.heappush(self._suspicious, (probability, self.lines_total, line))
+        self._suspicious_chars += len(line) + 1
+        while self._suspicious_chars > self.chunk_chars:
+            _, _, dropped = heapq.heappop(self._suspicious)
+            self._suspicious_chars -= len(dropped) + 1
+
+    def _emit(self, lines: List[str]) -> str:
+        chunk = "\n".join(lines)
+        self.chunks += 1
+        self.lines_analyzed += len(lines)
+        self.chars_analyzed += len(chunk)
+        metrics.increment("upload.chunks_analyzed")
+        return chunk
+
+    def abandon(self, chunk: str) -> None:
+        """Uncount a chunk that was not analyzed after all and stop; the upload is truncated."""
+        self.chunks -= 1
+        self.lines_analyzed -= chunk.count("\n") + 1
+        self.chars_analyzed -= len(chunk)
+        metrics.increment("upload.chunks_analyzed", -1)
+        self.truncated = True
+        self._done = True
+
+    def next_chunk(self) -> Optional[str]:
+        """
+        Read on until the next chunk is full and return it; None when the upload is done.
+
+        Blocking (file reads and classification): run it in a worker thread.
+        """
+        if self._done:
+            return None
+        if self.chunks >= self.max_chunks:
+            # Stop reading at the limit: a full chunk leaves its overflow line pending
+            self.truncated = bool(self._pending) or next(self._scored, None) is not None
+            return self._finish(None)
+        for line, probability, is_threat in self._scored:
+            self.lines_total += 1
+            self.chars_total += len(line) + 1
+            if not is_threat:
+                self._remember_suspicious(probability, line)
+                continue
+            self.threat_lines += 1
+            self._suspicious = []
+            line = line[:self.chunk_chars]
+            if self._pending and self._pending_chars + len(line) + 1 > self.chunk_chars:
+                chunk, self._pending, self._pending_chars = self._pending, [line], len(line) + 1
+                return self._emit(chunk)
+            self._pending.append(line)
+            self._pending_chars += len(line) + 1
+
+        if self._pending:
+            return self._finish(self._emit(self._pending))
+        if not self.threat_lines and self._suspicious:
+            # Nothing reached the threat threshold: analyze the most suspicious lines in order
+            return self._finish(self._emit([line for _, _, line in sorted(self._suspicious, key=lambda item: item[1])]))
+        return self._finish(None)
+
+    def _finish(self, chunk: Optional[str]) -> Optional[str]:
+        self._done = True
+        metrics.increment("upload.lines_read", self.lines_total)
+        return chunk
+
+upload_limiter = UploadLimiter()
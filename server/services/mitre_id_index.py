@@ -0,0 +1,145 @@
+"""
+Near-miss lookup index for MITRE ATT&CK technique IDs.
+
+Replaces a SequenceMatcher scan over the whole catalog with a subsequence
+(deletion-neighbourhood) index. SequenceMatcher's matched characters form a common
+subsequence, so ratio > 70% implies LCS(a, b) > 0.35 * (len(a) + len(b)). The index
+maps every long-enough subsequence of each catalog ID to that ID; a query only has
+to enumerate its own subsequences of the required length to find every candidate,
+and only those candidates are scored with SequenceMatcher, best upper bound first.
+Results are identical to the full scan.
+"""
+
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# IDs longer than this (never seen in ATT&CK) are scored directly instead of indexed
+MAX_INDEXED_ID_LENGTH = 12
+
+
+def _min_common_length(query_length: int, id_length: int) -> int:
+    """Smallest LCS length that can still give a similarity ratio above 70%."""
+    # ratio > 0.7 requires LCS > 0.35 * (la + lb) = 7 * (la + lb) / 20
+    return (7 * (query_length + id_length)) // 20 + 1
+
+
+class SimilarIds(NamedTuple):
+    """IDs similar to a query: the best matches and the first match in catalog order."""
+    top_matches: Tuple[Tuple[str, float], ...]
+    first_match: Optional[Tuple[str, float]]
+
+
+def _subsequences(text: str, length: int) -> Set[str]:
+    return {''.join(chars) for chars in combinations(text, length)}
+
+
+class TechniqueIdIndex:
+    """Index of technique IDs answering 'which IDs are > 70% similar to this one?'.
+
+    `find_similar(technique_id)` returns the `top_k` (id, similarity) pairs above the
+    threshold, best first with ties in catalog order, plus the first match in catalog
+    order. Results are memoized; the index itself is built on the first miss.
+    """
+
+    def __init__(self, technique_ids: Iterable[str], similarity_threshold: float = 70.0, top_k: int = 3, cache_size: int = 4096):
+        self.ids: List[str] = list(technique_ids)
+        self.similarity_threshold = similarity_threshold
+        self.top_k = top_k
+        self._lowered = [tech_id.lower() for tech_id in self.ids]
+        self._index: Dict[str, List[int]] = {}
+        self._lengths: Set[int] = set()
+        self._unindexed: List[int] = []
+        self._matchers: List[SequenceMatcher] = []
+        self._built = False
+        self.find_similar = lru_cache(maxsize=cache_size)(self._find_similar)
+
+    def _min_indexed_length(self, id_length: int) -> int:
+        """Shortest subsequence of an ID of this length that any query could need."""
+        lengths = [
+            _min_common_length(query_length, id_length)
+            for query_length in range(1, 3 * id_length + 1)
+        ]
+        feasible = [
+            length for query_length, length in enumerate(lengths, start=1)
+            if length <= min(query_length, id_length)
+        ]
+        return min(feasible) if feasible else id_length + 1
+
+    def _build(self) -> None:
+        # One matcher per ID with the ID as seq2, exactly as the full scan compared them;
+        # SequenceMatcher caches its seq2 lookup tables, so queries only swap seq1.
+        self._matchers = [SequenceMatcher(None, '', tech_id) for tech_id in self._lowered]
+        min_lengths: Dict[int, int] = {}
+        for position, tech_id in enumerate(self._lowered):
+            id_length = len(tech_id)
+            if id_length > MAX_INDEXED_ID_LENGTH:
+                self._unindexed.append(position)
+                continue
+            self._lengths.add(id_length)
+            if id_length not in min_lengths:
+                min_lengths[id_length] = self._min_indexed_length(id_length)
+            for length in range(min_lengths[id_length], id_length + 1):
+                for subsequence in _subsequences(tech_id, length):
+                    self._index.setdefault(subsequence, []).append(position)
+        self._built = True
+
+    def _candidates(self, query: str) -> Set[int]:
+        candidates: Set[int] = set(self._unindexed)
+        query_length = len(query)
+        for id_length in self._lengths:
+            length = _min_common_length(query_length, id_length)
+            if length > min(query_length, id_length):
+                continue  # No ID of this length can reach the threshold
+            for subsequence in _subsequences(query, length):
+                candidates.update(self._index.get(subsequence, ()))
+        return candidates
+
+    def _find_similar(self, technique_id: str) -> SimilarIds:
+        if not self._built:
+            self._build()
+
+        query = technique_id.lower()
+        bounded = []
+        for position in sorted(self._candidates(query)):
+            matcher = self._matchers[position]
+            matcher.set_seq1(query)
+            # quick_ratio() is an upper bound on ratio(), so this skip never drops a match
+            bound = matcher.quick_ratio() * 100
+            if bound > self.similarity_threshold:
+                bounded.append((position, bound))
+
+        scores: Dict[int, float] = {}
+
+        def score(position: int) -> float:
+            if position not in scores:
+                matcher = self._matchers[position]
+                matcher.set_seq1(query)
+                scores[position] = matcher.ratio() * 100
+            return scores[position]
+
+        # First match in catalog order
+        first_match = None
+        for position, _ in bounded:
+            if score(position) > self.similarity_threshold:
+                first_match = (self.ids[position], scores[position])
+                break
+
+        # Top matches: visit candidates by descending upper bound and stop once no
+        # remaining bound can beat the current last place (ties keep catalog order).
+        top: List[Tuple[float, int]] = []
+        for position, bound in sorted(bounded, key=lambda item: (-item[1], item[0])):
+            if len(top) == self.top_k and bound < -top[-1][0]:
+                break
+            similarity = score(position)
+            if similarity <= self.similarity_threshold:
+                continue
+            top.append((-similarity, position))
+            top.sort()
+            del top[self.top_k:]
+
+        return SimilarIds(
+            top_matches=tuple((self.ids[position], -negative) for negative, position in top),
+            first_match=first_match
+        )
@@ -3,12 +3,16 @@ MITRE ATT&CK Validation Service
 Validates LLM responses against the actual MITRE ATT&CK framework to prevent hallucination
 """
 
-import json
 import re
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from difflib import SequenceMatcher
-from core import logger, Config
+from core import logger, metrics
+from services.attack_catalog import attack_catalog
+from services.mitre_id_index import TechniqueIdIndex
+from services.technique_suggestion_index import TechniqueSuggestionIndex
 
 @dataclass
 class ValidationResult:
@@ -39,59 +43,42 @@ def partial_ratio(a: str, b: str) -> float:
 class MitreValidationService:
     """Service to validate MITRE ATT&CK technique data against the official framework"""
     
+    # Bounded LRU memo of validation results per (id, name, platforms, tactics) tuple
+    VALIDATION_CACHE_SIZE = 2048
+    
     def __init__(self):
+        self._validation_cache: "OrderedDict[Tuple, ValidationResult]" = OrderedDict()
+        self._validation_cache_lock = threading.Lock()
+        self._validation_cache_hits = 0
+        self._validation_cache_misses = 0
+        self._catalog_version = 0
         self.mitre_data = {}
         self.technique_mapping = {}
         self.valid_platforms = set()
         self.valid_tactics = set()
+        self.id_index = TechniqueIdIndex([])
+        self.suggestion_index = TechniqueSuggestionIndex([])
         self._load_mitre_data()
         logger.info("MITRE validation service initialized")
     
     def _load_mitre_data(self):
-        """Load and index MITRE ATT&CK data for validation"""
+        """Index MITRE ATT&CK data from the shared catalog for validation"""
         try:
-            with open(Config.ATTACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                stix_data = json.load(f)
+            # Techniques by ID, IDs by lowercased name, and the known platforms and tactics
+            self.mitre_data = attack_catalog.by_id
+            self.technique_mapping = attack_catalog.by_name
+            self.valid_platforms = attack_catalog.platforms
+            self.valid_tactics = attack_catalog.tactics
             
-            attack_patterns = 0
-            techniques_loaded = 0
+            # Near-miss index over technique IDs for fuzzy ID validation
+            self.id_index = TechniqueIdIndex(self.mitre_data.keys())
             
-            # Index techniques by ID and name
-            for obj in stix_data.get('objects', []):
-                if obj.get('type') == 'attack-pattern':
-                    attack_patterns += 1
-                    # Get technique ID from external references
-                    tech_id = None
-                    for ref in obj.get('external_references', []):
-                        if ref.get('source_name') == 'mitre-attack':
-                            tech_id = ref.get('external_id')
-                            break
-                    
-                    if tech_id:
-                        techniques_loaded += 1
-                        technique_data = {
-                            'id': tech_id,
-                            'name': obj.get('name', ''),
-                            'description': obj.get('description', ''),
-                            'kill_chain_phases': [phase.get('phase_name', '') for phase in obj.get('kill_chain_phases', [])],
-                            'platforms': obj.get('x_mitre_platforms', []),
-                            'data_sources': obj.get('x_mitre_data_sources', []),
-                            'created': obj.get('created', ''),
-                            'modified': obj.get('modified', ''),
-                            'aliases': obj.get('aliases', [])
-                        }
-                        
-                        # Index by technique ID
-                        self.mitre_data[tech_id] = technique_data
-                        
-                        # Index by name for fuzzy matching
-                        self.technique_mapping[obj.get('name', '').lower()] = tech_id
-                        
-                        # Collect valid platforms and tactics
-                        self.valid_platforms.update(technique_data['platforms'])
-                        self.valid_tactics.update(technique_data['kill_chain_phases'])
+            # Trigram index over names and descriptions for technique suggestions
+            self.suggestion_index = TechniqueSuggestionIndex(
+                (tech_id, technique.name, technique.description) for tech_id, technique in self.mitre_data.items()
+            )
             
-            logger.info(f"Found {attack_patterns} attack patterns, loaded {techniques_loaded} techniques for validation")
+            logger.info(f"Found {len(attack_catalog.techniques)} attack patterns, loaded {len(self.mitre_data)} techniques for validation")
             logger.info(f"Valid platforms: {len(self.valid_platforms)}")
             logger.info(f"Valid tactics: {len(self.valid_tactics)}")
             
@@ -99,6 +86,10 @@ class MitreValidationService:
             sample_ids = list(self.mitre_data.keys())[:5]
             logger.info(f"Sample technique IDs: {sample_ids}")
             
+            # Memoized results were computed against the previous catalog
+            self._catalog_version = attack_catalog.version
+            self.clear_validation_cache()
+            
         except Exception as e:
             logger.error(f"Error loading MITRE data for validation: {e}")
             import traceback
@@ -135,18 +126,13 @@ class MitreValidationService:
             details['exists_in_framework'] = True
             return True, 1.0, details
         
-        # Find similar technique IDs
-        similar_ids = []
-        for valid_id in self.mitre_data.keys():
-            similarity = similarity_ratio(normalized_id, valid_id)
-            if similarity > 70:  # 70% similarity threshold
-                similar_ids.append((valid_id, similarity))
-        
-        details['similar_ids'] = sorted(similar_ids, key=lambda x: x[1], reverse=True)[:3]
+        # Find similar technique IDs (> 70% similarity) via the index
+        similar = self.id_index.find_similar(normalized_id)
+        details['similar_ids'] = list(similar.top_matches)
         
         # If we have high similarity matches, consider it partially valid
-        if similar_ids and similar_ids[0][1] > 85:
-            return True, similar_ids[0][1] / 100, details
+        if similar.first_match and similar.first_match[1] > 85:
+            return True, similar.first_match[1] / 100, details
         
         return False, 0.0, details
     
@@ -164,7 +150,7 @@ class MitreValidationService:
         }
         
         if normalized_id in self.mitre_data:
-            official_name = self.mitre_data[normalized_id]['name']
+            official_name = self.mitre_data[normalized_id].name
             details['official_name'] = official_name
             
             # Calculate name similarity
@@ -194,8 +180,8 @@ class MitreValidationService:
         }
         
         if normalized_id in self.mitre_data:
-            official_platforms = self.mitre_data[normalized_id]['platforms']
-            details['official_platforms'] = official_platforms
+            official_platforms = self.mitre_data[normalized_id].platforms
+            details['official_platforms'] = list(official_platforms)
             
             for platform in platforms:
                 if platform in official_platforms:
@@ -229,8 +215,8 @@ class MitreValidationService:
         }
         
         if normalized_id in self.mitre_data:
-            official_tactics = self.mitre_data[normalized_id]['kill_chain_phases']
-            details['official_tactics'] = official_tactics
+            official_tactics = self.mitre_data[normalized_id].kill_chain_phases
+            details['official_tactics'] = list(official_tactics)
             
             for tactic in tactics:
                 if tactic in official_tactics:
@@ -248,16 +234,81 @@ class MitreValidationService:
         
         return False, 0.0, details
     
+    @staticmethod
+    def _validation_cache_key(technique_data: Dict[str, Any]) -> Tuple:
+        """Everything validation depends on, with lists turned into hashable tuples"""
+        return (
+            technique_data.get('technique_id', '') or '',
+            technique_data.get('name', '') or '',
+            tuple(technique_data.get('platforms', []) or ()),
+            tuple(technique_data.get('kill_chain_phases', []) or ())
+        )
+    
+    def clear_validation_cache(self):
+        """Drop all memoized validation results"""
+        with self._validation_cache_lock:
+            self._validation_cache.clear()
+        metrics.set_gauge("mitre_validation.cache_size", 0)
+    
+    def get_validation_cache_stats(self) -> Dict[str, Any]:
+        """Size and hit rate of the validation result memo"""
+        hits, misses = self._validation_cache_hits, self._validation_cache_misses
+        return {
+            'size': len(self._validation_cache),
+            'max_size': self.VALIDATION_CACHE_SIZE,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0
+        }
+    
     def validate_technique(self, technique_data: Dict[str, Any]) -> ValidationResult:
         """
         Comprehensive validation of a single MITRE technique
         
+        Results are memoized per (technique_id, name, platforms, kill_chain_phases); only
+        the relevance score in corrected data differs between calls for the same tuple.
+        Cached results are shared, so treat their details as read-only.
+        
         Args:
             technique_data: Dictionary containing technique information
             
         Returns:
             ValidationResult with validation details and corrections
         """
+        if attack_catalog.version != self._catalog_version:
+            # The shared catalog was reloaded: re-index it (this also clears the memo)
+            self._load_mitre_data()
+        
+        key = self._validation_cache_key(technique_data)
+        with self._validation_cache_lock:
+            result = self._validation_cache.get(key)
+            if result is not None:
+                self._validation_cache.move_to_end(key)
+                self._validation_cache_hits += 1
+            else:
+                self._validation_cache_misses += 1
+        
+        if result is None:
+            metrics.increment("mitre_validation.cache_misses")
+            result = self._validate_technique_uncached(technique_data)
+            with self._validation_cache_lock:
+                self._validation_cache[key] = result
+                if len(self._validation_cache) > self.VALIDATION_CACHE_SIZE:
+                    self._validation_cache.popitem(last=False)
+                size = len(self._validation_cache)
+            metrics.set_gauge("mitre_validation.cache_size", size)
+            return result
+        
+        metrics.increment("mitre_validation.cache_hits")
+        if result.corrected_data is None:
+            return result
+        return replace(result, corrected_data={
+            **result.corrected_data,
+            'relevance_score': technique_data.get('relevance_score', 0.0)
+        })
+    
+    def _validate_technique_uncached(self, technique_data: Dict[str, Any]) -> ValidationResult:
+        """Validate a single technique against the framework (see validate_technique)"""
         technique_id = technique_data.get('technique_id', '')
         name = technique_data.get('name', '')
         platforms = technique_data.get('platforms', [])
@@ -337,10 +388,10 @@ class MitreValidationService:
             official_data = self.mitre_data[normalized_id]
             corrected_data = {
                 'technique_id': normalized_id,
-                'name': official_data['name'],
-                'description': official_data['description'],
-                'platforms': official_data['platforms'],
-                'kill_chain_phases': official_data['kill_chain_phases'],
+                'name': official_data.name,
+                'description': official_data.description,
+                'platforms': list(official_data.platforms),
+                'kill_chain_phases': list(official_data.kill_chain_phases),
                 'relevance_score': technique_data.get('relevance_score', 0.0)
             }
         
@@ -396,27 +447,19 @@ class MitreValidationService:
         """Get technique suggestions based on query for LLM guidance"""
         suggestions = []
         
-        query_lower = query.lower()
-        for tech_id, data in self.mitre_data.items():
-            # Calculate relevance based on name and description
-            name_similarity = partial_ratio(query_lower, data['name'].lower())
-            desc_similarity = partial_ratio(query_lower, data['description'].lower())
-            
-            relevance = max(name_similarity, desc_similarity * 0.8)
-            
-            if relevance > 60:  # 60% relevance threshold
-                suggestions.append({
-                    'technique_id': tech_id,
-                    'name': data['name'],
-                    'description': data['description'][:200] + '...' if len(data['description']) > 200 else data['description'],
-                    'relevance': relevance,
-                    'platforms': data['platforms'],
-                    'tactics': data['kill_chain_phases']
-                })
-        
-        # Sort by relevance and return top results
-        suggestions.sort(key=lambda x: x['relevance'], reverse=True)
-        return suggestions[:limit]
+        # Relevance is max(name similarity, description similarity * 0.8), scored on indexed candidates
+        for tech_id, relevance in self.suggestion_index.search(query, limit=limit, threshold=60):
+            technique = self.mitre_data[tech_id]
+            suggestions.append({
+                'technique_id': tech_id,
+                'name': technique.name,
+                'description': technique.description[:200] + '...' if len(technique.description) > 200 else technique.description,
+                'relevance': relevance,
+                'platforms': list(technique.platforms),
+                'tactics': list(technique.kill_chain_phases)
+            })
+        
+        return suggestions
 
 # Global service instance
 mitre_validation_service = MitreValidationService()
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Server-side pre-RAG filtering of submitted logs.
+
+The CLI drops benign lines with its threat classifier before sending logs; logs from the
+dashboard or other clients arrive unfiltered, and their noise costs prompt tokens and
+LLM latency. This service loads the same joblib threat model (a fitted vectorizer,
+classifier and `optimal_threshold`) once at startup and, for logs longer than
+PRERAG_MIN_CHARS, classifies their lines in batches and keeps the threat lines, in their
+original order, within PRERAG_CHAR_BUDGET characters (the most likely threats first when
+they do not all fit). If no line reaches the threshold, the most suspicious lines are
+kept instead, so the summary always has something to work with.
+
+joblib and scikit-learn are optional: without them, or without a model file, filtering
+is disabled and logs pass through unchanged.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from core import Config, logger, metrics
+from services.rag_context_builder import estimate_tokens
+
+# Searched in order when PRERAG_MODEL_PATH is not set
+MODEL_DIRS = [
+    Path(__file__).resolve().parent.parent / "models",
+    Path(__file__).resolve().parent.parent.parent / "aiagent" / "Scripts" / "models",
+]
+CLASSIFY_BATCH_SIZE = 512
+
+
+@dataclass
+class PreRAGFilterResult:
+    """Filtered logs and what filtering removed."""
+    logs: str
+    lines_total: int
+    lines_kept: int
+    chars_dropped: int
+    tokens_dropped: int
+
+    @property
+    def lines_dropped(self) -> int:
+        return self.lines_total - self.lines_kept
+
+    def report(self) -> dict:
+        return {
+            "lines_total": self.lines_total,
+            "lines_kept": self.lines_kept,
+            "lines_dropped": self.lines_dropped,
+            "chars_dropped": self.chars_dropped,
+            "tokens_dropped": self.tokens_dropped
+        }
+
+
+def select_lines(lines: Sequence[str], probabilities: Sequence[float],
+                 threshold: float, char_budget: int) -> List[int]:
+    """
+    Indices of the lines to keep, in original order.
+
+    Threat lines (probability >= threshold) are kept most likely first until the budget
+    is spent; with no threat lines, the most suspicious lines are kept instead.
+    """
+    candidates = [i for i, p in enumerate(probabilities) if p >= threshold] or range(len(lines))
+    kept = []
+    used = 0
+    for i in sorted(candidates, key=lambda i: probabilities[i], reverse=True):
+        size = len(lines[i]) + 1
+        if used + size > char_budget:
+            continue
+        kept.append(i)
+        used += size
+    return sorted(kept)
+
+
+class PreRAGFilterService:
+    """Threat-line filter in front of the LLM, backed by the CLI's joblib model."""
+
+    def __init__(self,
+                 enabled: bool = Config.PRERAG_FILTER_ENABLED,
+                 model_path: str = Config.PRERAG_MODEL_PATH,
+                 char_budget: int = Config.PRERAG_CHAR_BUDGET,
+                 min_chars: int = Config.PRERAG_MIN_CHARS):
+        self.enabled = enabled
+        self.model_path = model_path
+        self.char_budget = char_budget
+        self.min_chars = min_chars
+        self.model: Any = None
+        self.vectorizer: Any = None
+        self.threshold = 0.5
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None
+
+    def _find_model(self) -> Optional[Path]:
+        if self.model_path:
+            return Path(self.model_path)
+        for models_dir in MODEL_DIRS:
+            if models_dir.is_dir():
+                model_files = sorted(models_dir.glob("*threat_model*.joblib"), key=lambda p: p.stat().st_mtime)
+                if model_files:
+                    return model_files[-1]
+        return None
+
+    def _load_sync(self) -> None:
+        try:
+            import joblib
+        except ImportError:
+            logger.warning("Pre-RAG filtering disabled: joblib is not installed")
+            return
+        path = self._find_model()
+        if path is None or not path.is_file():
+            logger.warning(f"Pre-RAG filtering disabled: no threat model found ({path or 'searched ' + ', '.join(map(str, MODEL_DIRS))})")
+            return
+        try:
+            model_data = joblib.load(path)
+            self.model = model_data["model"]
+            self.vectorizer = model_data["vectorizer"]
+            self.threshold = float(model_data.get("optimal_threshold", 0.5))
+            logger.info(f"Pre-RAG threat model loaded from {path.name} (threshold {self.threshold:.3f})")
+        except Exception as e:
+            self.model = self.vectorizer = None
+            logger.warning(f"Pre-RAG filtering disabled: could not load {path}: {e}")
+
+    async def load(self) -> None:
+        """Load the threat model once (call at startup); a no-op when disabled."""
+        if self.enabled and self.model is None:
+            await asyncio.to_thread(self._load_sync)
+
+    def classify(self, lines: Sequence[str]) -> List[float]:
+        """Threat probability of each line, classified in batches."""
+        probabilities: List[float] = []
+        for start in range(0, len(lines), CLASSIFY_BATCH_SIZE):
+            features = self.vectorizer.transform(lines[start:start + CLASSIFY_BATCH_SIZE])
+            probabilities.extend(float(p) for p in self.model.predict_proba(features.toarray())[:, 1])
+        return probabilities
+
+    def score_lines(self, lines: Iterable[str]) -> Iterator[Tuple[str, float, bool]]:
+        """
+        Stream (line, threat probability, is_threat) for the non-empty lines, classifying
+        them in batches as they arrive. Without a model every line counts as a threat.
+        """
+        batch: List[str] = []
+        for line in lines:
+            if not line.strip():
+                continue
+            batch.append(line)
+            if len(batch) == CLASSIFY_BATCH_SIZE:
+                yield from self._score_batch(batch)
+                batch = []
+        if batch:
+            yield from self._score_batch(batch)
+
+    def _score_batch(self, batch: List[str]) -> Iterator[Tuple[str, float, bool]]:
+        if not self.available:
+            for line in batch:
+                yield line, 1.0, True
+            return
+        for line, probability in zip(batch, self.classify(batch)):
+            yield line, probability, probability >= self.threshold
+
+    def _filter_sync(self, logs: str) -> PreRAGFilterResult:
+        started_at = time.perf_counter()
+        lines = [line for line in logs.splitlines() if line.strip()]
+        kept = select_lines(lines, self.classify(lines), self.threshold, self.char_budget)
+        filtered = "\n".join(lines[i] for i in kept)
+        result = PreRAGFilterResult(
+            logs=filtered,
+            lines_total=len(lines),
+            lines_kept=len(kept),
+            chars_dropped=len(logs) - len(filtered),
+            tokens_dropped=max(0, estimate_tokens(logs) - estimate_tokens(filtered))
+        )
+        metrics.observe("prerag.filter_ms", (time.perf_counter() - started_at) * 1000)
+        metrics.increment("prerag.lines_dropped", result.lines_dropped)
+        metrics.increment("prerag.tokens_dropped", result.tokens_dropped)
+        return result
+
+    async def filter_logs(self, logs: str) -> Tuple[str, Optional[PreRAGFilterResult]]:
+        """
+        Filter logs before summarization.
+
+        Returns:
+            (logs to analyze, filter result); the result is None when the logs were passed
+            through unchanged (filtering disabled, model unavailable or logs short enough)
+        """
+        if not self.available or len(logs) <= self.min_chars:
+            return logs, None
+        try:
+            result = await asyncio.to_thread(self._filter_sync, logs)
+        except Exception as e:
+            metrics.increment("prerag.failures")
+            logger.warning(f"Pre-RAG filtering failed, analyzing unfiltered logs: {e}")
+            return logs, None
+        logger.info(f"Pre-RAG filter kept {result.lines_kept}/{result.lines_total} lines, "
+                    f"dropping ~{result.tokens_dropped} tokens")
+        return result.logs, result
+
+prerag_filter_service = PreRAGFilterService()
@@ -0,0 +1,269 @@
+"""
+Token-budgeted prompt builder for MITRE ATT&CK RAG queries.
+
+Ranks retrieved techniques by relevance, removes text that repeats across techniques,
+trims descriptions so the whole prompt fits a token budget, and reports the realized
+prompt size.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from core import Config, logger
+
+# Rough chars-per-token ratio for English prose with Gemini/Titan tokenizers
+CHARS_PER_TOKEN = 4
+MAX_CONTEXT_TECHNIQUES = 5
+MIN_DESCRIPTION_CHARS = 80  # Below this a trimmed description stops being useful
+# The fixed instructions and schema take ~750 tokens; smaller budgets are raised to this
+MIN_TOKEN_BUDGET = 1000
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE = re.compile(r'\s+')
+_CITATION = re.compile(r'\(Citation:[^)]*\)')
+
+_SCHEMA_INSTRUCTIONS = (
+    "Return a single, valid JSON object ONLY (no leading/trailing text, no markdown).\n"
+    "Schema (keys and types):\n"
+    "{\n"
+    "  \"version\": string,                    // prompt schema version, e.g. \"1.0\"\n"
+    "  \"answer\": string,                     // concise human-friendly answer (<= 400 words)\n"
+    "  \"summary\": string,                    // 2-3 sentence technical summary\n"
+    "  \"top_findings\": [                     // prioritized findings\n"
+    "    {\n"
+    "      \"technique_id\": string,\n"
+    "      \"name\": string,\n"
+    "      \"relevance_score\": number,\n"
+    "      \"impact\": string,                // Low/Medium/High\n"
+    "      \"recommended_detections\": [string],\n"
+    "      \"recommended_mitigations\": [string]\n"
+    "    }\n"
+    "  ],\n"
+    "  \"detection_queries\": [                 // actionable SIEM/search snippets\n"
+    "    { \"name\": string, \"query\": string, \"log_source\": string, \"priority\": string, \"confidence\": number }\n"
+    "  ],\n"
+    "  \"recommendations\": [string],\n"
+    "  \"references\": [{ \"technique_id\": string, \"url\": string }],\n"
+    "  \"follow_up_questions\": [string],\n"
+    "  \"evidence\": [string],                 // short snippets or doc refs used to justify findings\n"
+    "  \"confidence\": number                  // 0.0 - 1.0\n"
+    "}\n"
+)
+
+_EXAMPLE_OUTPUT = (
+    "Example JSON (must follow schema exactly):\n"
+    "{\n"
+    "  \"version\": \"1.0\",\n"
+    "  \"answer\": \"Short, clear answer focusing on practical steps.\",\n"
+    "  \"summary\": \"Two to three sentence summary.\",\n"
+    "  \"top_findings\": [\n"
+    "    {\n"
+    "      \"technique_id\": \"T1055\",\n"
+    "      \"name\": \"Process Injection\",\n"
+    "      \"relevance_score\": 0.92,\n"
+    "      \"impact\": \"High\",\n"
+    "      \"recommended_detections\": [\"Monitor for suspicious DLL loads\"],\n"
+    "      \"recommended_mitigations\": [\"Enable code signing policies\"]\n"
+    "    }\n"
+    "  ],\n"
+    "  \"detection_queries\": [\n"
+    "    {\n"
+    "      \"name\": \"Process Injection - Windows\",\n"
+    "      \"query\": \"EventID=4688 AND CommandLine LIKE '%-Inject%'%\",\n"
+    "      \"log_source\": \"windows_security\",\n"
+    "      \"priority\": \"high\",\n"
+    "      \"confidence\": 0.9\n"
+    "    }\n"
+    "  ],\n"
+    "  \"recommendations\": [\"Investigate hosts X,Y\", \"Collect memory for analysis\"],\n"
+    "  \"references\": [ { \"technique_id\": \"T1055\", \"url\": \"https://attack.mitre.org/techniques/T1055/\" } ],\n"
+    "  \"follow_up_questions\": [\"When did you first observe the activity?\"],\n"
+    "  \"evidence\": [\"Technique description excerpt or source doc link\"],\n"
+    "  \"confidence\": 0.87\n"
+    "}\n"
+)
+
+
+_INSTRUCTIONS = (
+    "Instructions (important):\n"
+    "- Use the techniques provided to produce a prioritized, operationally-focused analysis.\n"
+    "- Output MUST be valid JSON that adheres exactly to the schema below. Do NOT include any explanatory text, markdown, or commentary.\n"
+    "- Ensure detection queries are copy-paste ready for common SIEMs and label the log source.\n"
+    "- Include brief 'evidence' entries that point to the part of the technique or doc used to justify each top finding.\n"
+    "- Keep 'answer' concise and actionable; keep technical details in 'summary' and 'top_findings'.\n"
+    "- If uncertain, lower the 'confidence' and call out assumptions in 'evidence'.\n\n"
+)
+
+
+def _dump_context(context_parts: List[Dict[str, Any]]) -> str:
+    return json.dumps(context_parts, indent=1, ensure_ascii=False)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in a piece of text."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@lru_cache(maxsize=1)
+def _compiled_template() -> Tuple[str, str, int]:
+    """Compile the fixed parts of the RAG prompt once.
+
+    Returns:
+        Tuple of (header template, instruction tail, tokens used by the fixed text)
+    """
+    header = (
+        "You are a senior incident responder and MITRE ATT&CK expert.\n"
+        "User Query: {query}\n\n"
+        "Relevant Techniques (top {count}):\n"
+    )
+    tail = (
+        "\n\n"
+        f"{_INSTRUCTIONS}"
+        f"{_SCHEMA_INSTRUCTIONS}\n\n"
+        f"{_EXAMPLE_OUTPUT}\n\n"
+        "Now produce the JSON output exactly as specified."
+    )
+    return header, tail, estimate_tokens(header) + estimate_tokens(tail)
+
+
+@dataclass
+class RagContext:
+    """A compiled RAG prompt and how it was fitted into the token budget."""
+    prompt: str
+    prompt_tokens: int
+    token_budget: int
+    techniques_included: int
+    descriptions_trimmed: int
+    duplicate_sentences_removed: int
+
+
+class RagContextBuilder:
+    """Builds RAG prompts for retrieved techniques within a token budget."""
+
+    def __init__(self, token_budget: Optional[int] = None, max_techniques: int = MAX_CONTEXT_TECHNIQUES):
+        self.token_budget = token_budget or Config.RAG_CONTEXT_TOKEN_BUDGET
+        self.max_techniques = max_techniques
+
+    @staticmethod
+    def _normalize_sentence(sentence: str) -> str:
+        return _WHITESPACE.sub(' ', sentence).strip().lower()
+
+    @staticmethod
+    def _trim_to_chars(text: str, max_chars: int) -> str:
+        """Trim text to at most max_chars, preferring sentence then word boundaries."""
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars]
+        sentence_end = max(cut.rfind('. '), cut.rfind('.\n'))
+        if sentence_end >= max_chars // 2:
+            return cut[:sentence_end + 1]
+        word_end = cut.rfind(' ')
+        if word_end > 0:
+            cut = cut[:word_end]
+        return cut.rstrip(' ,;:') + '...'
+
+    def _deduplicate(self, techniques: List[Dict[str, Any]]) -> Tuple[List[str], int]:
+        """Drop sentences (and citation markers) already present in a higher-ranked technique."""
+        seen = set()
+        removed = 0
+        descriptions = []
+        for technique in techniques:
+            description = _CITATION.sub('', technique.get('description', '') or '')
+            kept = []
+            for sentence in _SENTENCE_SPLIT.split(description):
+                normalized = self._normalize_sentence(sentence)
+                if not normalized:
+                    continue
+                if normalized in seen:
+                    removed += 1
+                    continue
+                seen.add(normalized)
+                kept.append(sentence.strip())
+            descriptions.append(' '.join(kept))
+        return descriptions, removed
+
+    def _context_entry(self, rank: int, technique: Dict[str, Any], description: str) -> Dict[str, Any]:
+        # The retrieved `document` is name + description + phases + platforms, so it is
+        # left out: every piece of it is already present in the entry.
+        return {
+            "rank": rank,
+            "technique_id": technique.get('technique_id', ''),
+            "name": technique.get('name', ''),
+            "description": description,
+            "tactics": technique.get('kill_chain_phases', []),
+            "platforms": technique.get('platforms', []),
+            "relevance_score": round(float(technique.get('relevance_score', 0.0)), 3)
+        }
+
+    def build(self, query: str, techniques: List[Dict[str, Any]], token_budget: Optional[int] = None) -> RagContext:
+        """
+        Build the RAG prompt for a query and its retrieved techniques.
+
+        Args:
+            query: User query
+            techniques: Retrieved techniques with relevance scores
+            token_budget: Optional per-request override of the prompt token budget
+                (at least MIN_TOKEN_BUDGET)
+
+        Returns:
+            RagContext with the prompt and its realized size. The top technique is always
+            included, so a very long query can still take the prompt over budget.
+        """
+        budget = max(token_budget or self.token_budget, MIN_TOKEN_BUDGET)
+        header_template, tail, fixed_tokens = _compiled_template()
+
+        ranked = sorted(
+            techniques,
+            key=lambda t: float(t.get('relevance_score', 0.0)),
+            reverse=True
+        )[:self.max_techniques]
+        descriptions, duplicates_removed = self._deduplicate(ranked)
+
+        # Reserve room for the query and each technique's fields before sharing out
+        # the rest of the budget among descriptions.
+        available = budget - fixed_tokens - estimate_tokens(query)
+        skeletons = [self._context_entry(i + 1, t, "") for i, t in enumerate(ranked)]
+        while len(skeletons) > 1 and available - estimate_tokens(_dump_context(skeletons)) < 0:
+            skeletons.pop()
+        ranked = ranked[:len(skeletons)]
+        descriptions = descriptions[:len(skeletons)]
+        description_chars = max(0, available - estimate_tokens(_dump_context(skeletons))) * CHARS_PER_TOKEN
+
+        # Water-fill in rank order: short descriptions leave their unused share to the
+        # lower-ranked techniques that follow.
+        trimmed = 0
+        fitted = []
+        for i, description in enumerate(descriptions):
+            share = description_chars // (len(descriptions) - i)
+            if len(description) > share:
+                description = self._trim_to_chars(description, share) if share >= MIN_DESCRIPTION_CHARS else ""
+                trimmed += 1
+            description_chars -= len(description)
+            fitted.append(description)
+
+        context_parts = [self._context_entry(i + 1, t, d) for i, (t, d) in enumerate(zip(ranked, fitted))]
+        prompt = (
+            header_template.format(query=query, count=len(context_parts))
+            + _dump_context(context_parts)
+            + tail
+        )
+        prompt_tokens = estimate_tokens(prompt)
+
+        logger.info(f"Built RAG prompt: {prompt_tokens} tokens (budget {budget}), "
+                    f"{len(context_parts)} techniques, {trimmed} trimmed, {duplicates_removed} duplicate sentences removed")
+
+        return RagContext(
+            prompt=prompt,
+            prompt_tokens=prompt_tokens,
+            token_budget=budget,
+            techniques_included=len(context_parts),
+            descriptions_trimmed=trimmed,
+            duplicate_sentences_removed=duplicates_removed
+        )
+
+# Global builder instance
+rag_context_builder = RagContextBuilder()
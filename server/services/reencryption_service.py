@@ -0,0 +1,445 @@
+"""
+Re-encryption of a user's stored data after their key changes.
+
+Analyses and archived log chunks are encrypted with a key derived from the user's hashed
+password, so a password change would leave everything stored before it undecryptable.
+A job per user (the "reencryption_jobs" collection, keyed by user) walks that data in
+_id order, decrypts each batch with the old key(s), re-encrypts it with the current one
+on a small thread pool and writes it back with one bulk write per batch:
+
+1. analyses      documents whose `encryption_key_id` is one of the job's old keys
+2. log chunks    archived chunks that do not decrypt with the current key
+
+Starting a job first invalidates the user's cached keys and ciphers on every worker (see
+cache_invalidation_service), and the job waits for the other workers to pick that up
+before it starts, so none of them keeps writing under the old key behind it.
+
+After every batch the job records its checkpoint (last _id) and counters, so it resumes
+where it stopped after a restart; a lease lets exactly one worker process run it. Old
+keys are saved on the job before the new password hash is (see save_old_key) and kept
+until everything under them has been re-encrypted. A job that completes with items it
+could not re-encrypt keeps them for retries until REENCRYPTION_KEY_RETENTION_HOURS
+after the password change; dropping them then is recorded on the job
+(`old_keys_discarded_at`). Failed or interrupted jobs keep their keys until resumed.
+"""
+
+import asyncio
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from db import database
+from services.encryption_service import encryption_service
+from services.cache_invalidation_service import cache_invalidation_service
+from core import Config, logger, metrics
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+PHASE_ANALYSES = "analyses"
+PHASE_LOG_CHUNKS = "log_chunks"
+
+ENCRYPTED_FIELDS = ("encrypted_summary", "encrypted_techniques", "encrypted_enhanced_analysis")
+# A worker that stops heartbeating for this long loses the job to another worker
+LEASE_SECONDS = 120
+# How often expired old keys are purged from finished jobs
+KEY_PURGE_INTERVAL_SECONDS = 3600
+
+_reencryption_pool = ThreadPoolExecutor(
+    max_workers=Config.REENCRYPTION_WORKERS or min(4, os.cpu_count() or 1),
+    thread_name_prefix="reencryption"
+)
+
+
+def _reseal_document(doc: Dict[str, Any], old_key: str, new_key: str) -> Optional[Dict[str, bytes]]:
+    """Re-encrypted fields of an analysis, or None if any field fails to decrypt."""
+    try:
+        return {
+            field: encryption_service.encrypt_payload(encryption_service.decrypt_payload(doc[field], old_key), new_key)
+            for field in ENCRYPTED_FIELDS if doc.get(field)
+        }
+    except Exception as e:
+        logger.warning(f"Could not re-encrypt analysis {doc['_id']}: {e}")
+        return None
+
+
+def _reseal_chunk(data: bytes, old_keys: List[str], new_key: str) -> Tuple[Optional[bytes], bool]:
+    """
+    Re-encrypt an archived chunk with whichever old key opens it.
+
+    Returns:
+        (envelope, failed); envelope is None if the chunk is already under the new key
+    """
+    try:
+        encryption_service.decrypt_payload(data, new_key)
+        return None, False
+    except Exception:
+        pass
+    for old_key in old_keys:
+        try:
+            plaintext = encryption_service.decrypt_payload(data, old_key)
+        except Exception:
+            continue
+        return encryption_service.encrypt_payload(plaintext, new_key), False
+    return None, True
+
+
+class ReencryptionService:
+    """Runs resumable, checkpointed re-encryption jobs, one per user."""
+
+    def __init__(self, batch_size: int = Config.REENCRYPTION_BATCH_SIZE,
+                 key_retention_hours: int = Config.REENCRYPTION_KEY_RETENTION_HOURS):
+        self.jobs = database.get_collection("reencryption_jobs")
+        self.analysis_collection = database.get_collection("analysis_results")
+        self.chunks = database.get_collection("log_archive_chunks")
+        self.batch_size = batch_size
+        self.key_retention = timedelta(hours=key_retention_hours)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._active = 0
+        self._purge_task: Optional[asyncio.Task] = None
+
+    async def save_old_key(self, user_id: str, old_hashed_password: str) -> None:
+        """
+        Persist the key being replaced; call before saving the new password hash.
+
+        Once the new hash is saved this is the only copy of the old key, so a failure
+        between the two writes must not lose it: a job that then fails to start can
+        still be resumed.
+        """
+        now = datetime.utcnow()
+        old_key_id = encryption_service.password_key_id(old_hashed_password)
+        await self.jobs.update_one(
+            {"_id": user_id},
+            {"$set": {f"old_keys.{old_key_id}": old_hashed_password,
+                      "old_keys_expire_at": now + self.key_retention},
+             "$unset": {"old_keys_discarded_at": ""},
+             "$setOnInsert": {"status": STATUS_PENDING, "phase": PHASE_ANALYSES, "last_id": None, "generation": 0,
+                              "analyses_reencrypted": 0, "chunks_reencrypted": 0, "failed": 0,
+                              "updated_at": now}},
+            upsert=True
+        )
+
+    async def start_job(self, user_id: str, old_hashed_password: str) -> Dict[str, Any]:
+        """
+        Re-encrypt everything stored under `old_hashed_password` with the user's current key.
+
+        Call after the new password hash is saved (and save_old_key before that). If a job
+        is already running for the user, the old key is added to it and it starts over, so
+        data from several quick password changes is all moved to the latest key.
+        """
+        # No worker may keep encrypting with the old hash from its caches
+        await cache_invalidation_service.publish(user_id)
+        now = datetime.utcnow()
+        old_key_id = encryption_service.password_key_id(old_hashed_password)
+        metrics.increment("reencryption.jobs_started")
+        job = await self.jobs.find_one_and_update(
+            {"_id": user_id},
+            {
+                "$set": {
+                    f"old_keys.{old_key_id}": old_hashed_password,
+                    "status": STATUS_RUNNING,
+                    "phase": PHASE_ANALYSES,
+                    "last_id": None,
+                    "analyses_reencrypted": 0,
+                    "chunks_reencrypted": 0,
+                    "failed": 0,
+                    "error": None,
+                    "started_at": now,
+                    "updated_at": now,
+                    "finished_at": None,
+                    "old_keys_expire_at": now + self.key_retention,
+                    "old_keys_discarded_at": None
+                },
+                "$inc": {"generation": 1}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        total = await self.analysis_collection.count_documents(
+            {"user_id": user_id, "encryption_key_id": {"$in": list(job["old_keys"])}}
+        )
+        await self.jobs.update_one(
+            {"_id": user_id, "generation": job["generation"]}, {"$set": {"analyses_total": total}}
+        )
+        job["analyses_total"] = total
+        logger.info(f"Re-encryption job started for user {user_id}: {total} analyses under old keys")
+        self._spawn(user_id)
+        return self._public(job)
+
+    async def resume_job(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Restart a user's failed, interrupted or never started job from its checkpoint; None
+        if there is none.
+
+        A job that completed with failures keeps its old keys, until they expire, and is
+        retried from the start.
+        """
+        job = await self.jobs.find_one({"_id": user_id, "old_keys": {"$exists": True}}, {"status": 1})
+        if job is None:
+            return None
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"status": STATUS_RUNNING, "error": None, "updated_at": now}
+        if job.get("status") == STATUS_COMPLETED:
+            update.update({"phase": PHASE_ANALYSES, "last_id": None, "failed": 0})
+        elif job.get("status") == STATUS_PENDING:
+            update["started_at"] = now
+        job = await self.jobs.find_one_and_update(
+            {"_id": user_id}, {"$set": update}, return_document=ReturnDocument.AFTER
+        )
+        self._spawn(user_id)
+        return self._public(job)
+
+    async def get_status(self, user_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.jobs.find_one({"_id": user_id}, {"old_keys": 0})
+        return self._public(job) if job else None
+
+    async def purge_expired_keys(self) -> int:
+        """
+        Drop the old keys of completed jobs past their retention window; returns how many jobs.
+
+        Only completed jobs qualify (their failed items did not decrypt with any old key);
+        failed, interrupted and pending jobs keep their keys until they are resumed.
+        """
+        now = datetime.utcnow()
+        result = await self.jobs.update_many(
+            {"old_keys_expire_at": {"$lt": now}, "status": STATUS_COMPLETED, "old_keys": {"$exists": True}},
+            {"$unset": {"old_keys": ""}, "$set": {"old_keys_discarded_at": now}}
+        )
+        if result.modified_count:
+            metrics.increment("reencryption.old_keys_expired", result.modified_count)
+            logger.warning(f"Dropped expired old keys of {result.modified_count} re-encryption jobs "
+                           f"that completed with failed items")
+        return result.modified_count
+
+    async def _purge_forever(self) -> None:
+        while True:
+            try:
+                await self.purge_expired_keys()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Purging expired re-encryption keys failed: {e}")
+            await asyncio.sleep(KEY_PURGE_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        """Resume pending jobs and start purging expired old keys (call at startup)."""
+        await self.resume_pending()
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_forever())
+
+    async def resume_pending(self) -> int:
+        """Pick up running jobs left behind by a restart (call at startup)."""
+        user_ids = [doc["_id"] async for doc in self.jobs.find({"status": STATUS_RUNNING}, {"_id": 1})]
+        for user_id in user_ids:
+            self._spawn(user_id)
+        if user_ids:
+            logger.info(f"Resuming {len(user_ids)} re-encryption jobs")
+        return len(user_ids)
+
+    async def stop(self) -> None:
+        """Cancel local jobs; their checkpoints let any worker resume them once the lease expires."""
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            self._purge_task = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Job progress without key material or lease bookkeeping."""
+        total = job.get("analyses_total") or 0
+        done = job.get("analyses_reencrypted", 0)
+        return {
+            "status": job.get("status"),
+            "phase": job.get("phase"),
+            "analyses_total": total,
+            "analyses_reencrypted": done,
+            "chunks_reencrypted": job.get("chunks_reencrypted", 0),
+            "failed": job.get("failed", 0),
+            "progress": min(done / total, 1.0) if total else (1.0 if job.get("status") == STATUS_COMPLETED else 0.0),
+            "error": job.get("error"),
+            "started_at": job.get("started_at"),
+            "updated_at": job.get("updated_at"),
+            "finished_at": job.get("finished_at"),
+            "old_keys_discarded_at": job.get("old_keys_discarded_at")
+        }
+
+    def _spawn(self, user_id: str) -> None:
+        task = self._tasks.get(user_id)
+        if task is not None and not task.done():
+            # The running task notices the new generation at its next checkpoint
+            return
+        task = asyncio.create_task(self._run(user_id))
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda done: self._tasks.pop(user_id, None) if self._tasks.get(user_id) is done else None)
+
+    async def _claim(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Take (or renew) the lease on a running job; None if it is done or another worker holds it."""
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {"_id": user_id, "status": STATUS_RUNNING,
+             "$or": [{"owner": self.owner}, {"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=LEASE_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _checkpoint(self, job: Dict[str, Any], fields: Dict[str, Any],
+                          counts: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """Record progress and renew the lease; None if the job was restarted or taken over."""
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {"_id": job["_id"], "generation": job["generation"], "owner": self.owner, "status": STATUS_RUNNING},
+            {"$set": {**fields, "updated_at": now, "lease_until": now + timedelta(seconds=LEASE_SECONDS)},
+             "$inc": counts},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self, user_id: str) -> None:
+        self._active += 1
+        metrics.set_gauge("reencryption.active_jobs", self._active)
+        try:
+            while (job := await self._claim(user_id)) is not None:
+                try:
+                    await self._run_job(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    metrics.increment("reencryption.failures")
+                    logger.error(f"Re-encryption job for user {user_id} failed: {e}")
+                    await self.jobs.update_one(
+                        {"_id": user_id, "generation": job["generation"], "owner": self.owner},
+                        {"$set": {"status": STATUS_FAILED, "error": str(e), "lease_until": None,
+                                  "updated_at": datetime.utcnow()}}
+                    )
+        finally:
+            self._active -= 1
+            metrics.set_gauge("reencryption.active_jobs", self._active)
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        user_id = job["_id"]
+        user_doc = await database.get_collection("user_collection").find_one(
+            {"username": user_id}, {"hashed_password": 1}
+        )
+        if not user_doc or not user_doc.get("hashed_password"):
+            raise ValueError("user or current key not found")
+        new_key = user_doc["hashed_password"]
+        new_key_id = encryption_service.password_key_id(new_key)
+        old_keys = {key_id: key for key_id, key in job.get("old_keys", {}).items() if key_id != new_key_id}
+
+        # Give the other workers time to drop cached keys before walking the data
+        settle_until = (job.get("started_at") or datetime.min) + timedelta(seconds=2 * cache_invalidation_service.poll_seconds)
+        wait = (settle_until - datetime.utcnow()).total_seconds()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        if job.get("phase", PHASE_ANALYSES) == PHASE_ANALYSES:
+            job = await self._reencrypt_analyses(job, old_keys, new_key, new_key_id)
+            if job is None:
+                return
+            job = await self._checkpoint(job, {"phase": PHASE_LOG_CHUNKS, "last_id": None}, {})
+            if job is None:
+                return
+        job = await self._reencrypt_chunks(job, list(old_keys.values()), new_key)
+        if job is None:
+            return
+
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"$set": {
+            "status": STATUS_COMPLETED, "finished_at": now, "lease_until": None
+        }}
+        expire_at = job.get("old_keys_expire_at")
+        if not job.get("failed"):
+            # Nothing left under the old keys: stop keeping them
+            update["$unset"] = {"old_keys": ""}
+        elif expire_at is not None and expire_at <= now:
+            # Retry window over: the failed items stay under keys that are now dropped
+            update["$unset"] = {"old_keys": ""}
+            update["$set"]["old_keys_discarded_at"] = now
+            logger.warning(f"Re-encryption for user {user_id} left {job['failed']} items under old keys "
+                           f"past their retention window; the keys were dropped")
+        result = await self.jobs.update_one(
+            {"_id": user_id, "generation": job["generation"], "owner": self.owner}, update
+        )
+        if result.modified_count:
+            metrics.increment("reencryption.jobs_completed")
+            logger.info(f"Re-encryption for user {user_id} finished: {job.get('analyses_reencrypted', 0)} analyses, "
+                        f"{job.get('chunks_reencrypted', 0)} log chunks, {job.get('failed', 0)} failed")
+
+    async def _reencrypt_analyses(self, job: Dict[str, Any], old_keys: Dict[str, str],
+                                  new_key: str, new_key_id: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        projection = {"encryption_key_id": 1, **{field: 1 for field in ENCRYPTED_FIELDS}}
+        while True:
+            query: Dict[str, Any] = {"user_id": job["_id"], "encryption_key_id": {"$in": list(old_keys)}}
+            if job.get("last_id") is not None:
+                query["_id"] = {"$gt": job["last_id"]}
+            docs = await self.analysis_collection.find(query, projection).sort("_id", 1).limit(
+                self.batch_size
+            ).to_list(length=self.batch_size)
+            if not docs:
+                return job
+
+            started_at = time.monotonic()
+            resealed = await asyncio.gather(*(
+                loop.run_in_executor(_reencryption_pool, _reseal_document, doc,
+                                     old_keys[doc["encryption_key_id"]], new_key)
+                for doc in docs
+            ))
+            # Match on the old key ID so a concurrent rewrite is never overwritten
+            updates = [
+                UpdateOne({"_id": doc["_id"], "encryption_key_id": doc["encryption_key_id"]},
+                          {"$set": {**fields, "encryption_key_id": new_key_id}})
+                for doc, fields in zip(docs, resealed) if fields is not None
+            ]
+            written = (await self.analysis_collection.bulk_write(updates, ordered=False)).modified_count if updates else 0
+            failed = len(docs) - len(updates)
+
+            metrics.increment("reencryption.analyses_reencrypted", written)
+            metrics.increment("reencryption.failed_documents", failed)
+            metrics.observe("reencryption.batch_duration_ms", (time.monotonic() - started_at) * 1000)
+            job = await self._checkpoint(job, {"last_id": docs[-1]["_id"]},
+                                         {"analyses_reencrypted": written, "failed": failed})
+            if job is None:
+                return None
+
+    async def _reencrypt_chunks(self, job: Dict[str, Any], old_keys: List[str],
+                                new_key: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        # Chunk IDs are "<user_id>:<hash>", so the user's chunks are one _id index range
+        prefix = f"{job['_id']}:"
+        upper = prefix[:-1] + ";"
+        while True:
+            query = {"_id": {"$gt": job.get("last_id") or prefix, "$lt": upper}}
+            docs = await self.chunks.find(query, {"data": 1}).sort("_id", 1).limit(
+                self.batch_size
+            ).to_list(length=self.batch_size)
+            if not docs:
+                return job
+
+            resealed = await asyncio.gather(*(
+                loop.run_in_executor(_reencryption_pool, _reseal_chunk, doc["data"], old_keys, new_key)
+                for doc in docs
+            ))
+            updates = [
+                UpdateOne({"_id": doc["_id"], "data": doc["data"]}, {"$set": {"data": envelope}})
+                for doc, (envelope, _) in zip(docs, resealed) if envelope is not None
+            ]
+            written = (await self.chunks.bulk_write(updates, ordered=False)).modified_count if updates else 0
+            failed = sum(failed for _, failed in resealed)
+
+            metrics.increment("reencryption.chunks_reencrypted", written)
+            metrics.increment("reencryption.failed_documents", failed)
+            job = await self._checkpoint(job, {"last_id": docs[-1]["_id"]},
+                                         {"chunks_reencrypted": written, "failed": failed})
+            if job is None:
+                return None
+
+reencryption_service = ReencryptionService()
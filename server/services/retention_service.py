@@ -0,0 +1,186 @@
+"""
+Retention for stored analyses and monitoring sessions.
+
+- Stopped monitoring sessions expire through a Mongo TTL index on `stopped_at`
+  (active sessions have no `stopped_at`, so they never expire).
+- Analyses are removed by policy: ANALYSIS_RETENTION_DAYS for everyone, overridden per
+  user by `analysis_retention_days` on the user document. They are deleted in small
+  batches at a bounded rate, so cleanup never turns into one collection-wide delete, and
+  every batch is subtracted from the analysis rollups (a TTL index could not do that).
+
+A background task applies the policies every RETENTION_INTERVAL_SECONDS.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from db import database
+from core import Config, logger, metrics
+from services.analysis_rollup_service import analysis_rollup_service
+from services.log_archive_service import log_archive_service
+
+SESSION_TTL_INDEX = "stopped_at_ttl"
+ANALYSIS_PROJECTION = {
+    "user_id": 1, "analysis_timestamp": 1, "processing_time_ms": 1, "techniques_count": 1, "logs_hash": 1
+}
+
+
+class RetentionService:
+    """Applies retention policies in rate-limited batches, on demand or in the background."""
+
+    def __init__(self,
+                 batch_size: int = Config.RETENTION_BATCH_SIZE,
+                 max_deletes_per_second: int = Config.RETENTION_MAX_DELETES_PER_SECOND):
+        self.analysis_collection = database.get_collection("analysis_results")
+        self.sessions_collection = database.get_collection("monitoring_sessions")
+        self.batch_size = batch_size
+        self.max_deletes_per_second = max_deletes_per_second
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_session_ttl_index(self, days: int = Config.SESSION_RETENTION_DAYS) -> None:
+        """Create (or retune) the TTL index expiring stopped sessions `days` after they stopped."""
+        if days <= 0:
+            return
+        expire_after = days * 86400
+        try:
+            indexes = await self.sessions_collection.index_information()
+            existing = indexes.get(SESSION_TTL_INDEX)
+            if existing is None:
+                await self.sessions_collection.create_index(
+                    "stopped_at", name=SESSION_TTL_INDEX, expireAfterSeconds=expire_after
+                )
+            elif existing.get("expireAfterSeconds") != expire_after:
+                await database.command({
+                    "collMod": "monitoring_sessions",
+                    "index": {"name": SESSION_TTL_INDEX, "expireAfterSeconds": expire_after}
+                })
+            logger.info(f"Stopped monitoring sessions expire after {days} days")
+        except (OperationFailure, PyMongoError) as e:
+            logger.warning(f"Could not ensure session TTL index: {e}")
+
+    async def _delete_in_batches(self, query: Dict[str, Any],
+                                 on_deleted: Callable[[List[Dict[str, Any]]], Awaitable[None]]) -> int:
+        """Delete matching analyses `batch_size` at a time, at most `max_deletes_per_second`."""
+        total = 0
+        while True:
+            started_at = time.monotonic()
+            docs = await self.analysis_collection.find(query, ANALYSIS_PROJECTION).limit(
+                self.batch_size
+            ).to_list(length=self.batch_size)
+            if not docs:
+                return total
+
+            # One delete per document, so that exactly the analyses this call removed are
+            # uncounted and released; any deleted concurrently were handled by their deleter
+            results = await asyncio.gather(*(
+                self.analysis_collection.delete_one({"_id": doc["_id"]}) for doc in docs
+            ))
+            deleted = [doc for doc, result in zip(docs, results) if result.deleted_count]
+            if len(deleted) < len(docs):
+                logger.info(f"Retention batch deleted {len(deleted)}/{len(docs)}; the rest were deleted concurrently")
+            if deleted:
+                await on_deleted(deleted)
+
+            total += len(deleted)
+            metrics.increment("retention.analyses_deleted", len(deleted))
+            metrics.set_gauge("retention.current_run_deleted", total)
+
+            # Spread deletes out so a large backlog does not saturate the database
+            min_duration = len(docs) / self.max_deletes_per_second if self.max_deletes_per_second > 0 else 0
+            elapsed = time.monotonic() - started_at
+            if elapsed < min_duration:
+                await asyncio.sleep(min_duration - elapsed)
+
+    async def _after_delete(self, docs: List[Dict[str, Any]]) -> None:
+        try:
+            await analysis_rollup_service.remove_analyses(docs)
+        except Exception as e:
+            logger.warning(f"Failed to update rollups for {len(docs)} expired analyses: {e}")
+        await log_archive_service.release_many(docs)
+
+    async def cleanup_analyses(self, days: int, user_id: Optional[str] = None) -> int:
+        """Delete analyses older than `days` days (for one user, or everyone); returns the count."""
+        if days < 1:
+            raise ValueError("Retention cleanup needs days >= 1")
+        query: Dict[str, Any] = {"analysis_timestamp": {"$lt": datetime.utcnow() - timedelta(days=days)}}
+        if user_id is not None:
+            query["user_id"] = user_id
+        async with self._lock:
+            return await self._delete_in_batches(query, self._after_delete)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Apply the default and per-user analysis retention policies once."""
+        async with self._lock:
+            started_at = time.monotonic()
+            metrics.set_gauge("retention.running", 1)
+            metrics.set_gauge("retention.current_run_deleted", 0)
+            deleted = 0
+            try:
+                overrides = {
+                    doc["username"]: doc["analysis_retention_days"]
+                    async for doc in database.user_collection.find(
+                        {"analysis_retention_days": {"$gt": 0}}, {"username": 1, "analysis_retention_days": 1}
+                    )
+                }
+                now = datetime.utcnow()
+                for username, days in overrides.items():
+                    deleted += await self._delete_in_batches(
+                        {"user_id": username, "analysis_timestamp": {"$lt": now - timedelta(days=days)}},
+                        self._after_delete
+                    )
+                if Config.ANALYSIS_RETENTION_DAYS > 0:
+                    query: Dict[str, Any] = {
+                        "analysis_timestamp": {"$lt": now - timedelta(days=Config.ANALYSIS_RETENTION_DAYS)}
+                    }
+                    if overrides:
+                        query["user_id"] = {"$nin": list(overrides)}
+                    deleted += await self._delete_in_batches(query, self._after_delete)
+            finally:
+                metrics.set_gauge("retention.running", 0)
+
+            duration_ms = (time.monotonic() - started_at) * 1000
+            metrics.observe("retention.run_duration_ms", duration_ms)
+            metrics.set_gauge("retention.last_run_timestamp", time.time())
+            self.last_run = {
+                "finished_at": datetime.utcnow().isoformat(),
+                "analyses_deleted": deleted,
+                "duration_ms": duration_ms
+            }
+            if deleted:
+                logger.info(f"Retention removed {deleted} analyses in {duration_ms:.0f}ms")
+            return self.last_run
+
+    async def _run_forever(self, interval_seconds: int) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.increment("retention.failures")
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    async def start(self, interval_seconds: int = Config.RETENTION_INTERVAL_SECONDS) -> None:
+        """Ensure the TTL index and start the periodic background task (no-op if disabled)."""
+        await self.ensure_session_ttl_index()
+        if interval_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_forever(interval_seconds))
+        logger.info(f"Retention task started (every {interval_seconds}s)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+retention_service = RetentionService()
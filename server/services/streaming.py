@@ -0,0 +1,65 @@
+"""
+Helpers for streaming LLM output to clients as Server-Sent Events.
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Iterable
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx) so tokens flush immediately
+}
+
+_SENTINEL = object()
+
+
+def format_sse_event(event: str, data: Any) -> str:
+    """Serialize a single Server-Sent Event with a JSON payload."""
+    payload = json.dumps(data, default=str, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def iterate_in_thread(iterable_factory: Callable[[], Iterable[Any]]) -> AsyncIterator[Any]:
+    """
+    Consume a blocking iterator on a worker thread and yield its items asynchronously.
+
+    Blocking SDK streams (e.g. boto3 event streams) would otherwise stall the event loop
+    between chunks. If the consumer stops early the producer thread is told to stop at
+    the next item.
+
+    Args:
+        iterable_factory: Callable returning the blocking iterable; it is invoked on the worker thread
+
+    Yields:
+        Items produced by the iterable, in order
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop_event = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable_factory():
+                if stop_event.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _SENTINEL)
+
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _SENTINEL:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Do not wait for the producer: it may be blocked on the SDK's next chunk.
+        stop_event.set()
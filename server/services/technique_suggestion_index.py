@@ -0,0 +1,150 @@
+"""
+Trigram index for MITRE ATT&CK technique suggestions.
+
+`partial_ratio` slides the shorter string over every offset of the longer one and
+runs a SequenceMatcher at each. Scoring the whole catalog that way costs tens of
+millions of character comparisons per query. This index keeps an inverted index of
+character trigrams over technique names and descriptions:
+
+1. Techniques sharing the most trigrams with the query (weighted by rarity) are
+   shortlisted, separately by name and by description.
+2. Only windows anchored on shared trigrams (where the query lines up with an
+   occurrence in the text) are scored with SequenceMatcher, the same way
+   partial_ratio scores them.
+"""
+
+import math
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Set, Tuple
+
+NGRAM_SIZE = 3
+
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _ngram_offsets(text: str) -> Dict[str, int]:
+    """First offset of every n-gram in text."""
+    offsets: Dict[str, int] = {}
+    for i in range(len(text) - NGRAM_SIZE + 1):
+        offsets.setdefault(text[i:i + NGRAM_SIZE], i)
+    return offsets
+
+
+def anchored_partial_ratio(a: str, b: str, max_windows: int = 12, max_occurrences: int = 32) -> float:
+    """
+    partial_ratio restricted to windows anchored on shared n-grams.
+
+    Each n-gram of the shorter string found in the longer one votes for the window
+    that lines the two occurrences up; the most-voted windows are scored. Strings
+    shorter than an n-gram are scored exactly (a 1-2 character window is either a
+    substring or at most 50% similar).
+    """
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    if len(shorter) < NGRAM_SIZE:
+        return 100.0 if shorter in longer else 0.0
+
+    last_start = len(longer) - len(shorter)
+    votes: Counter = Counter()
+    for gram, offset in _ngram_offsets(shorter).items():
+        position = longer.find(gram)
+        seen = 0
+        while position != -1 and seen < max_occurrences:
+            votes[min(max(position - offset, 0), last_start)] += 1
+            seen += 1
+            position = longer.find(gram, position + 1)
+
+    matcher = SequenceMatcher(None, shorter)
+    best_ratio = 0.0
+    for start, _ in votes.most_common(max_windows):
+        matcher.set_seq2(longer[start:start + len(shorter)])
+        best_ratio = max(best_ratio, matcher.ratio() * 100)
+    return best_ratio
+
+
+class TechniqueSuggestionIndex:
+    """Top-k technique suggestions for free-text queries over names and descriptions."""
+
+    def __init__(self,
+                 techniques: Iterable[Tuple[str, str, str]],
+                 description_weight: float = 0.8,
+                 shortlist_size: int = 50):
+        """
+        Args:
+            techniques: (technique_id, name, description) triples
+            description_weight: Weight of description similarity relative to name similarity
+            shortlist_size: Techniques shortlisted per field (name, description) per query
+        """
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.description_weight = description_weight
+        self.shortlist_size = shortlist_size
+        self._name_index: Dict[str, List[int]] = {}
+        self._description_index: Dict[str, List[int]] = {}
+
+        for position, (tech_id, name, description) in enumerate(techniques):
+            name, description = name.lower(), description.lower()
+            self.ids.append(tech_id)
+            self.names.append(name)
+            self.descriptions.append(description)
+            for gram in _ngrams(name):
+                self._name_index.setdefault(gram, []).append(position)
+            for gram in _ngrams(description):
+                self._description_index.setdefault(gram, []).append(position)
+
+    def _shortlist(self, query_grams: Set[str], size: int) -> List[int]:
+        """Techniques sharing the most (IDF-weighted) n-grams with the query, by name and by description."""
+        total = max(1, len(self.ids))
+        name_hits: Counter = Counter()
+        description_hits: Counter = Counter()
+        for gram in query_grams:
+            name_postings = self._name_index.get(gram, ())
+            description_postings = self._description_index.get(gram, ())
+            # Rare n-grams say more about a match than ones found in every description
+            weight = math.log(1 + total / (1 + len(description_postings)))
+            for position in name_postings:
+                name_hits[position] += weight
+            for position in description_postings:
+                description_hits[position] += weight
+
+        shortlist = {position for position, _ in name_hits.most_common(size)}
+        shortlist.update(position for position, _ in description_hits.most_common(size))
+        return sorted(shortlist)
+
+    def score(self, position: int, query: str) -> float:
+        """Relevance of one technique to a lowercased query, as max(name, weighted description)."""
+        name_similarity = anchored_partial_ratio(query, self.names[position])
+        description_similarity = anchored_partial_ratio(query, self.descriptions[position])
+        return max(name_similarity, description_similarity * self.description_weight)
+
+    def search(self, query: str, limit: int = 5, threshold: float = 60.0) -> List[Tuple[str, float]]:
+        """
+        Return up to `limit` (technique_id, relevance) pairs with relevance above threshold.
+
+        Args:
+            query: Free-text query
+            limit: Maximum number of suggestions
+            threshold: Minimum relevance (0-100)
+        """
+        query = query.lower()
+        query_grams = _ngrams(query)
+        if query_grams:
+            candidates = self._shortlist(query_grams, max(self.shortlist_size, limit * 10))
+        else:
+            # Too short for n-grams: substring matches are the only ones above 50%
+            candidates = [
+                position for position in range(len(self.ids))
+                if query in self.names[position] or query in self.descriptions[position]
+            ]
+
+        scored = []
+        for position in candidates:
+            relevance = self.score(position, query)
+            if relevance > threshold:
+                scored.append((position, relevance))
+
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return [(self.ids[position], relevance) for position, relevance in scored[:limit]]